@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+抓取吞吐量测试：启动本地模拟站点（benchmark.mock_server），以指定的抓取模式运行 worker.fetch_stats_gov_cn 完整抓取，
+输出页面数/秒、信息数/秒与进程内存峰值。
+
+未识别的参数传给模拟站点，例如规模、延迟与错误注入参数，参见 benchmark.mock_server。
+
+运行命令：
+    $ python3 -m benchmark.crawl [--mode serial|asyncio|thread] [--concurrency 16] [--pipeline] [--depth-first]
+              [--rate-limit 0] [--write-queue 0] [模拟站点参数...]
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from lib import worker
+from lib.crawler import LEVELS
+from lib.util import TABLES
+
+
+def peak_rss():
+    """
+    当前进程的内存峰值
+
+    :return: 内存峰值，单位为 MB，不支持的平台为 None。
+    :rtype: float
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 单位为字节，Linux 为 KB。
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, server_args):
+    """
+    启动模拟站点子进程并等待端口可用
+
+    :param port: 端口
+    :type port: int
+    :param server_args: 模拟站点参数
+    :type server_args: list
+    :return: 子进程
+    :rtype: subprocess.Popen
+    """
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmark.mock_server', '--port', str(port)] + server_args,
+        stdout=subprocess.DEVNULL
+    )
+    for _ in range(100):
+        if process.poll() is not None:
+            raise Exception('模拟站点启动失败')
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise Exception('模拟站点启动超时')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抓取吞吐量测试')
+    parser.add_argument('--mode', default='serial', choices=['serial', 'asyncio', 'thread'])
+    parser.add_argument('--concurrency', type=int, default=16, help='各级别的最大并发数')
+    parser.add_argument('--pipeline', action='store_true')
+    parser.add_argument('--depth-first', action='store_true')
+    parser.add_argument('--rate-limit', type=float, default=0, help='每秒最大请求数')
+    parser.add_argument('--write-queue', type=int, default=0, help='后台写入队列的最大页面数，0 为在抓取循环中直接保存')
+    options, server_args = parser.parse_known_args()
+
+    port = free_port()
+    server = start_server(port, server_args)
+    db_path = tempfile.mkdtemp() + os.sep
+    try:
+        begin_time = time.time()
+        worker.fetch_stats_gov_cn(
+            f'http://127.0.0.1:{port}/2020/$ROUTE$', db_path, False, 0, options.mode,
+            {name: options.concurrency for name in LEVELS[1:]}, options.rate_limit, 1, '', True, False, '', 'town',
+            options.pipeline, options.depth_first, write_queue=options.write_queue
+        )
+        elapsed = time.time() - begin_time
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/__stats') as response:
+            stats = json.loads(response.read())
+    finally:
+        server.terminate()
+        server.wait()
+
+    conn = sqlite3.connect(db_path + 'db_stats.gov.cn.sqlite')
+    rows = sum(conn.execute(f'SELECT COUNT(*) FROM `{name}`;').fetchone()[0] for name in TABLES)
+    conn.close()
+
+    pipeline = '，流水线' + ('深度优先' if options.depth_first else '广度优先') if options.pipeline else ''
+    print(f'抓取模式：{options.mode}{pipeline}，并发数：{options.concurrency}，写入队列：{options.write_queue}')
+    print(f'请求数：{stats["requests"]}（200：{stats["200"]}，403：{stats["403"]}，404：{stats["404"]}），'
+          f'页面字节数：{stats["raw_bytes"]}，传输字节数：{stats["bytes"]}')
+    print(f'信息数：{rows}，耗时：{elapsed:.2f} 秒')
+    print(f'页面/秒：{stats["200"] / elapsed:.1f}，信息/秒：{rows / elapsed:.1f}')
+    rss = peak_rss()
+    print(f'内存峰值：{rss:.1f} MB' if rss is not None else '内存峰值：不支持当前平台')
+
+
+if __name__ == '__main__':
+    main()
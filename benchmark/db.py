@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+数据库连接模式性能测试：按页面批量写入生成的五级信息（与抓取时的写入方式相同），再按导出方式逐条读取全部信息、
+按上级查询下级信息，比较 lib.util.DB_MODES 中各模式的耗时；并测试连接池写入的同时多个线程读取。
+
+运行命令：
+    $ python3 -m benchmark.db [--provinces 4] [--cities 10] [--counties 10] [--towns 10] [--villages 50]
+              [--batch-pages 100] [--by-top 4000] [--readers 4]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from lib.util import TABLES, DBUtilStatsGovCn, DBUtilStatsGovCnPool
+
+
+def generate_pages(options):
+    """
+    生成各级页面的信息，与抓取时每个页面保存一次的方式相同。
+
+    :param options: 规模参数
+    :type options: argparse.Namespace
+    :return: (级别名称, 信息数组) 数组，信息为 (统计用区划代码, 代码, 名称, 各上级统计用区划代码...)。
+    :rtype: list
+    """
+    counts = [options.provinces, options.cities, options.counties, options.towns, options.villages]
+    # 各级别代码在统计用区划代码中的结束位置
+    ends = [2, 4, 6, 9, 12]
+    pages = []
+    parents = [('', [])]
+    for index, name in enumerate(TABLES):
+        children = []
+        for prefix, top_codes in parents:
+            rows = []
+            width = ends[index] - len(prefix)
+            for number in range(1, counts[index] + 1):
+                code = prefix + str(number + (10 if index == 0 else 0)).zfill(width)
+                statistical_code = code.ljust(12, '0')
+                rows.append((statistical_code, code, f'{name}{code}', *top_codes))
+                children.append((code, top_codes + [statistical_code]))
+            pages.append((name, rows))
+        parents = children
+    return pages
+
+
+def bench_write(path, pages, mode, batch_pages):
+    """
+    按页面批量写入，写入完成后创建上级代码索引。
+
+    :return: 耗时，单位为秒。
+    :rtype: float
+    """
+    db_util = DBUtilStatsGovCn(path, batch_pages, mode)
+    begin = time.perf_counter()
+    for name, rows in pages:
+        db_util.insert_many(name, rows, commit=False)
+        db_util.commit_page()
+    db_util.commit()
+    db_util.create_indexes()
+    elapsed = time.perf_counter() - begin
+    del db_util
+    return elapsed
+
+
+def bench_read(path, mode, by_top):
+    """
+    按导出方式逐条读取全部信息，并按上级查询指定数量乡级下的村级信息。
+
+    :return: 逐条读取耗时、按上级查询耗时，单位为秒。
+    :rtype: tuple
+    """
+    db_util = DBUtilStatsGovCn(path, mode=mode)
+    begin = time.perf_counter()
+    for name in TABLES:
+        for _ in db_util._iter_data(name):
+            pass
+    scan = time.perf_counter() - begin
+    towns = [row['statistical_code'] for row in db_util.select_towns(by_top, 0)]
+    begin = time.perf_counter()
+    for town in towns:
+        db_util.select_villages_by_top(town)
+    lookup = time.perf_counter() - begin
+    del db_util
+    return scan, lookup
+
+
+def bench_pool(path, pages, batch_pages, readers):
+    """
+    连接池的写入连接按页面批量写入，同时 readers 个线程各取一个读取连接，不断按统计用区划代码查询村级信息。
+
+    :return: 写入耗时（秒）、写入期间完成的查询次数、查到的信息数（只能查到已提交的信息）
+    :rtype: tuple
+    """
+    pool = DBUtilStatsGovCnPool(path, readers, batch_pages, 'bulk')
+    codes = [row[0] for name, rows in pages if name == 'village' for row in rows]
+    done = threading.Event()
+    counts = []
+
+    def read():
+        queries = found = 0
+        with pool.reader() as db_util:
+            while not done.is_set():
+                found += db_util.select_village(codes[queries % len(codes)]) is not None
+                queries += 1
+        counts.append((queries, found))
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    begin = time.perf_counter()
+    for name, rows in pages:
+        with pool.writer() as db_util:
+            db_util.insert_many(name, rows, commit=False)
+            db_util.commit_page()
+    with pool.writer() as db_util:
+        db_util.commit()
+    elapsed = time.perf_counter() - begin
+    done.set()
+    for thread in threads:
+        thread.join()
+    return elapsed, sum(queries for queries, _ in counts), sum(found for _, found in counts)
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description='数据库连接模式性能测试')
+    parser.add_argument('--provinces', type=int, default=4, help='省级数量')
+    parser.add_argument('--cities', type=int, default=10, help='每个省的地级数量')
+    parser.add_argument('--counties', type=int, default=10, help='每个地级的县级数量')
+    parser.add_argument('--towns', type=int, default=10, help='每个县级的乡级数量')
+    parser.add_argument('--villages', type=int, default=50, help='每个乡级的村级数量')
+    parser.add_argument('--batch-pages', type=int, default=100, help='每多少个页面提交一次事务')
+    parser.add_argument('--by-top', type=int, default=4000, help='按上级查询的乡级数量')
+    parser.add_argument('--readers', type=int, default=4, help='连接池写入时同时读取的线程数')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(args)
+    pages = generate_pages(options)
+    rows = sum(len(page_rows) for _, page_rows in pages)
+    print(f'页面数：{len(pages)}，信息数：{rows}')
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, 'db_stats.gov.cn.sqlite')
+        for batch_pages in sorted({1, options.batch_pages}):
+            for mode in ('default', 'bulk'):
+                for file in os.listdir(temp_dir):
+                    os.remove(os.path.join(temp_dir, file))
+                elapsed = bench_write(path, pages, mode, batch_pages)
+                print(f'写入 模式：{mode:<8}每 {batch_pages} 个页面提交，耗时：{elapsed:.2f} 秒，信息/秒：{rows / elapsed:.0f}')
+        for mode in ('default', 'read'):
+            scan, lookup = bench_read(path, mode, options.by_top)
+            print(f'读取 模式：{mode:<8}逐条读取全部信息：{scan:.2f} 秒，按上级查询 {options.by_top} 个乡级的村级信息：'
+                  f'{lookup:.2f} 秒')
+        for file in os.listdir(temp_dir):
+            os.remove(os.path.join(temp_dir, file))
+        elapsed, queries, found = bench_pool(path, pages, options.batch_pages, options.readers)
+        print(f'连接池 写入耗时：{elapsed:.2f} 秒，同时 {options.readers} 个线程读取，查询 {queries} 次，'
+              f'查到已提交的信息 {found} 条')
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+分布式抓取测试：启动本地模拟站点（benchmark.mock_server）、一个写入进程及多个抓取节点进程，通过本地 Redis 完整抓取，
+并与串行抓取的结果逐条比较。
+
+其中 --slow-nodes 个节点每抓取一个页面后休眠超过租约时长，它领取的页面租约总会到期并被其它节点重新领取，
+用于检查迟到的结果不会释放其它节点的租约、所有页面都能完成。
+
+未识别的参数传给模拟站点，例如规模、延迟与错误注入参数，参见 benchmark.mock_server。
+
+运行命令：
+    $ python3 -m benchmark.distributed [--redis-host 127.0.0.1] [--redis-port 6379] [--redis-pass ''] [--redis-db 0]
+              [--nodes 4] [--slow-nodes 1] [--lease-time 2] [模拟站点参数...]
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmark.crawl import free_port, start_server
+from lib import worker
+from lib.util import TABLES
+
+
+def run_writer(url, db_path, redis_config, lease_time):
+    """
+    写入进程
+
+    :param url: 抓取地址
+    :type url: str
+    :param db_path: 数据目录
+    :type db_path: str
+    :param redis_config: Redis 配置，包括 host、port、pass、db。
+    :type redis_config: dict
+    :param lease_time: 租约时长，单位为秒。
+    :type lease_time: int
+    :return:
+    """
+    worker.fetch_stats_gov_cn(
+        url, db_path, False, 0, 'distributed', retry_delay=0, redis_config=redis_config, lease_time=lease_time,
+        write_queue=1000
+    )
+
+
+def run_node(url, redis_config, lease_time, sleep_time):
+    """
+    抓取节点进程
+
+    :param url: 抓取地址
+    :type url: str
+    :param redis_config: Redis 配置，包括 host、port、pass、db。
+    :type redis_config: dict
+    :param lease_time: 租约时长，单位为秒。
+    :type lease_time: int
+    :param sleep_time: 每抓取一个页面后的休眠时间，单位为秒。
+    :type sleep_time: int
+    :return:
+    """
+    worker.crawl_node_stats_gov_cn(url, redis_config, False, sleep_time, lease_time=lease_time)
+
+
+def dump(db_path):
+    """
+    读取各级别全部信息及待抓取页面数
+
+    :param db_path: 数据目录
+    :type db_path: str
+    :return: 各级别信息数组及待抓取页面数
+    :rtype: tuple
+    """
+    conn = sqlite3.connect(db_path + 'db_stats.gov.cn.sqlite')
+    rows = [conn.execute(f'SELECT * FROM `{name}` ORDER BY 1, 2, 3;').fetchall() for name in TABLES]
+    pending = conn.execute('SELECT COUNT(*) FROM `frontier` WHERE `status` = 0;').fetchone()[0]
+    conn.close()
+    return rows, pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分布式抓取测试')
+    parser.add_argument('--redis-host', default='127.0.0.1')
+    parser.add_argument('--redis-port', type=int, default=6379)
+    parser.add_argument('--redis-pass', default='')
+    parser.add_argument('--redis-db', type=int, default=0)
+    parser.add_argument('--nodes', type=int, default=4, help='抓取节点进程数')
+    parser.add_argument('--slow-nodes', type=int, default=1, help='其中租约总会到期的节点数')
+    parser.add_argument('--lease-time', type=int, default=2, help='租约时长，单位为秒')
+    options, server_args = parser.parse_known_args()
+    if options.slow_nodes >= options.nodes:
+        parser.error('--slow-nodes 需小于 --nodes')
+    redis_config = {
+        'host': options.redis_host, 'port': options.redis_port, 'pass': options.redis_pass, 'db': options.redis_db
+    }
+
+    port = free_port()
+    server = start_server(port, server_args)
+    url = f'http://127.0.0.1:{port}/2020/$ROUTE$'
+    expected_path = tempfile.mkdtemp() + os.sep
+    db_path = tempfile.mkdtemp() + os.sep
+    processes = []
+    try:
+        worker.fetch_stats_gov_cn(url, expected_path, False, 0, 'serial', retry_delay=0)
+
+        begin_time = time.time()
+        processes.append(multiprocessing.Process(
+            target=run_writer, args=(url, db_path, redis_config, options.lease_time)
+        ))
+        for i in range(options.nodes):
+            sleep_time = options.lease_time + 1 if i < options.slow_nodes else 0
+            processes.append(multiprocessing.Process(
+                target=run_node, args=(url, redis_config, options.lease_time, sleep_time)
+            ))
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.time() - begin_time
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        server.terminate()
+        server.wait()
+
+    failed = [process.exitcode for process in processes if process.exitcode != 0]
+    expected, _ = dump(expected_path)
+    rows, pending = dump(db_path)
+    print(f'抓取节点：{options.nodes}（租约总会到期：{options.slow_nodes}），租约时长：{options.lease_time} 秒')
+    print(f'信息数：{sum(len(r) for r in rows)}，待抓取页面：{pending}，耗时：{elapsed:.2f} 秒')
+    if failed or pending > 0 or rows != expected:
+        print(f'结果与串行抓取不一致（进程退出码：{failed}）')
+        sys.exit(1)
+    print('结果与串行抓取一致')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟国家统计局站点，按参数生成五级区划页面（GBK 编码，表格结构与站点相同），可设置规模、延迟、403/404 注入及限流，
+请求头包含 Accept-Encoding: gzip 时压缩响应。
+
+运行命令：
+    $ python3 -m benchmark.mock_server [--port 8000] [--provinces 3] [--cities 4] [--counties 5] [--towns 6] [--villages 8]
+              [--direct-town-cities 0] [--latency 0] [--jitter 0] [--error-403 0] [--error-404 0] [--throttle 0]
+              [--no-gzip]
+
+抓取地址（STATS_GOV_CN_SITE）为 http://127.0.0.1:8000/2020/$ROUTE$，统计信息在 http://127.0.0.1:8000/__stats。
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+PAGE_HEAD = '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" ' \
+            '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">\r\n' \
+            '<html><head><meta http-equiv="Content-Type" content="text/html; charset=gb2312" />' \
+            '<title>$YEAR$年统计用区划代码和城乡划分代码</title>' \
+            '<style type="text/css">BODY {MARGIN: 0px} BODY {FONT-SIZE: 12px} TD {FONT-SIZE: 12px} ' \
+            'TH {FONT-SIZE: 12px} .redBig {COLOR: #d00018; FONT-SIZE: 18px; FONT-WEIGHT: bold} ' \
+            '.STYLE3 a {COLOR: #fff; text-decoration: none;}</style></head>\r\n' \
+            '<body><table width="775" border="0" align="center" cellpadding="0" cellspacing="0">' \
+            '<tr><td height="16" background="../images/topline_bg.gif"><img src="../images/topline_bg.gif" ' \
+            'width="1" height="16" /></td></tr><tr><td valign="top"><table width="775" border="0" cellpadding="0" ' \
+            'cellspacing="0"><tr><td class="STYLE3" height="20" align="right">' \
+            '<a href="http://www.stats.gov.cn/">统计局首页</a></td></tr></table></td></tr>\r\n' \
+            '<tr><td class="in_main_content_text"><table class="$LEVEL$table" width="100%">'
+
+PAGE_TAIL = '</table></td></tr>\r\n<tr><td bgcolor="#e2eefc" height="2"></td></tr>' \
+            '<tr><td class="STYLE3" height="60" align="center" bgcolor="#8ea9cf">版权所有：中华人民共和国国家统计局' \
+            '</td></tr></table></body></html>\r\n'
+
+NAME_CHARS = '东南西北中安平和兴宁长新华阳山河湖海江川城乡镇村桥营庄屯寨岭峪沟坪台园林田丰泰康福盛永昌明光胜利红星文化'
+"""
+生成名称用的汉字
+"""
+
+
+class MockStatsGovCn(object):
+    """
+    模拟站点页面生成器，页面按路由即时生成，不占用内存，相同参数生成的页面相同。
+    """
+
+    def __init__(self, provinces=3, cities=4, counties=5, towns=6, villages=8, direct_town_cities=0, seed=0):
+        self._sizes = {'city': cities, 'county': counties, 'town': towns, 'village': villages}
+        """
+        各级别每个上级下的数量
+        """
+
+        self._provinces = [str(11 + i) for i in range(provinces)]
+        """
+        省级代码
+        """
+
+        self._direct_town_cities = direct_town_cities
+        """
+        每个省中不设县级的地级数量（例如东莞市，地级页面直接列出乡级）
+        """
+
+        self._seed = seed
+
+    def _name(self, code, suffix):
+        """
+        按代码生成固定的名称
+
+        :param code: 代码
+        :type code: str
+        :param suffix: 名称后缀
+        :type suffix: str
+        :return: 名称
+        :rtype: str
+        """
+        rand = random.Random(f'{self._seed}-{code}')
+        return ''.join(rand.choice(NAME_CHARS) for _ in range(rand.randint(2, 4))) + suffix
+
+    def _is_direct_town_city(self, city_code):
+        return int(city_code[2:4]) <= self._direct_town_cities
+
+    def page(self, route):
+        """
+        生成路由对应的页面
+
+        :param route: 年份之后的路由，例如 index.html、11.html、11/1101.html
+        :type route: str
+        :return: 页面级别与页面内容，页面不存在时为 None。
+        :rtype: tuple
+        """
+        parts = route[:-len('.html')].split('/') if route.endswith('.html') else []
+        if len(parts) == 0:
+            return None
+        code = parts[-1]
+        if route == 'index.html':
+            tds = ''.join(f"<td><a href='{p}.html'>{self._name(p, '省')}<br/></a></td>" for p in self._provinces)
+            return 'province', "<tr class='provincehead'><td colspan=8>省级</td></tr><tr class='provincetr'>" + tds + '</tr>'
+        if len(parts) == 1 and code in self._provinces:
+            rows = []
+            for i in range(1, self._sizes['city'] + 1):
+                city = f'{code}{i:02d}'
+                rows.append(self._tr('city', f'{code}/{city}.html', city.ljust(12, '0'), self._name(city, '市')))
+            return 'city', self._head('city') + ''.join(rows)
+        if len(parts) == 2 and len(code) == 4 and parts[0] == code[0:2] and self._exists('city', code):
+            rows = []
+            if self._is_direct_town_city(code):
+                # 不设县级的地级，页面直接列出乡级，链接相对于省级目录。
+                for i in range(1, self._sizes['town'] + 1):
+                    town = f'{code}00{i:03d}'
+                    rows.append(self._tr('town', f'{code[2:4]}/{town}.html', town.ljust(12, '0'), self._name(town, '镇')))
+                return 'town', self._head('town') + ''.join(rows)
+            for i in range(1, self._sizes['county'] + 1):
+                county = f'{code}{i:02d}'
+                # 每个地级的第一个县级为没有下级的市辖区
+                href = '' if i == 1 else f'{code[2:4]}/{county}.html'
+                rows.append(self._tr('county', href, county.ljust(12, '0'), '市辖区' if i == 1 else self._name(county, '县')))
+            return 'county', self._head('county') + ''.join(rows)
+        if len(parts) == 3 and len(code) == 9 and self._exists('town', code) and self._is_direct_town_city(code[0:4]):
+            return 'village', self._villages(code)
+        if len(parts) == 3 and len(code) == 6 and self._exists('county', code) and int(code[4:6]) > 1:
+            rows = []
+            for i in range(1, self._sizes['town'] + 1):
+                town = f'{code}{i:03d}'
+                rows.append(self._tr('town', f'{code[4:6]}/{town}.html', town.ljust(12, '0'), self._name(town, '镇')))
+            return 'town', self._head('town') + ''.join(rows)
+        if len(parts) == 4 and len(code) == 9 and self._exists('town', code) and int(code[4:6]) > 1:
+            return 'village', self._villages(code)
+        return None
+
+    def _exists(self, name, code):
+        """
+        检查代码是否在生成的范围内
+
+        :param name: 级别名称
+        :type name: str
+        :param code: 代码
+        :type code: str
+        :return: 是否存在
+        :rtype: bool
+        """
+        if not code.isdigit() or code[0:2] not in self._provinces:
+            return False
+        segments = {'city': [(2, 4, 'city')], 'county': [(2, 4, 'city'), (4, 6, 'county')],
+                    'town': [(2, 4, 'city'), (4, 6, 'county'), (6, 9, 'town')]}[name]
+        for begin, end, level in segments:
+            index = int(code[begin:end])
+            # 不设县级的地级下乡级代码的县级部分为 00
+            if level == 'county' and index == 0 and self._is_direct_town_city(code[0:4]):
+                continue
+            if not 1 <= index <= self._sizes[level]:
+                return False
+        return True
+
+    def _villages(self, town):
+        rows = []
+        for i in range(1, self._sizes['village'] + 1):
+            village = f'{town}{i:03d}'
+            category = random.Random(f'{self._seed}-{village}').choice(['111', '112', '121', '122', '210', '220'])
+            rows.append(f"<tr class='villagetr'><td>{village}</td><td>{category}</td>"
+                        f"<td>{self._name(village, '村民委员会')}</td></tr>")
+        return self._head('village') + ''.join(rows)
+
+    @staticmethod
+    def _head(name):
+        if name == 'village':
+            return "<tr class='villagehead'><td width=150>统计用区划代码</td><td width=100>城乡分类代码</td><td>名称</td></tr>"
+        return f"<tr class='{name}head'><td width=150>统计用区划代码</td><td>名称</td></tr>"
+
+    @staticmethod
+    def _tr(name, href, code, text):
+        if href == '':
+            return f"<tr class='{name}tr'><td>{code}</td><td>{text}</td></tr>"
+        return f"<tr class='{name}tr'><td><a href='{href}'>{code}</a></td><td><a href='{href}'>{text}</a></td></tr>"
+
+    def render(self, year, route):
+        """
+        生成完整的 GBK 编码页面
+
+        :param year: 年份
+        :type year: str
+        :param route: 年份之后的路由
+        :type route: str
+        :return: 页面内容，页面不存在时为 None。
+        :rtype: bytes
+        """
+        page = self.page(route)
+        if page is None:
+            return None
+        level, body = page
+        return (PAGE_HEAD.replace('$YEAR$', year).replace('$LEVEL$', level) + body + PAGE_TAIL).encode('gbk')
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    模拟站点请求处理
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if self.path == '/__stats':
+            with server.lock:
+                self._send(200, json.dumps(server.stats).encode('utf-8'), 'application/json')
+            return
+        with server.lock:
+            server.stats['requests'] += 1
+            # 限流：同一秒内超过限制的请求返回 403
+            now = int(time.time())
+            if server.window[0] != now:
+                server.window = [now, 0]
+            server.window[1] += 1
+            throttled = 0 < server.options.throttle < server.window[1]
+        if server.options.latency > 0 or server.options.jitter > 0:
+            time.sleep(server.options.latency + random.random() * server.options.jitter)
+        if throttled or random.random() < server.options.error_403:
+            self._count('403')
+            self._send(403, b'Forbidden')
+            return
+        year, _, route = self.path.lstrip('/').partition('/')
+        body = server.site.render(year, route) if random.random() >= server.options.error_404 else None
+        if body is None:
+            self._count('404')
+            self._send(404, b'Not Found')
+            return
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self._count('304')
+            self._send(304, b'', extra_headers={'ETag': etag})
+            return
+        self._count('200')
+        headers = {'ETag': etag}
+        raw_size = len(body)
+        if not server.options.no_gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, 6)
+            headers['Content-Encoding'] = 'gzip'
+        with server.lock:
+            server.stats['bytes'] += len(body)
+            server.stats['raw_bytes'] += raw_size
+        self._send(200, body, 'text/html', headers)
+
+    def _count(self, status):
+        with self.server.lock:
+            self.server.stats[status] += 1
+
+    def _send(self, status, body, content_type='text/plain', extra_headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(ThreadingMixIn, HTTPServer):
+    """
+    多线程模拟站点服务
+    """
+
+    daemon_threads = True
+
+    def __init__(self, options):
+        super(MockServer, self).__init__((options.host, options.port), MockHandler)
+        self.options = options
+        self.site = MockStatsGovCn(
+            options.provinces, options.cities, options.counties, options.towns, options.villages,
+            options.direct_town_cities, options.seed
+        )
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'bytes': 0, 'raw_bytes': 0, '200': 0, '304': 0, '403': 0, '404': 0}
+        self.window = [0, 0]
+
+
+def parse_args(args=None):
+    """
+    解析命令行参数
+
+    :param args: 命令行参数，为 None 时读取 sys.argv。
+    :type args: list
+    :return: 参数
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description='本地模拟国家统计局站点')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--provinces', type=int, default=3, help='省级数量')
+    parser.add_argument('--cities', type=int, default=4, help='每个省级下的地级数量')
+    parser.add_argument('--counties', type=int, default=5, help='每个地级下的县级数量（第一个为没有下级的市辖区）')
+    parser.add_argument('--towns', type=int, default=6, help='每个县级下的乡级数量')
+    parser.add_argument('--villages', type=int, default=8, help='每个乡级下的村级数量')
+    parser.add_argument('--direct-town-cities', type=int, default=0, help='每个省级下不设县级的地级数量')
+    parser.add_argument('--seed', type=int, default=0, help='名称生成种子')
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的固定延迟，单位为秒。')
+    parser.add_argument('--jitter', type=float, default=0, help='每个请求的随机附加延迟上限，单位为秒。')
+    parser.add_argument('--error-403', type=float, default=0, help='随机返回 403 的比例')
+    parser.add_argument('--error-404', type=float, default=0, help='随机返回 404 的比例')
+    parser.add_argument('--throttle', type=int, default=0, help='每秒最大请求数，超过的请求返回 403，0 为不限流。')
+    parser.add_argument('--no-gzip', action='store_true', help='不压缩响应')
+    return parser.parse_args(args)
+
+
+def main():
+    options = parse_args()
+    server = MockServer(options)
+    print(f'模拟站点已启动，抓取地址：http://{options.host}:{options.port}/2020/$ROUTE$', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
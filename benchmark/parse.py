@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+页面解析性能对比：原 PyQuery 解析（多次 find 检查页面级别后逐单元格取值）与 StatsGovCn.extract 单次扫描解析。
+
+页面来源为爬虫响应缓存数据库（默认 config.CRAWLER_CACHE_PATH，未设置时为 data/cache_stats.gov.cn.sqlite）或保存了 GBK 页面的目录。
+
+运行命令：
+    $ python3 -m benchmark.parse [缓存数据库文件或页面目录] [重复次数]
+"""
+import os
+import sqlite3
+import sys
+import time
+import zlib
+
+from pyquery import PyQuery
+
+import config
+from lib.crawler import LEVELS, LEVEL_CODE_LENGTHS, StatsGovCn
+
+
+def load_pages(path):
+    """
+    读取保存的页面
+
+    :param path: 缓存数据库文件或页面目录
+    :type path: str
+    :return: (链接或文件名, 页面内容) 数组
+    :rtype: list
+    """
+    pages = []
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for file in sorted(files):
+                if file.endswith('.html'):
+                    with open(os.path.join(root, file), 'rb') as f:
+                        pages.append((file, f.read().decode('gbk', errors='replace')))
+    else:
+        conn = sqlite3.connect(path)
+        for url, body in conn.execute(
+                'SELECT `response`.`url`, `page`.`body` FROM `response` '
+                'JOIN `page` ON `page`.`hash`=`response`.`hash` ORDER BY `response`.`url`;'):
+            pages.append((url, zlib.decompress(body).decode('gbk', errors='replace')))
+        conn.close()
+    return pages
+
+
+def pyquery_parse(html):
+    """
+    原 PyQuery 解析方式
+
+    :param html: 页面内容
+    :type html: str
+    :return: 页面级别名称与信息数组
+    :rtype: tuple
+    """
+    doc = PyQuery(html)
+    province_el = doc.find('.provincetr')
+    city_el = doc.find('.citytr')
+    county_el = doc.find('.countytr')
+    town_el = doc.find('.towntr')
+    village_el = doc.find('.villagetr')
+    result = []
+    if province_el:
+        for province_td in province_el.find('td').items():
+            province_a = province_td.find('a')
+            if province_a:
+                href_temp = province_a.attr('href')
+                result.append({
+                    'href': href_temp,
+                    'statistical_code': href_temp[0:2].ljust(12, '0'),
+                    'code': href_temp[0:2],
+                    'name': province_a.text()
+                })
+            elif province_td.text() != '':
+                result.append({
+                    'href': '',
+                    'statistical_code': province_td.text().ljust(12, '0'),
+                    'code': '',
+                    'name': province_td.text()
+                })
+        return 'province', result
+    for name, trs in (('city', city_el), ('county', county_el), ('town', town_el), ('village', village_el)):
+        if not trs:
+            continue
+        for tr in trs.items():
+            tds = tr.find('td')
+            td0 = tds.eq(0)
+            td_name = tds.eq(tds.length - 1)
+            href_temp = ''
+            if td0.find('a'):
+                href_temp = td0.find('a').attr('href')
+            result.append({
+                'href': href_temp,
+                'statistical_code': td0.text().ljust(12, '0'),
+                'code': td0.text()[0:LEVEL_CODE_LENGTHS[name]],
+                'name': td_name.text()
+            })
+        return name, result
+    return '', result
+
+
+def extract_parse(html):
+    """
+    StatsGovCn.extract 单次扫描解析方式
+
+    :param html: 页面内容
+    :type html: str
+    :return: 页面级别名称与信息数组
+    :rtype: tuple
+    """
+    name, rows = StatsGovCn.extract(html)
+    return name, StatsGovCn.parse(name, rows, '') if name != '' else []
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else config.CRAWLER_CACHE_PATH or \
+        f'{config.ROOT_PATH}data{os.sep}cache_stats.gov.cn.sqlite'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    pages = load_pages(path)
+    if len(pages) == 0:
+        print(f'{path} 中没有页面。')
+        return
+    print(f'页面 {len(pages)} 个，共 {sum(len(html) for _, html in pages)} 字符，重复 {repeat} 次。')
+
+    # 两种解析方式结果必须一致
+    for url, html in pages:
+        if pyquery_parse(html) != extract_parse(html):
+            print(f'[Error] 解析结果不一致：{url}')
+            return
+
+    counts = {}
+    for _, html in pages:
+        name = extract_parse(html)[0]
+        counts[name] = counts.get(name, 0) + 1
+    print('各级别页面数：' + '、'.join(f'{name} {counts[name]}' for name in LEVELS + [''] if name in counts))
+
+    elapsed = {}
+    for label, parse in (('pyquery', pyquery_parse), ('extract', extract_parse)):
+        begin_time = time.perf_counter()
+        for _ in range(repeat):
+            for _, html in pages:
+                parse(html)
+        elapsed[label] = time.perf_counter() - begin_time
+        print(f'{label:<8} {elapsed[label]:.3f} 秒，{len(pages) * repeat / elapsed[label]:.0f} 页/秒')
+    print(f'extract 耗时为 pyquery 的 {elapsed["extract"] / elapsed["pyquery"] * 100:.1f}%')
+
+
+if __name__ == '__main__':
+    main()
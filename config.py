@@ -29,6 +29,163 @@ CRAWLER_SLEEP_TIME = 0
 :rtype: int
 """
 
+CRAWLER_MODE = 'serial'
+"""
+爬虫抓取模式，'serial'=逐页串行抓取、'asyncio'=异步并发抓取、'thread'=多线程并发抓取、
+'distributed'=分布式抓取（页面通过 Redis 队列分发给各抓取节点，本进程只负责写入数据库，Redis 配置见 REDIS_HOST 等）。
+
+:type: str
+"""
+
+CRAWLER_CONCURRENCY = {'city': 4, 'county': 8, 'town': 16, 'village': 16}
+"""
+并发抓取时各级别的最大并发数（多线程抓取时为线程数）
+
+:type: dict
+"""
+
+CRAWLER_PIPELINE = False
+"""
+是否流水线抓取，为 True 时不再逐级等待，每个页面保存后其下级页面立即加入抓取队列，连接在整个抓取过程中保持繁忙。
+
+:type: bool
+"""
+
+CRAWLER_DEPTH_FIRST = False
+"""
+流水线抓取时是否深度优先，为 True 时优先抓取低级别及最新加入的页面，已抓取的子树能尽早完整可用。
+
+:type: bool
+"""
+
+CRAWLER_RATE_LIMIT = 0
+"""
+爬虫对同一主机每秒最大请求数，0 为不限速，所有抓取模式共享同一个令牌桶限速器。
+
+:type: float
+"""
+
+CRAWLER_RATE_BURST = 10
+"""
+爬虫对同一主机允许的最大突发请求数（令牌桶容量）
+
+:type: int
+"""
+
+CRAWLER_LEASE_TIME = 60
+"""
+分布式抓取时抓取节点领取页面的租约时长，单位为秒，节点中断等原因超时未返回结果的页面重新放入队列。
+
+:type: int
+"""
+
+CRAWLER_ADAPTIVE = True
+"""
+爬虫是否自适应调整并发数及每秒请求数，出现 403 或超时后减半，请求成功后逐步恢复到 CRAWLER_CONCURRENCY 及 CRAWLER_RATE_LIMIT；
+为 False 时只按重试等待时间重试。
+
+:type: bool
+"""
+
+CRAWLER_RETRY = 3
+"""
+爬虫每个页面出错后的最大重试次数，出错的页面延后重试，其它页面照常抓取，重试后仍失败的页面在抓取结束时列出。
+
+:type: int
+"""
+
+CRAWLER_RETRY_DELAY = 10
+"""
+爬虫页面出错后第一次重试前的等待时间，单位为秒，之后每次加倍，最长 300 秒。
+
+:type: int
+"""
+
+CRAWLER_BATCH_PAGES = 1
+"""
+每保存多少个页面提交一次数据库事务，页面信息批量插入，同一事务中的页面一起提交，中断后未提交的页面重新抓取。
+为 1 时每个页面提交一次，大量抓取时建议设置为 100。
+
+:type: int
+"""
+
+CRAWLER_WRITE_QUEUE = 0
+"""
+后台写入队列的最大页面数，解析后的页面放入队列由写入线程保存，抓取不等待写入数据库，队列满时抓取等待写入，
+内存中最多保留该数量的未保存页面。为 0 时在抓取循环中直接保存，建议设置为 1000。
+
+:type: int
+"""
+
+CRAWLER_CACHE_PATH = ''
+"""
+爬虫响应缓存数据库文件路径，页面内容按内容哈希压缩后只保存一份并保存其提取结果，不同年份内容相同的页面只解析一次，
+再次抓取时通过 ETag、Last-Modified 向站点重新验证，为空时不使用缓存。例如 f'{ROOT_PATH}data{os.sep}cache_stats.gov.cn.sqlite'。
+
+:type: str
+"""
+
+CRAWLER_CACHE_REVALIDATE = True
+"""
+是否向站点重新验证缓存，为 False 时命中缓存的页面直接从本地读取，不再发出请求（适合只修改了解析或表结构后的重新抓取）。
+
+:type: bool
+"""
+
+CRAWLER_REPLAY_PATH = ''
+"""
+爬虫回放来源，本地镜像目录（与 wget -m 的目录结构相同）或 WARC 归档文件（.warc、.warc.gz）路径，不为空时从中读取页面而不访问站点，
+页面链接仍按 STATS_GOV_CN_SITE 生成。
+
+:type: str
+"""
+
+CRAWLER_METRICS = False
+"""
+是否导出抓取指标，抓取过程中每 10 秒及结束时将各级别请求耗时直方图、响应字节数、解析及数据库耗时、各原因出错次数及吞吐量
+导出到数据目录下的 metrics_stats.gov.cn.prom（Prometheus 文本格式）及 metrics_stats.gov.cn.json 文件。
+
+:type: bool
+"""
+
+CRAWLER_INCREMENTAL = False
+"""
+是否以上一年的数据库为基准增量抓取，上一年数据库不存在时完整抓取。
+
+:type: bool
+"""
+
+CRAWLER_INCREMENTAL_LEVEL = 'town'
+"""
+增量抓取时开始与基准比较的页面级别，该级别及以下的页面与上一年相同时，视为其所有下级均未变化，直接复制上一年数据而不再抓取。
+下级页面的变化不一定体现在上级页面中，级别越高跳过的页面越多，漏掉变化的可能也越大；'village' 为只比较不跳过。
+
+:type: str
+"""
+
+DB_CRAWL_MODE = 'default'
+"""
+抓取时的数据库连接模式，'default'=SQLite 默认设置（回滚日志、每次提交同步到磁盘），
+'bulk'=批量写入（WAL 日志、synchronous=NORMAL、256 MB 页缓存、临时表放在内存中），大量抓取时建议使用。
+
+:type: str
+"""
+
+DB_EXPORT_MODE = 'read'
+"""
+导出时的数据库连接模式，'read'=只读导出（256 MB 页缓存、256 MB 内存映射读取、临时表放在内存中、禁止写入），
+'default'=SQLite 默认设置。
+
+:type: str
+"""
+
+HISTORY_DB_PATH = f'{ROOT_PATH}data{os.sep}db_stats.gov.cn.history.sqlite'
+"""
+多年份数据库文件路径，各年份的数据库按年份合并导入其中，每条信息带有效起止年份，只在名称或上级变化时保存新的一条。
+
+:type: str
+"""
+
 CSV_OUTPUT_FILE_ENCODING = 'UTF-8'
 """
 csv 输出文件的字符编码，默认为 UTF-8，为了 Microsoft Office Excel 可以正常显示可以设置为 GBK，但是 GBK 可能会出现字符编码异常导致程序运行失败。
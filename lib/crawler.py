@@ -1,9 +1,482 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import collections
 import copy
+import heapq
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
-from pyquery import PyQuery
-from requests_html import HTMLSession
+import lxml.html
+
+LEVELS = ['province', 'city', 'county', 'town', 'village']
+"""
+级别名称，由高到低。
+"""
+
+LEVEL_LABELS = {'province': '省级', 'city': '地级', 'county': '县级', 'town': '乡级', 'village': '村级'}
+"""
+级别中文名称
+"""
+
+LEVEL_TR_CLASSES = {f'{name}tr': name for name in LEVELS}
+"""
+各级别信息行的 class 名称
+"""
+
+LEVEL_CODE_LENGTHS = {'province': 2, 'city': 4, 'county': 6, 'town': 9, 'village': 12}
+"""
+各级别代码长度
+"""
+
+
+class PageNotFound(Exception):
+    """
+    页面不存在（404），有的节点有链接但其实没有下级页面。
+    """
+
+
+class WrongPageLevel(Exception):
+    """
+    页面不是预期级别的页面
+    """
+
+    def __init__(self, message, level=''):
+        super().__init__(message)
+        self.level = level
+        """
+        页面实际的级别名称，未识别时为 ''（可能是临时的错误页面）。
+        """
+
+
+class TokenBucket(object):
+    """
+    令牌桶限速器，按主机分别计数，线程安全，可供多个线程或协程共享。
+    """
+
+    def __init__(self, rate, burst=1):
+        self._rate = rate
+        """
+        每秒产生的令牌数，即每秒最大请求数，小于等于 0 时不限速。
+        """
+
+        self._burst = max(1, burst)
+        """
+        令牌桶容量，即允许的最大突发请求数。
+        """
+
+        self._buckets = {}
+        """
+        各主机的令牌数及最后更新时间
+        """
+
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, value):
+        with self._lock:
+            self._rate = value
+
+    @property
+    def burst(self):
+        return self._burst
+
+    def reserve(self, url):
+        """
+        预约一个令牌，返回取得令牌前需要等待的秒数。
+
+        :param url: 请求链接，按其主机计数。
+        :type url: str
+        :return: 需要等待的秒数
+        :rtype: float
+        """
+        if self._rate <= 0:
+            return 0
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (self._burst, now))
+            # 令牌数可以为负数，代表已被预约的令牌，等待时间按欠下的令牌数计算。
+            tokens = min(self._burst, tokens + (now - last) * self._rate) - 1
+            self._buckets[host] = (tokens, now)
+        return 0 if tokens >= 0 else -tokens / self._rate
+
+    def acquire(self, url):
+        """
+        阻塞直到取得一个令牌
+
+        :param url: 请求链接，按其主机计数。
+        :type url: str
+        :return:
+        """
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AdaptiveController(object):
+    """
+    AIMD 自适应并发控制器：出现 403 或超时时并发数及每秒请求数减半，请求成功时逐步增加，线程安全，可供多个线程或协程共享。
+
+    每秒请求数通过调整共享的限速器实现，最大值为限速器的初始速率，为 0 时不设上限。
+    """
+
+    def __init__(self, rate_limiter, max_concurrency=1, min_rate=0.1, cooldown=2, window=100):
+        self._rate_limiter = rate_limiter
+        """
+        共享的限速器
+        """
+
+        self._max_rate = rate_limiter.rate
+        """
+        每秒请求数上限，0 为不设上限。
+        """
+
+        self._min_rate = min_rate
+        """
+        每秒请求数下限
+        """
+
+        self._max_concurrency = max(1, max_concurrency)
+        """
+        并发数上限
+        """
+
+        self._concurrency = float(self._max_concurrency)
+        """
+        当前并发数，增加时按小数累计。
+        """
+
+        self._cooldown = cooldown
+        """
+        两次减半之间的最小间隔秒数，同一批请求的多个 403 只减半一次。
+        """
+
+        self._last_decrease = 0
+        """
+        最后一次减半的时间
+        """
+
+        self._outcomes = collections.deque(maxlen=window)
+        """
+        最近请求的完成时间及结果，结果为 'ok'、'403'、'timeout' 或 'error'。
+        """
+
+        self._running = 0
+        """
+        正在进行的请求数
+        """
+
+        self._last_report = time.monotonic()
+        """
+        最后一次输出状态的时间
+        """
+
+        self._async_waiters = collections.deque()
+        """
+        等待并发数的协程，元素为 (事件循环, Future)。控制器可由多个线程及事件循环共享，释放时通过所属事件循环唤醒。
+        """
+
+        self._condition = threading.Condition()
+
+    @property
+    def concurrency(self):
+        return int(self._concurrency)
+
+    @property
+    def rate(self):
+        return self._rate_limiter.rate
+
+    def try_acquire(self):
+        """
+        尝试占用一个并发数
+
+        :return: 是否占用成功
+        :rtype: bool
+        """
+        with self._condition:
+            if self._running < int(self._concurrency):
+                self._running += 1
+                return True
+            return False
+
+    def acquire(self):
+        """
+        阻塞直到占用一个并发数
+
+        :return:
+        """
+        with self._condition:
+            while self._running >= int(self._concurrency):
+                self._condition.wait()
+            self._running += 1
+
+    async def acquire_async(self):
+        """
+        等待直到占用一个并发数（协程），等待时不占用事件循环，释放并发数时被唤醒。
+
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._running < int(self._concurrency):
+                    self._running += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._condition:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                    except ValueError:
+                        # 已被唤醒，唤醒转给下一个等待的协程。
+                        self._wake_async(1)
+                raise
+
+    def _wake_async(self, count):
+        """
+        唤醒指定数量的等待并发数的协程，调用时需持有锁。
+
+        :param count: 唤醒数量
+        :type count: int
+        :return:
+        """
+        for _ in range(min(count, len(self._async_waiters))):
+            loop, waiter = self._async_waiters.popleft()
+            loop.call_soon_threadsafe(self._set_waiter, waiter)
+
+    @staticmethod
+    def _set_waiter(waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def release(self):
+        """
+        释放占用的并发数
+
+        :return:
+        """
+        with self._condition:
+            self._running -= 1
+            self._condition.notify()
+            self._wake_async(1)
+
+    def record(self, outcome):
+        """
+        记录请求结果并调整并发数及每秒请求数
+
+        :param outcome: 请求结果，'ok'=成功、'403'=被禁止访问、'timeout'=超时或连接错误、'error'=其它错误。
+        :type outcome: str
+        :return:
+        """
+        with self._condition:
+            now = time.monotonic()
+            self._outcomes.append((now, outcome))
+            if outcome == 'ok':
+                # 加性增加：每完成约一轮并发数的请求，并发数加 1；每秒请求数每秒约加 1。
+                self._concurrency = min(self._max_concurrency, self._concurrency + 1 / self._concurrency)
+                rate = self._rate_limiter.rate
+                if rate > 0:
+                    rate += 1 / rate
+                    self._rate_limiter.rate = min(self._max_rate, rate) if self._max_rate > 0 else rate
+                self._condition.notify_all()
+                self._wake_async(int(self._concurrency) - self._running)
+            elif outcome in ('403', 'timeout') and now - self._last_decrease >= self._cooldown:
+                # 乘性减少
+                self._last_decrease = now
+                self._concurrency = max(1.0, float(int(self._concurrency / 2)))
+                rate = self._rate_limiter.rate
+                if rate <= 0:
+                    # 不限速时按最近的实际请求速率减半
+                    rate = self._observed_rate() or 2 * self._min_rate
+                self._rate_limiter.rate = max(self._min_rate, rate / 2)
+                print(f'[Error] {"403" if outcome == "403" else "请求超时"}，'
+                      f'并发数降至 {self.concurrency}，每秒请求数降至 {self._rate_limiter.rate:.2f}。')
+
+    def _observed_rate(self):
+        """
+        最近请求的实际每秒请求数
+
+        :return: 每秒请求数，请求数不足时为 0。
+        :rtype: float
+        """
+        if len(self._outcomes) < 2:
+            return 0
+        elapsed = self._outcomes[-1][0] - self._outcomes[0][0]
+        return (len(self._outcomes) - 1) / elapsed if elapsed > 0 else 0
+
+    def status(self):
+        """
+        当前并发数、每秒请求数及最近请求的错误比例
+
+        :return: 状态说明
+        :rtype: str
+        """
+        with self._condition:
+            outcomes = [outcome for _, outcome in self._outcomes]
+            rate = self._rate_limiter.rate
+        ratios = '，'.join(
+            f'{label} {outcomes.count(outcome) / len(outcomes):.0%}' if outcomes else f'{label} 0%'
+            for outcome, label in (('403', '403'), ('timeout', '超时'), ('error', '其它错误'))
+        )
+        return f'并发数 {self.concurrency}/{self._max_concurrency}，' \
+               f'每秒请求数 {f"{rate:.2f}" if rate > 0 else "不限"}，最近 {len(outcomes)} 个请求中{ratios}'
+
+    def report(self, interval=10):
+        """
+        距上次输出超过指定秒数时返回状态说明，用于抓取过程中定期输出。
+
+        :param interval: 输出间隔秒数
+        :type interval: float
+        :return: 状态说明，未到输出时间时为 None。
+        :rtype: str
+        """
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_report < interval:
+                return None
+            self._last_report = now
+        return self.status()
+
+
+class RetryQueue(object):
+    """
+    延后重试队列：出错的页面按链接记录尝试次数，按指数退避的到期时间排队，到期后再取出重试，期间其它页面照常抓取。
+    """
+
+    def __init__(self, retry=3, delay=10, max_delay=300, metrics=None):
+        self._retry = retry
+        """
+        每个页面的最大重试次数
+        """
+
+        self._delay = delay
+        """
+        第一次重试前的等待秒数，之后每次加倍。
+        """
+
+        self._max_delay = max_delay
+        """
+        重试前的最大等待秒数
+        """
+
+        self._attempts = {}
+        """
+        各链接已失败的次数
+        """
+
+        self._heap = []
+        """
+        等待重试的页面，元素为 (到期时间, 序号, 级别名称, 页面)。
+        """
+
+        self._counter = 0
+        """
+        加入队列的序号，到期时间相同时按加入顺序取出。
+        """
+
+        self._failed = []
+        """
+        重试后仍失败的页面，元素为 (级别名称, 页面, 异常)。
+        """
+
+        self._metrics = metrics
+        """
+        抓取指标，按原因记录出错次数。
+        """
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def failed(self):
+        return self._failed
+
+    def push(self, name, task, error):
+        """
+        页面出错后加入重试队列
+
+        :param name: 级别名称
+        :type name: str
+        :param task: 页面，包含 url。
+        :type task: dict
+        :param error: 出错的异常
+        :type error: Exception
+        :return: 是否已加入队列，超过最大重试次数时为 False。
+        :rtype: bool
+        """
+        if self._metrics is not None:
+            self._metrics.observe_retry(name, self._metrics.cause(error))
+        attempts = self._attempts.get(task['url'], 0) + 1
+        self._attempts[task['url']] = attempts
+        if attempts > self._retry:
+            return False
+        delay = min(self._max_delay, self._delay * 2 ** (attempts - 1))
+        print(f'[Error] {error}')
+        print(f'[Error] 第 {attempts} 次出错，{delay} 秒后重试：{task["url"]}')
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._counter, name, task))
+        self._counter += 1
+        return True
+
+    def fail(self, name, task, error):
+        """
+        记录重试后仍失败的页面
+
+        :param name: 级别名称
+        :type name: str
+        :param task: 页面
+        :type task: dict
+        :param error: 最后一次出错的异常
+        :type error: Exception
+        :return:
+        """
+        self._failed.append((name, task, error))
+
+    def wait(self):
+        """
+        距最早到期的页面的秒数
+
+        :return: 等待秒数，队列为空时为 None。
+        :rtype: float
+        """
+        if not self._heap:
+            return None
+        return max(0, self._heap[0][0] - time.monotonic())
+
+    def pop_ready(self):
+        """
+        取出所有已到期的页面
+
+        :return: (级别名称, 页面) 数组
+        :rtype: list
+        """
+        ready = []
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, name, task = heapq.heappop(self._heap)
+            ready.append((name, task))
+        return ready
+
+    def wait_ready(self):
+        """
+        等待到最早到期的页面并取出所有已到期的页面，没有其它可抓取的页面时使用。
+
+        :return: (级别名称, 页面) 数组，队列为空时为空数组。
+        :rtype: list
+        """
+        wait = self.wait()
+        if wait is None:
+            return []
+        time.sleep(wait)
+        return self.pop_ready()
 
 
 class CrawlerBase(object):
@@ -14,15 +487,19 @@ class CrawlerBase(object):
     def __init__(self):
         self._headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_2) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/73.0.3683.86 Safari/537.36',
-            'Accept-Encoding': ''
+            # 页面以重复的表格标记为主，压缩传输可大幅减少传输量，响应由 HTTP 客户端解压后再按 GBK 解码。
+            'Accept-Encoding': 'gzip, deflate'
         }
         """
         头信息
         """
 
-        self._session = HTMLSession()
+        # HTTP 客户端在创建爬虫时才导入，只导出或查询数据时不加载。
+        import requests
+
+        self._session = requests.Session()
         """
-        HTMLSession 对象
+        requests.Session 对象，同一主机的请求复用连接池中的连接。
         """
 
 
@@ -34,6 +511,21 @@ class StatsGovCn(CrawlerBase):
     def __init__(self):
         super(StatsGovCn, self).__init__()
         self._sleep_time = 0
+        self._rate_limiter = None
+        self._cache = None
+        self._replay = None
+        self._controller = None
+        self._timeout = 30
+        self._metrics = None
+
+    @property
+    def rate_limiter(self):
+        return self._rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, value):
+        if value is None or isinstance(value, TokenBucket):
+            self._rate_limiter = value
 
     @property
     def sleep_time(self):
@@ -44,6 +536,64 @@ class StatsGovCn(CrawlerBase):
         if isinstance(value, int):
             self._sleep_time = value
 
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, value):
+        self._cache = value
+
+    @property
+    def replay(self):
+        return self._replay
+
+    @replay.setter
+    def replay(self, value):
+        self._replay = value
+
+    @property
+    def controller(self):
+        return self._controller
+
+    @controller.setter
+    def controller(self, value):
+        if value is None or isinstance(value, AdaptiveController):
+            self._controller = value
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, value):
+        self._metrics = value
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        if isinstance(value, (int, float)) and value > 0:
+            self._timeout = value
+
+    def copy_settings(self, crawler):
+        """
+        复制另一个爬虫的休眠时间、限速器、响应缓存、回放来源、自适应并发控制器、超时及抓取指标设置
+
+        :param crawler: 爬虫对象
+        :type crawler: StatsGovCn
+        :return:
+        """
+        self.sleep_time = crawler.sleep_time
+        self.rate_limiter = crawler.rate_limiter
+        self.cache = crawler.cache
+        self.replay = crawler.replay
+        self.controller = crawler.controller
+        self.timeout = crawler.timeout
+        self.metrics = crawler.metrics
+
     def province(self, url):
         """
         国家统计局省级抓取爬虫
@@ -52,62 +602,8 @@ class StatsGovCn(CrawlerBase):
         :type url: str
         :return: 省份信息数组，数组内元素包括链接、代码、名称、统计用区划代码。
         """
-
-        retry = 3
-        while True:
-            # 有的节点有链接但其实是 404 页面，也就是并没有下级信息了，所以捕获 404 异常并直接返回空数据。
-            try:
-                check_result = self.check(url)
-                if check_result[0] != 'province':
-                    retry -= 1
-                    if retry < 0:
-                        raise Exception('不是省级信息页面')
-                    else:
-                        print('[Error] 不是省级信息页面吗？休眠 10 秒再试一次。')
-                        time.sleep(10)
-                else:
-                    doc = check_result[1]
-                    break
-            except Exception as e:
-                # 如果错误信息是 404 则直接返回空信息
-                if e.args[0].find('404') != -1:
-                    return []
-                else:
-                    raise e
-
-        try:
-            result = []
-            province_trs = doc.find('.provincetr')
-            for province_tr in province_trs.items():
-                province_tds = province_tr.find('td')
-                for province_td in province_tds.items():
-                    province_el = province_td.find('a')
-                    if province_el:
-                        href_temp = province_el.attr('href')
-                        province = {
-                            'href': href_temp,
-                            'statistical_code': href_temp[0:2].ljust(12, '0'),
-                            'code': href_temp[0:2],
-                            'name': province_el.text()
-                        }
-                        result.append(province)
-                    else:
-                        name_temp = province_td.text()
-                        if name_temp != '':
-                            province = {
-                                'href': '',
-                                'statistical_code': name_temp.ljust(12, '0'),
-                                'code': '',
-                                'name': name_temp
-                            }
-                            result.append(province)
-            time.sleep(self._sleep_time)
-            return result
-        except Exception as e:
-            print(e)
-            print('[Error] province出错，休眠 30 秒重试。')
-            time.sleep(30)
-            self.province(url)
+        # 省级页面为入口页面，404 说明链接或年份错误，抛出异常而不是视为没有下级信息。
+        return self._level('province', url, missing_ok=False)
 
     def city(self, url):
         """
@@ -117,55 +613,7 @@ class StatsGovCn(CrawlerBase):
         :type url: str
         :return: 地级信息数组，数组内元素包括链接、代码、名称、统计用区划代码。
         """
-
-        retry = 3
-        while True:
-            # 有的节点有链接但其实是 404 页面，也就是并没有下级信息了，所以捕获 404 异常并直接返回空数据。
-            try:
-                check_result = self.check(url)
-                if check_result[0] != 'city':
-                    retry -= 1
-                    if retry < 0:
-                        raise Exception('不是地级信息页面')
-                    else:
-                        print('[Error] 不是地级信息页面吗？休眠 10 秒再试一次。')
-                        time.sleep(10)
-                else:
-                    doc = check_result[1]
-                    break
-            except Exception as e:
-                # 如果错误信息是 404 则直接返回空信息
-                if e.args[0].find('404') != -1:
-                    return []
-                else:
-                    raise e
-
-        try:
-            result = []
-            city_trs = doc.find('.citytr')
-            for city_tr in city_trs.items():
-                city_tds = city_tr.find('td')
-                if city_tds.length != 2:
-                    raise Exception(f'地级信息页面节点错误，url: {url}')
-                city_td0 = city_tds.eq(0)
-                city_td1 = city_tds.eq(1)
-                href_temp = ''
-                if city_td0.find('a'):
-                    href_temp = city_td0.find('a').attr('href')
-                city = {
-                    'href': href_temp,
-                    'statistical_code': city_td0.text().ljust(12, '0'),
-                    'code': city_td0.text()[0:4],
-                    'name': city_td1.text()
-                }
-                result.append(city)
-            time.sleep(self._sleep_time)
-            return result
-        except Exception as e:
-            print(e)
-            print('[Error] city出错，休眠 30 秒重试。')
-            time.sleep(30)
-            self.city(url)
+        return self._level('city', url)
 
     def county(self, url):
         """
@@ -175,55 +623,7 @@ class StatsGovCn(CrawlerBase):
         :type url: str
         :return: 县级信息数组，数组内元素包括链接、代码、名称、统计用区划代码。
         """
-
-        retry = 3
-        while True:
-            # 有的节点有链接但其实是 404 页面，也就是并没有下级信息了，所以捕获 404 异常并直接返回空数据。
-            try:
-                check_result = self.check(url)
-                if check_result[0] != 'county':
-                    retry -= 1
-                    if retry < 0:
-                        raise Exception('不是县级信息页面')
-                    else:
-                        print('[Error] 不是县级信息页面吗？休眠 10 秒再试一次。')
-                        time.sleep(10)
-                else:
-                    doc = check_result[1]
-                    break
-            except Exception as e:
-                # 如果错误信息是 404 则直接返回空信息
-                if e.args[0].find('404') != -1:
-                    return []
-                else:
-                    raise e
-
-        try:
-            result = []
-            county_trs = doc.find('.countytr')
-            for county_tr in county_trs.items():
-                county_tds = county_tr.find('td')
-                if county_tds.length != 2:
-                    raise Exception(f'县级信息页面节点错误，url: {url}')
-                county_td0 = county_tds.eq(0)
-                county_td1 = county_tds.eq(1)
-                href_temp = ''
-                if county_td0.find('a'):
-                    href_temp = county_td0.find('a').attr('href')
-                county = {
-                    'href': href_temp,
-                    'statistical_code': county_td0.text().ljust(12, '0'),
-                    'code': county_td0.text()[0:6],
-                    'name': county_td1.text()
-                }
-                result.append(county)
-            time.sleep(self._sleep_time)
-            return result
-        except Exception as e:
-            print(e)
-            print('[Error] county出错，休眠 30 秒重试。')
-            time.sleep(30)
-            self.county(url)
+        return self._level('county', url)
 
     def town(self, url):
         """
@@ -233,55 +633,7 @@ class StatsGovCn(CrawlerBase):
         :type url: str
         :return: 乡级信息数组，数组内元素包括链接、代码、名称、统计用区划代码。
         """
-
-        retry = 3
-        while True:
-            # 有的节点有链接但其实是 404 页面，也就是并没有下级信息了，所以捕获 404 异常并直接返回空数据。
-            try:
-                check_result = self.check(url)
-                if check_result[0] != 'town':
-                    retry -= 1
-                    if retry < 0:
-                        raise Exception('不是乡级信息页面')
-                    else:
-                        print('[Error] 不是乡级信息页面吗？休眠 10 秒再试一次。')
-                        time.sleep(10)
-                else:
-                    doc = check_result[1]
-                    break
-            except Exception as e:
-                # 如果错误信息是 404 则直接返回空信息
-                if e.args[0].find('404') != -1:
-                    return []
-                else:
-                    raise e
-
-        try:
-            result = []
-            town_trs = doc.find('.towntr')
-            for town_tr in town_trs.items():
-                town_tds = town_tr.find('td')
-                if town_tds.length != 2:
-                    raise Exception(f'乡级信息页面节点错误，url: {url}')
-                town_td0 = town_tds.eq(0)
-                town_td1 = town_tds.eq(1)
-                href_temp = ''
-                if town_td0.find('a'):
-                    href_temp = town_td0.find('a').attr('href')
-                town = {
-                    'href': href_temp,
-                    'statistical_code': town_td0.text().ljust(12, '0'),
-                    'code': town_td0.text()[0:9],
-                    'name': town_td1.text()
-                }
-                result.append(town)
-            time.sleep(self._sleep_time)
-            return result
-        except Exception as e:
-            print(e)
-            print('[Error] town出错，休眠 30 秒重试。')
-            time.sleep(30)
-            self.town(url)
+        return self._level('town', url)
 
     def village(self, url):
         """
@@ -291,101 +643,424 @@ class StatsGovCn(CrawlerBase):
         :type url: str
         :return: 村级信息数组，数组内元素包括链接、代码、名称、统计用区划代码。
         """
+        return self._level('village', url)
 
-        retry = 3
-        while True:
-            # 有的节点有链接但其实是 404 页面，也就是并没有下级信息了，所以捕获 404 异常并直接返回空数据。
-            try:
-                check_result = self.check(url)
-                if check_result[0] != 'village':
-                    retry -= 1
-                    if retry < 0:
-                        raise Exception('不是村级信息页面')
+    def _level(self, name, url, missing_ok=True):
+        """
+        抓取指定级别页面
+
+        :param name: 级别名称
+        :type name: str
+        :param url: 抓取链接
+        :type url: str
+        :param missing_ok: 页面 404 时是否返回空数据，为 False 时抛出 PageNotFound。
+        :type missing_ok: bool
+        :return: 指定级别信息数组，数组内元素包括链接、代码、名称、统计用区划代码。
+        :rtype: list
+        """
+        # 有的节点有链接但其实是 404 页面，也就是并没有下级信息了，所以捕获 404 异常并直接返回空数据。
+        # 其它错误（包括 403、超时等错误信息中链接含 404 的情况）直接抛出，由调用方稍后重试，不在此等待。
+        try:
+            check_result = self.check(url, name)
+        except PageNotFound:
+            if not missing_ok:
+                raise
+            if self._metrics is not None:
+                self._metrics.observe_retry(name, '404')
+            return []
+        if check_result[0] != name:
+            raise WrongPageLevel(f'不是{LEVEL_LABELS[name]}信息页面', check_result[0])
+        result = self._parse(name, check_result[1], url)
+        time.sleep(self._sleep_time)
+        return result
+
+    def check(self, url, name=''):
+        """
+        检查当前链接属于省级、地级、县级、乡级、村级中的哪个，并返回该级别的信息行。只请求一次，出错时抛出异常，由调用方决定是否重试。
+
+        :param url: 检查的链接地址
+        :type url: str
+        :param name: 预期的页面级别名称，仅用于记录抓取指标。
+        :type name: str
+        :return: 'province'=省级、'city'=地级、'county'=县级、'town'=乡级、'village'=村级、''=未匹配到，以及信息行数组。
+        """
+        import requests
+
+        if self._replay is not None:
+            return self._check_replay(url, name)
+        cached = self._cache.select(url) if self._cache is not None else None
+        if cached is not None and not self._cache.revalidate:
+            return self._extract_page(cached['body'], name, cached['hash'])
+        headers = copy.deepcopy(self._headers)
+        if cached is not None:
+            headers.update(self._cache.conditional_headers(cached))
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(url)
+        if self._controller is not None:
+            self._controller.acquire()
+        try:
+            begin = time.perf_counter()
+            response = self._session.get(url, headers=headers, timeout=self._timeout)
+            if self._metrics is not None:
+                # 已读取的原始字节数即压缩后的传输字节数
+                self._metrics.observe_request(
+                    name, time.perf_counter() - begin, len(response.content), response.raw.tell()
+                )
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            self._record('timeout')
+            raise e
+        finally:
+            if self._controller is not None:
+                self._controller.release()
+        if response.status_code == 403:
+            self._record('403')
+            raise Exception(f'403 Forbidden for url: {url}')
+        elif response.status_code == 304 and cached is not None:
+            self._record('ok')
+            return self._extract_page(cached['body'], name, cached['hash'])
+        elif response.status_code == 404:
+            self._record('error')
+            raise PageNotFound(f'404 Not Found for url: {url}')
+        elif response.status_code != 200:
+            self._record('error')
+            response.raise_for_status()
+            raise Exception(f'{response.status_code} Error for url: {url}')
+        self._record('ok')
+        page_hash = ''
+        if self._cache is not None:
+            page_hash = self._cache.save(
+                url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified')
+            )
+        return self._extract_page(response.content, name, page_hash)
+
+    def _record(self, outcome):
+        """
+        向自适应并发控制器记录请求结果
+
+        :param outcome: 请求结果，'ok'、'403'、'timeout' 或 'error'。
+        :type outcome: str
+        :return:
+        """
+        if self._controller is not None:
+            self._controller.record(outcome)
+
+    def _check_replay(self, url, name=''):
+        """
+        从回放来源读取页面并检查页面级别，页面不存在时按 404 处理。
+
+        :param url: 检查的链接地址
+        :type url: str
+        :param name: 预期的页面级别名称，仅用于记录抓取指标。
+        :type name: str
+        :return: 页面级别名称（未匹配到为 ''）与信息行数组
+        :rtype: tuple
+        """
+        body = self._replay.read(url)
+        if body is None:
+            raise PageNotFound(f'404 Not Found for url: {url}')
+        return self._extract(body.decode('gbk', errors='replace'), name)
+
+    def _extract_page(self, body, name='', page_hash=''):
+        """
+        提取页面信息行，启用响应缓存时按页面内容哈希复用已保存的提取结果，内容相同的页面只解析一次。
+
+        :param body: 页面内容（未解码的原始内容）
+        :type body: bytes
+        :param name: 预期的页面级别名称，仅用于记录抓取指标。
+        :type name: str
+        :param page_hash: 页面内容哈希，为空时不复用提取结果。
+        :type page_hash: str
+        :return: 页面级别名称（未匹配到为 ''）与信息行数组
+        :rtype: tuple
+        """
+        if self._cache is None or page_hash == '':
+            return self._extract(body.decode('gbk', errors='replace'), name)
+        result = self._cache.select_extract(page_hash)
+        if result is None:
+            result = self._extract(body.decode('gbk', errors='replace'), name)
+            self._cache.save_extract(page_hash, result)
+        return result
+
+    def _extract(self, html, name=''):
+        """
+        提取页面信息行并记录解析耗时
+
+        :param html: 页面内容
+        :type html: str
+        :param name: 预期的页面级别名称，仅用于记录抓取指标。
+        :type name: str
+        :return: 页面级别名称（未匹配到为 ''）与信息行数组
+        :rtype: tuple
+        """
+        begin = time.perf_counter()
+        result = self.extract(html)
+        if self._metrics is not None:
+            self._metrics.observe_parse(name, time.perf_counter() - begin)
+        return result
+
+    def _parse(self, name, rows, url):
+        """
+        将信息行转换为信息数组并记录解析耗时
+
+        :param name: 级别名称
+        :type name: str
+        :param rows: 信息行数组
+        :type rows: list
+        :param url: 页面链接
+        :type url: str
+        :return: 指定级别信息数组
+        :rtype: list
+        """
+        begin = time.perf_counter()
+        result = self.parse(name, rows, url)
+        if self._metrics is not None:
+            self._metrics.observe_parse(name, time.perf_counter() - begin)
+        return result
+
+    @staticmethod
+    def extract(html):
+        """
+        单次扫描页面，检查页面属于省级、地级、县级、乡级、村级中的哪个，并提取该级别的信息行。
+
+        :param html: 页面内容
+        :type html: str
+        :return: 页面级别名称（未匹配到为 ''）与信息行数组，信息行为 (链接, 代码, 名称)，节点数量错误的行为 None。
+        :rtype: tuple
+        """
+        rows = {}
+        for tr in lxml.html.fromstring(html).iter('tr'):
+            name = LEVEL_TR_CLASSES.get(tr.get('class'))
+            if name is None:
+                continue
+            level_rows = rows.setdefault(name, [])
+            tds = tr.findall('td')
+            if name == 'province':
+                # 省级页面每个单元格为一个省份，有链接的取链接及名称，没有链接的只取名称。
+                for td in tds:
+                    a = td.find('.//a')
+                    if a is not None:
+                        level_rows.append((a.get('href'), '', _text(a)))
                     else:
-                        print('[Error] 不是村级信息页面吗？休眠 10 秒再试一次。')
-                        time.sleep(10)
-                else:
-                    doc = check_result[1]
-                    break
-            except Exception as e:
-                # 如果错误信息是 404 则直接返回空信息
-                if e.args[0].find('404') != -1:
-                    return []
-                else:
-                    raise e
+                        text = _text(td)
+                        if text != '':
+                            level_rows.append(('', '', text))
+            elif len(tds) != (3 if name == 'village' else 2):
+                level_rows.append(None)
+            else:
+                # 村级页面多一列城乡分类代码，名称在最后一列。
+                a = tds[0].find('.//a')
+                level_rows.append((a.get('href') if a is not None else '', _text(tds[0]), _text(tds[-1])))
+        for name in LEVELS:
+            if name in rows:
+                return name, rows[name]
+        return '', []
+
+    @staticmethod
+    def parse(name, rows, url):
+        """
+        将指定级别页面的信息行转换为信息数组
+
+        :param name: 级别名称
+        :type name: str
+        :param rows: 信息行数组，由 extract 提取。
+        :type rows: list
+        :param url: 页面链接，仅用于错误信息。
+        :type url: str
+        :return: 指定级别信息数组，数组内元素包括链接、代码、名称、统计用区划代码。
+        :rtype: list
+        """
+        result = []
+        for row in rows:
+            if row is None:
+                raise Exception(f'{LEVEL_LABELS[name]}信息页面节点错误，url: {url}')
+            href, code, text = row
+            if name == 'province':
+                result.append({
+                    'href': href,
+                    'statistical_code': (href[0:2] if href != '' else text).ljust(12, '0'),
+                    'code': href[0:2],
+                    'name': text
+                })
+            else:
+                result.append({
+                    'href': href,
+                    'statistical_code': code.ljust(12, '0'),
+                    'code': code[0:LEVEL_CODE_LENGTHS[name]],
+                    'name': text
+                })
+        return result
+
+
+def _text(el):
+    """
+    取节点文本，连续空白合并为一个空格并去除首尾空白。
+
+    :param el: 节点
+    :type el: lxml.html.HtmlElement
+    :return: 文本
+    :rtype: str
+    """
+    return ' '.join(el.text_content().split())
+
 
+class ThreadPoolStatsGovCn(StatsGovCn):
+    """
+    国家统计局多线程爬虫，所有线程共享同一个连接池及限速器。
+    """
+
+    def __init__(self, pool_size=10):
+        super(ThreadPoolStatsGovCn, self).__init__()
+        from requests.adapters import HTTPAdapter
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def imap(self, name, urls, workers=10):
+        """
+        多线程抓取指定级别的多个页面
+
+        :param name: 级别名称
+        :type name: str
+        :param urls: 抓取链接
+        :type urls: list
+        :param workers: 线程数
+        :type workers: int
+        :return: 按 urls 顺序生成各页面的 Future 对象，其结果为页面信息数组。
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 只提交有限数量的页面，避免已完成但未被取走的结果占用过多内存。
+            futures = collections.deque()
+            for url in urls:
+                futures.append(executor.submit(self._level, name, url))
+                if len(futures) >= workers * 4:
+                    yield futures.popleft()
+            while futures:
+                yield futures.popleft()
+
+
+class AsyncStatsGovCn(StatsGovCn):
+    """
+    国家统计局异步爬虫，页面检测及解析与 StatsGovCn 相同，抓取方法均为协程。
+    """
+
+    def __init__(self, concurrency=10):
+        super(AsyncStatsGovCn, self).__init__()
+        self._concurrency = concurrency
+        """
+        连接池最大连接数
+        """
+
+        self._async_session = None
+        """
+        aiohttp.ClientSession 对象，需在事件循环中通过 open 创建。
+        """
+
+    async def open(self):
+        """
+        创建异步会话
+
+        :return:
+        """
+        import aiohttp
+
+        self._async_session = aiohttp.ClientSession(
+            headers=copy.deepcopy(self._headers),
+            connector=aiohttp.TCPConnector(limit=self._concurrency),
+            timeout=aiohttp.ClientTimeout(total=self._timeout)
+        )
+
+    async def close(self):
+        """
+        关闭异步会话
+
+        :return:
+        """
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+
+    async def _level(self, name, url, missing_ok=True):
+        """
+        抓取指定级别页面（协程）
+
+        :param name: 级别名称
+        :type name: str
+        :param url: 抓取链接
+        :type url: str
+        :param missing_ok: 页面 404 时是否返回空数据，为 False 时抛出 PageNotFound。
+        :type missing_ok: bool
+        :return: 指定级别信息数组，数组内元素包括链接、代码、名称、统计用区划代码。
+        :rtype: list
+        """
         try:
-            result = []
-            village_trs = doc.find('.villagetr')
-            for village_tr in village_trs.items():
-                village_tds = village_tr.find('td')
-                if village_tds.length != 3:
-                    raise Exception(f'村级信息页面节点错误，url: {url}')
-                village_td0 = village_tds.eq(0)
-                village_td2 = village_tds.eq(2)
-                href_temp = ''
-                if village_td0.find('a'):
-                    href_temp = village_td0.find('a').attr('href')
-                village = {
-                    'href': href_temp,
-                    'statistical_code': village_td0.text().ljust(12, '0'),
-                    'code': village_td0.text()[0:12],
-                    'name': village_td2.text()
-                }
-                result.append(village)
-            time.sleep(self._sleep_time)
-            return result
-        except Exception as e:
-            print(e)
-            print('[Error] village出错，休眠 30 秒重试。')
-            time.sleep(30)
-            self.village(url)
-
-    def check(self, url, retry=3):
-        """
-        检查当前链接属于省级、地级、县级、乡级、村级中的哪个，并返回文档对象。
+            check_result = await self.check(url, name)
+        except PageNotFound:
+            if not missing_ok:
+                raise
+            if self._metrics is not None:
+                self._metrics.observe_retry(name, '404')
+            return []
+        if check_result[0] != name:
+            raise WrongPageLevel(f'不是{LEVEL_LABELS[name]}信息页面', check_result[0])
+        result = self._parse(name, check_result[1], url)
+        await asyncio.sleep(self._sleep_time)
+        return result
+
+    async def check(self, url, name=''):
+        """
+        检查当前链接属于省级、地级、县级、乡级、村级中的哪个，并返回该级别的信息行（协程）。只请求一次，出错时抛出异常。
 
         :param url: 检查的链接地址
         :type url: str
-        :param retry: 重试次数
-        :type retry: int
-        :return: 'province'=省级、'city'=地级、'county'=县级、'town'=乡级、'village'=村级、''=未匹配到
+        :param name: 预期的页面级别名称，仅用于记录抓取指标。
+        :type name: str
+        :return: 页面级别名称（未匹配到为 ''）与信息行数组
         """
-        while True:
-            try:
-                response = self._session.get(url, headers=copy.deepcopy(self._headers))
-                response.encoding = 'gbk'
-                if response.status_code == 403:
-                    print('[Error] 403 休眠 5 分钟重试。')
-                    time.sleep(300)
-                elif response.status_code != 200:
-                    raise Exception(response.raise_for_status())
-                else:
-                    doc = PyQuery(response.text)
-                    province_el = doc.find('.provincetr')
-                    city_el = doc.find('.citytr')
-                    county_el = doc.find('.countytr')
-                    town_el = doc.find('.towntr')
-                    village_el = doc.find('.villagetr')
-                    if province_el:
-                        return 'province', doc
-                    if city_el:
-                        return 'city', doc
-                    if county_el:
-                        return 'county', doc
-                    if town_el:
-                        return 'town', doc
-                    if village_el:
-                        return 'village', doc
-                    return '', doc
-            except Exception as e:
-                retry = retry - 1
-                if retry < 0:
-                    raise e
-                else:
-                    print(e)
-                    print('[Error] check出错，休眠 30 秒重试。')
-                    time.sleep(30)
+        import aiohttp
+
+        if self._replay is not None:
+            return self._check_replay(url, name)
+        cached = self._cache.select(url) if self._cache is not None else None
+        if cached is not None and not self._cache.revalidate:
+            return self._extract_page(cached['body'], name, cached['hash'])
+        headers = self._cache.conditional_headers(cached) if cached is not None else {}
+        if self._rate_limiter is not None:
+            await asyncio.sleep(self._rate_limiter.reserve(url))
+        if self._controller is not None:
+            await self._controller.acquire_async()
+        try:
+            begin = time.perf_counter()
+            async with self._async_session.get(url, headers=headers) as response:
+                status = response.status
+                body = await response.read() if status == 200 else b''
+                reason = response.reason
+                etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+                # 压缩传输时的原始字节数，aiohttp 3.11 以下版本没有该属性，按解压后字节数计。
+                wire_size = getattr(response.content, 'total_raw_bytes', len(body))
+            if self._metrics is not None:
+                self._metrics.observe_request(name, time.perf_counter() - begin, len(body), wire_size)
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            self._record('timeout')
+            raise e
+        finally:
+            if self._controller is not None:
+                self._controller.release()
+        if status == 403:
+            self._record('403')
+            raise Exception(f'403 Forbidden for url: {url}')
+        elif status == 304 and cached is not None:
+            self._record('ok')
+            return self._extract_page(cached['body'], name, cached['hash'])
+        elif status == 404:
+            self._record('error')
+            raise PageNotFound(f'404 Not Found for url: {url}')
+        elif status != 200:
+            self._record('error')
+            raise Exception(f'{status} Error: {reason} for url: {url}')
+        self._record('ok')
+        page_hash = self._cache.save(url, body, etag, last_modified) if self._cache is not None else ''
+        return self._extract_page(body, name, page_hash)
 
 
 if __name__ == '__main__':
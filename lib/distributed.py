@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import json
+
+CLAIM_SCRIPT = """
+local item = redis.call('LPOP', KEYS[1])
+if not item then
+    return item
+end
+local now = redis.call('TIME')
+local lease = redis.call('INCR', KEYS[3]) .. '|' .. item
+redis.call('ZADD', KEYS[2], tonumber(now[1]) + tonumber(ARGV[1]), lease)
+return lease
+"""
+"""
+取出一个待抓取页面并登记租约，租约到期时间按 Redis 服务器时间计算，不受各节点时钟差异影响。
+租约为 “领取序号|页面”，同一页面租约到期后被其它节点再次领取时租约不同，先领取的节点迟到的结果不会释放后领取节点的租约。
+"""
+
+REQUEUE_SCRIPT = """
+local now = redis.call('TIME')
+local leases = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', tonumber(now[1]))
+for _, lease in ipairs(leases) do
+    redis.call('ZREM', KEYS[2], lease)
+    redis.call('RPUSH', KEYS[1], string.sub(lease, string.find(lease, '|', 1, true) + 1))
+end
+return #leases
+"""
+"""
+租约已到期的页面去掉领取序号后重新加入待抓取队列
+"""
+
+
+class RedisCrawlQueue(object):
+    """
+    基于 Redis 的分布式抓取队列：写入进程放入待抓取页面并取回抓取结果，各抓取节点领取页面时登记租约，
+    节点中断后未完成页面的租约到期，由写入进程重新放入队列。
+    """
+
+    def __init__(self, redis_util, name, lease_time=60):
+        self._redis = redis_util
+        """
+        Redis 连接对象
+        """
+
+        self._keys = {key: f'crawl:{name}:{key}' for key in ('pending', 'leases', 'results', 'done', 'claims')}
+        """
+        队列各部分的键名：待抓取页面列表、租约有序集合、抓取结果列表、完成标记、领取序号。
+        """
+
+        self._lease_time = lease_time
+        """
+        租约时长，单位为秒，节点领取页面后超过该时间未返回结果时页面重新放入队列。
+        """
+
+        self._claim = redis_util.register_script(CLAIM_SCRIPT)
+        self._requeue = redis_util.register_script(REQUEUE_SCRIPT)
+
+    def reset(self):
+        """
+        清空队列，写入进程开始抓取前调用。
+
+        :return:
+        """
+        self._redis.delete(*self._keys.values())
+
+    def put(self, name, task):
+        """
+        放入待抓取页面
+
+        :param name: 级别名称
+        :type name: str
+        :param task: 页面
+        :type task: dict
+        :return:
+        """
+        self._redis.rpush(self._keys['pending'], json.dumps({'level': name, 'task': task}, ensure_ascii=False))
+
+    def claim(self):
+        """
+        领取一个待抓取页面并登记租约
+
+        :return: 领取凭据（租约）及 (级别名称, 页面)，队列为空时为 None。
+        :rtype: tuple
+        """
+        lease = self._claim(
+            keys=[self._keys['pending'], self._keys['leases'], self._keys['claims']], args=[self._lease_time]
+        )
+        if lease is None:
+            return None
+        data = json.loads(lease[lease.index('|') + 1:])
+        return lease, (data['level'], data['task'])
+
+    def complete(self, lease, rows=None, error=None, page_level=''):
+        """
+        返回抓取结果并释放本次领取的租约。租约已到期时结果仍然返回，写入进程只保存同一页面第一次取回的结果。
+
+        :param lease: 领取凭据（租约）
+        :type lease: str
+        :param rows: 页面信息数组
+        :type rows: list
+        :param error: 抓取出错时的错误信息
+        :type error: str
+        :param page_level: 页面不是预期级别时页面实际的级别名称，见 WrongPageLevel。
+        :type page_level: str
+        :return: 租约是否仍有效，为 False 时租约已到期，页面已重新放入队列或由其它节点领取。
+        :rtype: bool
+        """
+        data = json.loads(lease[lease.index('|') + 1:])
+        data.update({'rows': rows, 'error': error, 'page_level': page_level})
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zrem(self._keys['leases'], lease)
+        pipe.rpush(self._keys['results'], json.dumps(data, ensure_ascii=False))
+        removed, _ = pipe.execute()
+        return removed > 0
+
+    def result(self, timeout=1):
+        """
+        取回一个抓取结果
+
+        :param timeout: 等待秒数
+        :type timeout: int
+        :return: 抓取结果，包括 level、task、rows、error、page_level，超时为 None。
+        :rtype: dict
+        """
+        item = self._redis.blpop([self._keys['results']], timeout)
+        return json.loads(item[1]) if item is not None else None
+
+    def requeue_expired(self):
+        """
+        租约已到期的页面重新放入待抓取队列
+
+        :return: 重新放入的页面数
+        :rtype: int
+        """
+        return self._requeue(keys=[self._keys['pending'], self._keys['leases']])
+
+    def finish(self):
+        """
+        标记抓取完成，各抓取节点看到标记后退出。
+
+        :return:
+        """
+        self._redis.set(self._keys['done'], 1)
+
+    def finished(self):
+        """
+        是否已标记抓取完成
+
+        :return: 是否完成
+        :rtype: bool
+        """
+        return self._redis.exists(self._keys['done']) > 0
+
+
+if __name__ == '__main__':
+    pass
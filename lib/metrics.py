@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+"""
+请求耗时直方图的桶上限，单位为秒，最后另有 +Inf 桶。
+"""
+
+RETRY_CAUSES = ['403', '404', 'wrong_page', 'timeout', 'exception']
+"""
+出错原因：403、404、不是对应级别页面、超时或连接错误、其它异常。
+"""
+
+
+class CrawlMetrics(object):
+    """
+    抓取指标：按级别统计请求耗时直方图、响应字节数、解析耗时、数据库耗时、各原因的出错重试次数及吞吐量，
+    可导出为 Prometheus 文本文件及 JSON 汇总，线程安全。
+    """
+
+    def __init__(self):
+        self._levels = {}
+        """
+        各级别的指标
+        """
+
+        self._begin_time = time.time()
+        """
+        开始统计的时间
+        """
+
+        self._last_export = time.monotonic()
+        """
+        最后一次导出的时间
+        """
+
+        self._lock = threading.Lock()
+
+    def _level(self, name):
+        """
+        取指定级别的指标，不存在时创建，需在锁内调用。
+
+        :param name: 级别名称
+        :type name: str
+        :return: 指标
+        :rtype: dict
+        """
+        if name not in self._levels:
+            self._levels[name] = {
+                'requests': 0,
+                'latency_buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                'latency_sum': 0.0,
+                'latency_max': 0.0,
+                'bytes': 0,
+                'wire_bytes': 0,
+                'parse_seconds': 0.0,
+                'db_seconds': 0.0,
+                'pages': 0,
+                'rows': 0,
+                'retries': {cause: 0 for cause in RETRY_CAUSES},
+            }
+        return self._levels[name]
+
+    def observe_request(self, name, seconds, size, wire_size=None):
+        """
+        记录一次请求
+
+        :param name: 级别名称
+        :type name: str
+        :param seconds: 请求耗时
+        :type seconds: float
+        :param size: 响应字节数（解压后）
+        :type size: int
+        :param wire_size: 传输字节数（压缩传输时为压缩后的字节数），为 None 时与 size 相同。
+        :type wire_size: int
+        :return:
+        """
+        with self._lock:
+            level = self._level(name)
+            level['requests'] += 1
+            level['latency_sum'] += seconds
+            level['latency_max'] = max(level['latency_max'], seconds)
+            level['bytes'] += size
+            level['wire_bytes'] += size if wire_size is None else wire_size
+            index = len(LATENCY_BUCKETS)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    index = i
+                    break
+            level['latency_buckets'][index] += 1
+
+    def observe_parse(self, name, seconds):
+        """
+        记录一次页面解析耗时
+
+        :param name: 级别名称
+        :type name: str
+        :param seconds: 耗时
+        :type seconds: float
+        :return:
+        """
+        with self._lock:
+            self._level(name)['parse_seconds'] += seconds
+
+    def observe_page(self, name, rows, db_seconds):
+        """
+        记录一个已保存的页面
+
+        :param name: 级别名称
+        :type name: str
+        :param rows: 页面信息数
+        :type rows: int
+        :param db_seconds: 保存耗时
+        :type db_seconds: float
+        :return:
+        """
+        with self._lock:
+            level = self._level(name)
+            level['pages'] += 1
+            level['rows'] += rows
+            level['db_seconds'] += db_seconds
+
+    def observe_retry(self, name, cause):
+        """
+        记录一次出错
+
+        :param name: 级别名称
+        :type name: str
+        :param cause: 出错原因，取值见 RETRY_CAUSES。
+        :type cause: str
+        :return:
+        """
+        with self._lock:
+            self._level(name)['retries'][cause] += 1
+
+    @staticmethod
+    def cause(error):
+        """
+        按异常判断出错原因
+
+        :param error: 异常
+        :type error: Exception
+        :return: 出错原因，取值见 RETRY_CAUSES。
+        :rtype: str
+        """
+        message = str(error.args[0]) if error.args else ''
+        if message.startswith('不是') and message.endswith('信息页面'):
+            return 'wrong_page'
+        # 按状态码开头判断，错误信息中的链接可能包含 403、404，例如 44/4404.html。
+        if message.startswith('403 '):
+            return '403'
+        if message.startswith('404 '):
+            return '404'
+        # requests、aiohttp 及内置的超时、连接错误类名均包含 Timeout 或 Connect
+        if type(error).__name__.find('Timeout') != -1 or type(error).__name__.find('Connect') != -1:
+            return 'timeout'
+        return 'exception'
+
+    def summary(self):
+        """
+        JSON 汇总：各级别及合计的页面数、信息数、请求数、字节数、耗时分位数、各阶段耗时、出错次数及每秒页面数。
+
+        :return: 汇总
+        :rtype: dict
+        """
+        with self._lock:
+            elapsed = time.time() - self._begin_time
+            levels = {}
+            for name, level in self._levels.items():
+                requests = level['requests']
+                levels[name] = {
+                    'pages': level['pages'],
+                    'rows': level['rows'],
+                    'requests': requests,
+                    'bytes': level['bytes'],
+                    'wire_bytes': level['wire_bytes'],
+                    'bytes_saved': level['bytes'] - level['wire_bytes'],
+                    'latency_seconds': {
+                        'mean': level['latency_sum'] / requests if requests else 0,
+                        'p50': _bucket_quantile(level['latency_buckets'], 0.5),
+                        'p90': _bucket_quantile(level['latency_buckets'], 0.9),
+                        'p99': _bucket_quantile(level['latency_buckets'], 0.99),
+                        'max': level['latency_max'],
+                    },
+                    # 各阶段累计耗时，并发抓取时请求耗时为各请求之和，可能大于总耗时。
+                    'stage_seconds': {
+                        'request': level['latency_sum'],
+                        'parse': level['parse_seconds'],
+                        'db': level['db_seconds'],
+                    },
+                    'retries': dict(level['retries']),
+                    'pages_per_second': level['pages'] / elapsed if elapsed > 0 else 0,
+                    'rows_per_second': level['rows'] / elapsed if elapsed > 0 else 0,
+                }
+        pages = sum(level['pages'] for level in levels.values())
+        rows = sum(level['rows'] for level in levels.values())
+        return {
+            'elapsed_seconds': elapsed,
+            'pages': pages,
+            'rows': rows,
+            'bytes': sum(level['bytes'] for level in levels.values()),
+            'wire_bytes': sum(level['wire_bytes'] for level in levels.values()),
+            'bytes_saved': sum(level['bytes_saved'] for level in levels.values()),
+            'pages_per_second': pages / elapsed if elapsed > 0 else 0,
+            'rows_per_second': rows / elapsed if elapsed > 0 else 0,
+            'stage_seconds': {
+                stage: sum(level['stage_seconds'][stage] for level in levels.values())
+                for stage in ('request', 'parse', 'db')
+            },
+            'levels': levels,
+        }
+
+    def prometheus(self):
+        """
+        Prometheus 文本格式的指标
+
+        :return: 指标文本
+        :rtype: str
+        """
+        with self._lock:
+            elapsed = time.time() - self._begin_time
+            levels = json.loads(json.dumps(self._levels))
+        lines = [
+            '# HELP stats_gov_cn_request_duration_seconds 请求耗时',
+            '# TYPE stats_gov_cn_request_duration_seconds histogram',
+        ]
+        for name, level in levels.items():
+            count = 0
+            for bound, value in zip(LATENCY_BUCKETS + ['+Inf'], level['latency_buckets']):
+                count += value
+                lines.append(f'stats_gov_cn_request_duration_seconds_bucket{{level="{name}",le="{bound}"}} {count}')
+            lines.append(f'stats_gov_cn_request_duration_seconds_sum{{level="{name}"}} {level["latency_sum"]}')
+            lines.append(f'stats_gov_cn_request_duration_seconds_count{{level="{name}"}} {count}')
+        for metric, key, help_text in (
+                ('response_bytes_total', 'bytes', '响应字节数（解压后）'),
+                ('wire_bytes_total', 'wire_bytes', '传输字节数（压缩后）'),
+                ('parse_seconds_total', 'parse_seconds', '页面解析耗时'),
+                ('db_seconds_total', 'db_seconds', '数据库保存耗时'),
+                ('pages_total', 'pages', '已保存页面数'),
+                ('rows_total', 'rows', '已保存信息数'),
+        ):
+            lines.append(f'# HELP stats_gov_cn_{metric} {help_text}')
+            lines.append(f'# TYPE stats_gov_cn_{metric} counter')
+            for name, level in levels.items():
+                lines.append(f'stats_gov_cn_{metric}{{level="{name}"}} {level[key]}')
+        lines.append('# HELP stats_gov_cn_retries_total 各原因的出错次数')
+        lines.append('# TYPE stats_gov_cn_retries_total counter')
+        for name, level in levels.items():
+            for cause, value in level['retries'].items():
+                lines.append(f'stats_gov_cn_retries_total{{level="{name}",cause="{cause}"}} {value}')
+        lines.append('# HELP stats_gov_cn_elapsed_seconds 抓取已运行时间')
+        lines.append('# TYPE stats_gov_cn_elapsed_seconds gauge')
+        lines.append(f'stats_gov_cn_elapsed_seconds {elapsed}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """
+        导出指标，Prometheus 文本文件为 path + '.prom'，JSON 汇总为 path + '.json'，先写临时文件再替换，读取时不会读到一半的文件。
+
+        :param path: 导出文件路径（不含扩展名）
+        :type path: str
+        :return:
+        """
+        for extension, content in (
+                ('.prom', self.prometheus()),
+                ('.json', json.dumps(self.summary(), ensure_ascii=False, indent=2)),
+        ):
+            temp_path = f'{path}{extension}.tmp'
+            with open(temp_path, 'w', encoding='UTF-8') as f:
+                f.write(content)
+            os.replace(temp_path, path + extension)
+        self._last_export = time.monotonic()
+
+    def export_due(self, path, interval=10):
+        """
+        距上次导出超过指定秒数时导出指标，用于抓取过程中定期更新。
+
+        :param path: 导出文件路径（不含扩展名）
+        :type path: str
+        :param interval: 导出间隔秒数
+        :type interval: float
+        :return:
+        """
+        if time.monotonic() - self._last_export >= interval:
+            self.export(path)
+
+
+def _bucket_quantile(buckets, quantile):
+    """
+    按直方图估算分位数，取所在桶的上限，落在 +Inf 桶时取最后一个桶的上限。
+
+    :param buckets: 各桶的计数
+    :type buckets: list
+    :param quantile: 分位
+    :type quantile: float
+    :return: 分位数，没有数据时为 0。
+    :rtype: float
+    """
+    total = sum(buckets)
+    if total == 0:
+        return 0
+    count = 0
+    for bound, value in zip(LATENCY_BUCKETS + [LATENCY_BUCKETS[-1]], buckets):
+        count += value
+        if count >= total * quantile:
+            return bound
+    return LATENCY_BUCKETS[-1]
+
+
+if __name__ == '__main__':
+    pass
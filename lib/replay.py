@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import gzip
+import os
+import zlib
+from urllib.parse import urlparse
+
+
+class MirrorReplay(object):
+    """
+    本地镜像目录回放，目录结构与 wget -m 相同（主机名/路径），也支持省略主机名一级。
+    """
+
+    def __init__(self, directory):
+        if os.path.isdir(directory) is False:
+            raise Exception(f'镜像目录不存在：{directory}')
+        self._directory = directory
+        """
+        镜像目录
+        """
+
+    def read(self, url):
+        """
+        读取链接对应的页面
+
+        :param url: 页面链接
+        :type url: str
+        :return: 页面原始内容，不存在时为 None。
+        :rtype: bytes
+        """
+        parsed = urlparse(url)
+        path = parsed.path.lstrip('/').replace('/', os.sep)
+        for file in (os.path.join(self._directory, parsed.netloc, path), os.path.join(self._directory, path)):
+            if os.path.isfile(file):
+                with open(file, 'rb') as f:
+                    return f.read()
+        return None
+
+
+class WarcReplay(object):
+    """
+    WARC 归档文件回放，支持 .warc 及逐记录压缩的 .warc.gz，只读取状态为 200 的 response 记录。
+    """
+
+    def __init__(self, path):
+        self._pages = {}
+        """
+        链接对应的页面内容（zlib 压缩后保存在内存中）
+        """
+
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            while True:
+                record = self._read_record(f)
+                if record is None:
+                    break
+                headers, block = record
+                if headers.get('warc-type') != 'response' or 'warc-target-uri' not in headers:
+                    continue
+                status, body = self._parse_http(block)
+                if status == 200:
+                    self._pages[headers['warc-target-uri'].strip('<>')] = zlib.compress(body)
+
+    def __len__(self):
+        return len(self._pages)
+
+    def read(self, url):
+        """
+        读取链接对应的页面
+
+        :param url: 页面链接
+        :type url: str
+        :return: 页面原始内容，不存在时为 None。
+        :rtype: bytes
+        """
+        page = self._pages.get(url)
+        return zlib.decompress(page) if page is not None else None
+
+    @staticmethod
+    def _read_record(f):
+        """
+        读取一条 WARC 记录
+
+        :param f: 文件对象
+        :return: 记录头（键为小写）与记录内容，文件结束时为 None。
+        :rtype: tuple
+        """
+        line = f.readline()
+        while line in (b'\r\n', b'\n'):
+            line = f.readline()
+        if line == b'':
+            return None
+        if not line.startswith(b'WARC/'):
+            raise Exception(f'WARC 记录格式错误：{line[:50]}')
+        headers = {}
+        while True:
+            line = f.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('utf-8', errors='replace').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        block = f.read(int(headers.get('content-length', 0)))
+        return headers, block
+
+    @staticmethod
+    def _parse_http(block):
+        """
+        解析 HTTP 响应，处理分块传输及 gzip、deflate 压缩。
+
+        :param block: HTTP 响应原始内容
+        :type block: bytes
+        :return: 状态码与响应体
+        :rtype: tuple
+        """
+        head, _, body = block.partition(b'\r\n\r\n')
+        lines = head.decode('iso-8859-1').split('\r\n')
+        try:
+            status = int(lines[0].split(' ')[1])
+        except (IndexError, ValueError):
+            return 0, b''
+        headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip().lower()
+        if headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while body:
+                size_line, _, body = body.partition(b'\r\n')
+                size = int(size_line.split(b';')[0], 16)
+                if size == 0:
+                    break
+                chunks.append(body[:size])
+                body = body[size + 2:]
+            body = b''.join(chunks)
+        if headers.get('content-encoding') == 'gzip':
+            body = gzip.decompress(body)
+        elif headers.get('content-encoding') == 'deflate':
+            body = zlib.decompress(body)
+        return status, body
+
+
+def open_replay(path):
+    """
+    按路径打开回放来源，目录为本地镜像，文件为 WARC 归档。
+
+    :param path: 镜像目录或 WARC 文件路径
+    :type path: str
+    :return: 回放来源
+    :rtype: MirrorReplay or WarcReplay
+    """
+    if os.path.isdir(path):
+        return MirrorReplay(path)
+    return WarcReplay(path)
+
+
+if __name__ == '__main__':
+    pass
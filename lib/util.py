@@ -1,6 +1,84 @@
 # -*- coding: utf-8 -*-
+import contextlib
+import hashlib
+import json
 import os
+import queue
 import sqlite3
+import threading
+import time
+import urllib.request
+import zlib
+
+TABLES = ['province', 'city', 'county', 'town', 'village']
+"""
+各级别信息表名，由高到低。
+"""
+
+TABLE_COLUMNS = {
+    name: ['statistical_code', 'code', 'name'] + [f'{top}_statistical_code' for top in TABLES[0:index]]
+    for index, name in enumerate(TABLES)
+}
+"""
+各级别信息表的字段名，与建表顺序相同，按元组读取时用于对应各字段。
+"""
+
+TOP_COLUMNS = ['statistical_code', 'code', 'name']
+"""
+按上级查询下级信息时读取的字段名
+"""
+
+CODE_LENGTHS = [2, 4, 6, 9, 12]
+"""
+各级别代码长度，由高到低，代码为统计用区划代码的前缀。
+"""
+
+
+DB_MODES = {
+    'default': [],
+    'bulk': ['journal_mode=WAL', 'synchronous=NORMAL', 'cache_size=-262144', 'temp_store=MEMORY'],
+    'read': ['cache_size=-262144', 'mmap_size=268435456', 'temp_store=MEMORY', 'query_only=1'],
+}
+"""
+数据库连接模式及对应的 PRAGMA 设置。'default'=SQLite 默认设置；'bulk'=批量写入，WAL 日志、每次提交不等待同步到磁盘
+（断电时可能丢失最后提交的事务，但数据库不会损坏）、256 MB 页缓存、临时表放在内存中；'read'=只读导出，256 MB 页缓存、
+256 MB 内存映射读取、临时表放在内存中，并禁止写入。
+"""
+
+
+def _code_range(code):
+    """
+    区划代码对应的整数统计用区划代码范围及级别序号，区划的所有下级都在该范围内。
+
+    :param code: 区划代码，长度决定级别，见 CODE_LENGTHS。
+    :type code: str
+    :return: 最小代码、最大代码、级别序号
+    :rtype: tuple
+    """
+    if len(code) not in CODE_LENGTHS or not code.isdigit():
+        raise Exception(f'区划代码错误：{code}')
+    scale = 10 ** (12 - len(code))
+    return int(code) * scale, (int(code) + 1) * scale - 1, CODE_LENGTHS.index(len(code))
+
+
+def _level_name_sql():
+    """
+    将级别序号转换为级别名称的 SQL 表达式
+
+    :return: SQL 表达式
+    :rtype: str
+    """
+    return 'CASE `level` ' + ' '.join(f"WHEN {level} THEN '{name}'" for level, name in enumerate(TABLES)) + ' END'
+
+
+def _parent_code_sql():
+    """
+    将整数上级统计用区划代码转换为 12 位字符串的 SQL 表达式，没有上级时为 NULL。
+
+    :return: SQL 表达式
+    :rtype: str
+    """
+    return "CASE WHEN `parent_code` IS NULL THEN NULL ELSE printf('%012d', `parent_code`) END"
 
 
 class DBUtilStatsGovCn(object):
@@ -8,18 +86,42 @@ class DBUtilStatsGovCn(object):
     数据库工具
     """
 
-    def __init__(self, database):
-        # 如果数据库目录不存在则创建
-        if os.path.exists(os.path.dirname(database)) is False:
-            os.makedirs(os.path.dirname(database))
+    def __init__(self, database, batch_pages=1, mode='default', readonly=False, check_same_thread=True):
+        if mode not in DB_MODES:
+            raise Exception(f'不支持的数据库模式：{mode}')
+        if readonly:
+            # 只读连接只打开已存在的数据库，表及索引由写入连接创建。
+            self._conn = sqlite3.connect(
+                f'file:{urllib.request.pathname2url(os.path.abspath(database))}?mode=ro', uri=True,
+                check_same_thread=check_same_thread
+            )
+        else:
+            # 如果数据库目录不存在则创建
+            if os.path.exists(os.path.dirname(database)) is False:
+                os.makedirs(os.path.dirname(database))
+            self._conn = sqlite3.connect(database, check_same_thread=check_same_thread)
+        """
+        数据库连接类，check_same_thread 为 False 时可在其它线程中使用，由调用方保证同一时间只有一个线程使用。
+        """
 
-        self._conn = sqlite3.connect(database)
+        self._batch_pages = max(batch_pages, 1)
         """
-        数据库连接类
+        每保存多少个页面提交一次事务，见 commit_page。
+        """
+
+        self._pending_pages = 0
+        """
+        未提交的页面数
+        """
+
+        self._writable = mode != 'read' and not readonly
+        """
+        是否可以修改数据库，只读导出及只读连接不修改数据库。
         """
 
-        # 修改 SQLite 默认查询返回数据类型，由 tuple 改为带列名的 dict 类型。
-        self._conn.row_factory = lambda cursor, row: dict((col[0], row[idx]) for idx, col in enumerate(cursor.description))
+        # 修改 SQLite 默认查询返回数据类型，由 tuple 改为可按列名取值的 sqlite3.Row 类型（由 C 实现，不需要为每行构造 dict），
+        # 需要 dict 时用 dict(row) 转换；批量读取时可选择直接返回 tuple。
+        self._conn.row_factory = sqlite3.Row
 
         self._curs = self._conn.cursor()
         """
@@ -48,13 +150,54 @@ class DBUtilStatsGovCn(object):
             'CREATE TABLE IF NOT EXISTS `village` '
             '(`statistical_code` CHAR(12) PRIMARY KEY, '
             '`code` CHAR(12), `name` VARCHAR(100), `province_statistical_code` CHAR(12), '
-            '`city_statistical_code` CHAR(12), `county_statistical_code` CHAR(12), `town_statistical_code` CHAR(12));'
+            '`city_statistical_code` CHAR(12), `county_statistical_code` CHAR(12), `town_statistical_code` CHAR(12));',
+
+            # 抓取队列，保存待抓取页面的链接、上级信息及状态（0=待抓取、1=已完成），用于中断后继续抓取；
+            # 已完成页面同时保存页面信息的哈希值，用于下一年增量抓取时判断页面是否变化。
+            'CREATE TABLE IF NOT EXISTS `frontier` '
+            '(`id` INTEGER PRIMARY KEY AUTOINCREMENT, `level` VARCHAR(10), `url` VARCHAR(255), `parent` TEXT, '
+            '`top_codes` TEXT, `top_names` TEXT, `status` INTEGER DEFAULT 0, `code` CHAR(12), `hash` CHAR(40), '
+            'UNIQUE (`level`, `url`));',
+
+            'CREATE INDEX IF NOT EXISTS `frontier_level_code` ON `frontier` (`level`, `code`);',
+
+            # 区划索引，各级别信息按整数统计用区划代码（即各级代码组成的路径）及级别（TABLES 中的序号）统一保存，
+            # 任意区划的整个下级子树为一段连续的代码范围。
+            'CREATE TABLE IF NOT EXISTS `division` '
+            '(`code` INTEGER, `level` INTEGER, `name` VARCHAR(100), PRIMARY KEY (`code`, `level`)) WITHOUT ROWID;'
         ]
-        for s in sql:
-            self._curs.execute(s)
-        self._conn.commit()
+        # 只读导出及只读连接不修改数据库，表由写入连接创建。
+        if self._writable:
+            for s in sql:
+                self._curs.execute(s)
+            self._conn.commit()
 
-    def insert_province(self, statistical_code, code, name):
+        for pragma in DB_MODES[mode]:
+            self._curs.execute(f'PRAGMA {pragma};')
+
+    def upgrade(self):
+        """
+        为旧版本抓取的数据库创建上级代码索引，有信息但区划索引为空时重建区划索引。用于写入连接在写入的同时提供查询，
+        抓取时不调用，写入完成后再由 create_indexes、build_division 创建。
+
+        :return:
+        """
+        self.create_indexes()
+        self._curs.execute(
+            'SELECT EXISTS (SELECT 1 FROM `province`) AND NOT EXISTS (SELECT 1 FROM `division`) AS `outdated`;'
+        )
+        if self._curs.fetchone()['outdated']:
+            self.build_division()
+
+    def enable_wal(self):
+        """
+        切换为 WAL 日志（保存在数据库文件中，之后的连接都使用 WAL），读取时不阻塞写入，写入时也不阻塞读取。
+
+        :return:
+        """
+        self._curs.execute('PRAGMA journal_mode=WAL;')
+
+    def insert_province(self, statistical_code, code, name, commit=True):
         """
         插入省级信息
 
@@ -64,14 +207,17 @@ class DBUtilStatsGovCn(object):
         :type code: str
         :param name: 名称
         :type name: str
+        :param commit: 是否立即提交事务
+        :type commit: bool
         :return:
         """
         sql = 'INSERT INTO `province` (`statistical_code`, `code`, `name`) ' \
               'VALUES(?, ?, ?);'
         self._curs.execute(sql, (statistical_code, code, name))
-        self._conn.commit()
+        if commit:
+            self._conn.commit()
 
-    def insert_city(self, statistical_code, code, name, province_statistical_code):
+    def insert_city(self, statistical_code, code, name, province_statistical_code, commit=True):
         """
         插入地级信息
 
@@ -83,14 +229,17 @@ class DBUtilStatsGovCn(object):
         :type name: str
         :param province_statistical_code: 省级统计用区划代码
         :type province_statistical_code: str
+        :param commit: 是否立即提交事务
+        :type commit: bool
         :return:
         """
         sql = 'INSERT INTO `city` (`statistical_code`, `code`, `name`, `province_statistical_code`) ' \
               'VALUES(?, ?, ?, ?);'
         self._curs.execute(sql, (statistical_code, code, name, province_statistical_code))
-        self._conn.commit()
+        if commit:
+            self._conn.commit()
 
-    def insert_county(self, statistical_code, code, name, province_statistical_code, city_statistical_code):
+    def insert_county(self, statistical_code, code, name, province_statistical_code, city_statistical_code, commit=True):
         """
         插入县级信息
 
@@ -104,15 +253,18 @@ class DBUtilStatsGovCn(object):
         :type province_statistical_code: str
         :param city_statistical_code: 地级统计用区划代码
         :type city_statistical_code: str
+        :param commit: 是否立即提交事务
+        :type commit: bool
         :return:
         """
         sql = 'INSERT INTO `county` ' \
               '(`statistical_code`, `code`, `name`, `province_statistical_code`, `city_statistical_code`) ' \
               'VALUES(?, ?, ?, ?, ?);'
         self._curs.execute(sql, (statistical_code, code, name, province_statistical_code, city_statistical_code))
-        self._conn.commit()
+        if commit:
+            self._conn.commit()
 
-    def insert_town(self, statistical_code, code, name, province_statistical_code, city_statistical_code, county_statistical_code):
+    def insert_town(self, statistical_code, code, name, province_statistical_code, city_statistical_code, county_statistical_code, commit=True):
         """
         插入乡级信息
 
@@ -128,6 +280,8 @@ class DBUtilStatsGovCn(object):
         :type city_statistical_code: str
         :param county_statistical_code: 县级统计用区划代码
         :type county_statistical_code: str
+        :param commit: 是否立即提交事务
+        :type commit: bool
         :return:
         """
         sql = 'INSERT INTO `town` ' \
@@ -138,9 +292,10 @@ class DBUtilStatsGovCn(object):
             sql,
             (statistical_code, code, name, province_statistical_code, city_statistical_code, county_statistical_code)
         )
-        self._conn.commit()
+        if commit:
+            self._conn.commit()
 
-    def insert_village(self, statistical_code, code, name, province_statistical_code, city_statistical_code, county_statistical_code, town_statistical_code):
+    def insert_village(self, statistical_code, code, name, province_statistical_code, city_statistical_code, county_statistical_code, town_statistical_code, commit=True):
         """
         插入村级信息
 
@@ -158,6 +313,8 @@ class DBUtilStatsGovCn(object):
         :type county_statistical_code: str
         :param town_statistical_code: 乡级统计用区划代码
         :type town_statistical_code: str
+        :param commit: 是否立即提交事务
+        :type commit: bool
         :return:
         """
         sql = 'INSERT INTO `village` ' \
@@ -169,6 +326,293 @@ class DBUtilStatsGovCn(object):
             (statistical_code, code, name, province_statistical_code, city_statistical_code, county_statistical_code,
              town_statistical_code)
         )
+        if commit:
+            self._conn.commit()
+
+    def insert_many(self, name, rows, commit=True):
+        """
+        批量插入指定级别信息
+
+        :param name: 级别名称
+        :type name: str
+        :param rows: 信息数组，元素为 (统计用区划代码, 代码, 名称, 各上级统计用区划代码...)，上级由高到低。
+        :type rows: list
+        :param commit: 是否立即提交事务
+        :type commit: bool
+        :return:
+        """
+        columns = TABLE_COLUMNS[name]
+        sql = f'INSERT INTO `{name}` (`{"`, `".join(columns)}`) VALUES({", ".join("?" * len(columns))});'
+        self._curs.executemany(sql, rows)
+        if commit:
+            self._conn.commit()
+
+    def insert_frontier(self, level, url, parent, top_codes, top_names, commit=True):
+        """
+        插入待抓取页面，已存在的页面忽略。
+
+        :param level: 页面级别名称
+        :type level: str
+        :param url: 页面链接
+        :type url: str
+        :param parent: 上级信息，包括链接、代码、名称、统计用区划代码。
+        :type parent: dict
+        :param top_codes: 各上级统计用区划代码，由高到低。
+        :type top_codes: list
+        :param top_names: 各上级名称，由高到低。
+        :type top_names: list
+        :param commit: 是否立即提交事务
+        :type commit: bool
+        :return: 待抓取页面编号，页面已存在时为 None。
+        :rtype: int
+        """
+        sql = 'INSERT OR IGNORE INTO `frontier` (`level`, `url`, `parent`, `top_codes`, `top_names`, `code`) ' \
+              'VALUES(?, ?, ?, ?, ?, ?);'
+        self._curs.execute(
+            sql,
+            (level, url, json.dumps(parent, ensure_ascii=False), json.dumps(top_codes),
+             json.dumps(top_names, ensure_ascii=False), parent['statistical_code'])
+        )
+        frontier_id = self._curs.lastrowid if self._curs.rowcount == 1 else None
+        if commit:
+            self._conn.commit()
+        return frontier_id
+
+    def update_frontier_done(self, frontier_id, page_hash='', commit=True):
+        """
+        标记页面已抓取完成
+
+        :param frontier_id: 待抓取页面编号
+        :type frontier_id: int
+        :param page_hash: 页面信息的哈希值
+        :type page_hash: str
+        :param commit: 是否立即提交事务
+        :type commit: bool
+        :return:
+        """
+        self._curs.execute('UPDATE `frontier` SET `status`=1, `hash`=? WHERE `id`=?;', (page_hash, frontier_id))
+        if commit:
+            self._conn.commit()
+
+    def select_frontier_pending(self, level):
+        """
+        按加入顺序查询指定级别的所有待抓取页面
+
+        :param level: 页面级别名称
+        :type level: str
+        :return: 待抓取页面，包括编号、链接、上级信息、各上级统计用区划代码及名称。
+        :rtype: list
+        """
+        self._curs.execute(
+            'SELECT `id`, `url`, `parent`, `top_codes`, `top_names` FROM `frontier` '
+            'WHERE `level`=? AND `status`=0 ORDER BY `id`;',
+            (level,)
+        )
+        return [{
+            'id': row['id'],
+            'url': row['url'],
+            'parent': json.loads(row['parent']),
+            'top_codes': json.loads(row['top_codes']),
+            'top_names': json.loads(row['top_names']),
+        } for row in self._curs.fetchall()]
+
+    def select_count_frontier_pending(self):
+        """
+        查询待抓取页面数量
+
+        :return: 数量
+        :rtype: int
+        """
+        self._curs.execute('SELECT COUNT(*) AS `count` FROM `frontier` WHERE `status`=0;')
+        return self._curs.fetchone()['count']
+
+    def attach_baseline(self, database):
+        """
+        附加上一年的数据库作为增量抓取的基准
+
+        :param database: 基准数据库文件路径
+        :type database: str
+        :return: 基准数据库是否保存了页面哈希值（旧版本抓取的数据库没有抓取队列，无法用作基准）
+        :rtype: bool
+        """
+        self._curs.execute('ATTACH DATABASE ? AS `baseline`;', (database,))
+        self._curs.execute(
+            "SELECT COUNT(*) AS `count` FROM `baseline`.`sqlite_master` WHERE `type`='table' AND `name`='frontier';"
+        )
+        if self._curs.fetchone()['count'] == 0:
+            return False
+        self._curs.execute('SELECT COUNT(*) AS `count` FROM `baseline`.`frontier` WHERE `status`=0;')
+        if self._curs.fetchone()['count'] > 0:
+            raise Exception(f'基准数据库抓取未完成：{database}')
+        return True
+
+    def select_baseline_hash(self, level, code):
+        """
+        查询基准数据库中指定页面信息的哈希值
+
+        :param level: 页面级别名称
+        :type level: str
+        :param code: 页面所属上级的统计用区划代码
+        :type code: str
+        :return: 哈希值，不存在时为 None。
+        :rtype: str
+        """
+        self._curs.execute(
+            'SELECT `hash` FROM `baseline`.`frontier` WHERE `level`=? AND `code`=? AND `status`=1;', (level, code)
+        )
+        row = self._curs.fetchone()
+        return row['hash'] if row is not None else None
+
+    def copy_baseline_subtree(self, level, code, commit=True):
+        """
+        从基准数据库复制指定上级下的所有信息（指定级别及以下各级）及已完成的抓取队列。
+        下级的统计用区划代码都在上级代码的范围内，信息按主键、抓取队列按页面所属上级代码的索引查询，不修改基准数据库。
+
+        :param level: 复制的最高级别名称
+        :type level: str
+        :param code: 上级统计用区划代码
+        :type code: str
+        :param commit: 是否立即提交事务
+        :type commit: bool
+        :return: 复制的信息数量
+        :rtype: int
+        """
+        # 不设县级的地级（例如东莞市）的乡级页面所属上级为地级，按县级代码长度取范围同样只包含其下级。
+        low, high, _ = _code_range(code[0:CODE_LENGTHS[TABLES.index(level) - 1]])
+        low, high = f'{low:012d}', f'{high:012d}'
+        count = 0
+        for name in TABLES[TABLES.index(level):]:
+            self._curs.execute(
+                f'INSERT INTO `{name}` SELECT * FROM `baseline`.`{name}` WHERE `statistical_code` BETWEEN ? AND ?;',
+                (low, high)
+            )
+            count += self._curs.rowcount
+        # 下级页面的抓取队列，不包括指定上级本身的页面。
+        for name in TABLES[TABLES.index(level) + 1:]:
+            self._curs.execute(
+                'INSERT OR IGNORE INTO `frontier` '
+                '(`level`, `url`, `parent`, `top_codes`, `top_names`, `status`, `code`, `hash`) '
+                'SELECT `level`, `url`, `parent`, `top_codes`, `top_names`, 1, `code`, `hash` '
+                'FROM `baseline`.`frontier` WHERE `level`=? AND `code` BETWEEN ? AND ? AND `status`=1;',
+                (name, low, high)
+            )
+        if commit:
+            self._conn.commit()
+        return count
+
+    def commit(self):
+        """
+        提交事务
+
+        :return:
+        """
+        self._conn.commit()
+        self._pending_pages = 0
+
+    def commit_page(self):
+        """
+        一个页面的信息、下级页面及完成状态已写入，累计达到 batch_pages 个页面时提交事务。
+        同一事务中的页面一起提交，中断时未提交的页面仍为待抓取状态，继续抓取时重新抓取。
+
+        :return:
+        """
+        self._pending_pages += 1
+        if self._pending_pages >= self._batch_pages:
+            self.commit()
+
+    def create_indexes(self):
+        """
+        创建各级别信息的上级统计用区划代码索引，已存在的索引忽略。直接上级的索引包含按上级查询下级时读取的字段，
+        查询只需读取索引；其它上级的索引用于按上级查询整个下级。
+        批量写入前后分别调用 drop_indexes 及本方法，写入时不需要维护索引。
+
+        :return:
+        """
+        for index, name in enumerate(TABLES[1:], 1):
+            for top in TABLES[0:index]:
+                columns = [f'{top}_statistical_code']
+                if top == TABLES[index - 1]:
+                    columns += ['statistical_code', 'code', 'name']
+                self._curs.execute(
+                    f'CREATE INDEX IF NOT EXISTS `{name}_{top}_statistical_code` '
+                    f'ON `{name}` (`{"`, `".join(columns)}`);'
+                )
+        self._conn.commit()
+
+    def build_division(self):
+        """
+        由各级别信息重建区划索引，统计用区划代码不是 12 位数字的信息（没有链接的省级信息）不加入索引。
+
+        :return:
+        """
+        self._curs.execute('DELETE FROM `division`;')
+        for level, name in enumerate(TABLES):
+            self._curs.execute(
+                f'INSERT INTO `division` (`code`, `level`, `name`) '
+                f'SELECT CAST(`statistical_code` AS INTEGER), ?, `name` FROM `{name}` WHERE `statistical_code` GLOB ?;',
+                (level, '[0-9]' * 12)
+            )
+        self._conn.commit()
+
+    def select_subtree(self, code, max_level='village'):
+        """
+        查询指定区划及其所有下级信息，只需一次按代码范围的索引查询。
+        旧版本抓取的数据库没有区划索引，可写入时先创建，只读时抛出异常。
+
+        :param code: 区划代码，长度决定级别，例如省级 '11'、县级 '110101'，见 CODE_LENGTHS。
+        :type code: str
+        :param max_level: 查询的最低级别名称
+        :type max_level: str
+        :return: 按统计用区划代码排序的信息，包括统计用区划代码、级别名称、名称，元素为 sqlite3.Row。
+        :rtype: list
+        """
+        low, high, min_level = _code_range(code)
+        self._curs.execute(
+            "SELECT EXISTS (SELECT 1 FROM `province`) AND NOT EXISTS ("
+            "SELECT 1 FROM `sqlite_master` WHERE `type`='table' AND `name`='division'"
+            ") AS `outdated`;"
+        )
+        outdated = self._curs.fetchone()['outdated']
+        if not outdated:
+            self._curs.execute(
+                'SELECT EXISTS (SELECT 1 FROM `province`) AND NOT EXISTS (SELECT 1 FROM `division`) AS `outdated`;'
+            )
+            outdated = self._curs.fetchone()['outdated']
+        if outdated:
+            if not self._writable:
+                raise Exception('数据库没有区划索引，以写入模式（非 read 模式、非只读）打开后查询时自动创建')
+            self.build_division()
+        self._curs.execute(
+            f"SELECT printf('%012d', `code`) AS `statistical_code`, {_level_name_sql()} AS `level`, `name` "
+            f"FROM `division` WHERE `code` BETWEEN ? AND ? AND `level` BETWEEN ? AND ? ORDER BY `code`, `level`;",
+            (low, high, min_level, TABLES.index(max_level))
+        )
+        return self._curs.fetchall()
+
+    def has_indexes(self):
+        """
+        各级别信息的上级统计用区划代码索引是否都已创建
+
+        :return: 是否都已创建
+        :rtype: bool
+        """
+        names = [f'{name}_{top}_statistical_code' for index, name in enumerate(TABLES[1:], 1) for top in TABLES[0:index]]
+        self._curs.execute(
+            f"SELECT COUNT(*) AS `count` FROM `sqlite_master` WHERE `type`='index' "
+            f"AND `name` IN ({', '.join('?' * len(names))});",
+            names
+        )
+        return self._curs.fetchone()['count'] == len(names)
+
+    def drop_indexes(self):
+        """
+        删除各级别信息的上级统计用区划代码索引
+
+        :return:
+        """
+        for index, name in enumerate(TABLES[1:], 1):
+            for top in TABLES[0:index]:
+                self._curs.execute(f'DROP INDEX IF EXISTS `{name}_{top}_statistical_code`;')
         self._conn.commit()
 
     def truncate_province(self):
@@ -211,6 +655,22 @@ class DBUtilStatsGovCn(object):
         """
         self._truncate_data('village')
 
+    def truncate_division(self):
+        """
+        清空区划索引
+
+        :return:
+        """
+        self._truncate_data('division')
+
+    def truncate_frontier(self):
+        """
+        清空抓取队列
+
+        :return:
+        """
+        self._truncate_data('frontier')
+
     def _truncate_data(self, name):
         """
         清空指定名称表信息
@@ -228,8 +688,8 @@ class DBUtilStatsGovCn(object):
 
         :param statistical_code: 统计用区划代码
         :type statistical_code: str
-        :return: 省级信息
-        :rtype: dict
+        :return: 省级信息，不存在时为 None。
+        :rtype: sqlite3.Row
         """
         return self._select_data('province', statistical_code)
 
@@ -239,8 +699,8 @@ class DBUtilStatsGovCn(object):
 
         :param statistical_code: 统计用区划代码
         :type statistical_code: str
-        :return: 地级信息
-        :rtype: dict
+        :return: 地级信息，不存在时为 None。
+        :rtype: sqlite3.Row
         """
         return self._select_data('city', statistical_code)
 
@@ -250,8 +710,8 @@ class DBUtilStatsGovCn(object):
 
         :param statistical_code: 统计用区划代码
         :type statistical_code: str
-        :return: 县级信息
-        :rtype: dict
+        :return: 县级信息，不存在时为 None。
+        :rtype: sqlite3.Row
         """
         return self._select_data('county', statistical_code)
 
@@ -261,8 +721,8 @@ class DBUtilStatsGovCn(object):
 
         :param statistical_code: 统计用区划代码
         :type statistical_code: str
-        :return: 乡级信息
-        :rtype: dict
+        :return: 乡级信息，不存在时为 None。
+        :rtype: sqlite3.Row
         """
         return self._select_data('town', statistical_code)
 
@@ -272,8 +732,8 @@ class DBUtilStatsGovCn(object):
 
         :param statistical_code: 统计用区划代码
         :type statistical_code: str
-        :return: 村级信息
-        :rtype: dict
+        :return: 村级信息，不存在时为 None。
+        :rtype: sqlite3.Row
         """
         return self._select_data('village', statistical_code)
 
@@ -285,8 +745,8 @@ class DBUtilStatsGovCn(object):
         :type name: str
         :param statistical_code: 统计用区划代码
         :type statistical_code: str
-        :return: 指定名称表单个信息
-        :rtype: dict
+        :return: 指定名称表单个信息，不存在时为 None。
+        :rtype: sqlite3.Row
         """
         self._curs.execute(f'SELECT * FROM `{name}` WHERE `statistical_code`=?;', (statistical_code,))
         return self._curs.fetchone()
@@ -299,7 +759,7 @@ class DBUtilStatsGovCn(object):
         :type limit: int
         :param offset: 起始位
         :type offset: int
-        :return: 省级信息
+        :return: 省级信息，元素为 sqlite3.Row。
         :rtype: list
         """
         return self._select_data_more('province', limit, offset)
@@ -312,7 +772,7 @@ class DBUtilStatsGovCn(object):
         :type limit: int
         :param offset: 起始位
         :type offset: int
-        :return: 地级信息
+        :return: 地级信息，元素为 sqlite3.Row。
         :rtype: list
         """
         return self._select_data_more('city', limit, offset)
@@ -325,7 +785,7 @@ class DBUtilStatsGovCn(object):
         :type limit: int
         :param offset: 起始位
         :type offset: int
-        :return: 县级信息
+        :return: 县级信息，元素为 sqlite3.Row。
         :rtype: list
         """
         return self._select_data_more('county', limit, offset)
@@ -338,7 +798,7 @@ class DBUtilStatsGovCn(object):
         :type limit: int
         :param offset: 起始位
         :type offset: int
-        :return: 乡级信息
+        :return: 乡级信息，元素为 sqlite3.Row。
         :rtype: list
         """
         return self._select_data_more('town', limit, offset)
@@ -351,7 +811,7 @@ class DBUtilStatsGovCn(object):
         :type limit: int
         :param offset: 起始位
         :type offset: int
-        :return: 村级信息
+        :return: 村级信息，元素为 sqlite3.Row。
         :rtype: list
         """
         return self._select_data_more('village', limit, offset)
@@ -366,12 +826,106 @@ class DBUtilStatsGovCn(object):
         :type limit: int
         :param offset: 起始位
         :type offset: int
-        :return: 指定名称表分页信息
+        :return: 指定名称表分页信息，元素为 sqlite3.Row。
         :rtype: list
         """
         self._curs.execute(f'SELECT * FROM `{name}` LIMIT ? OFFSET ?;', (limit, offset))
         return self._curs.fetchall()
 
+    def iter_provinces(self, size=1000, as_tuple=False):
+        """
+        按统计用区划代码顺序逐条读取所有省级信息
+
+        :param size: 每批读取的数量
+        :type size: int
+        :param as_tuple: 是否返回 tuple，字段顺序见 TABLE_COLUMNS。
+        :type as_tuple: bool
+        :return: 省级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
+        :rtype: generator
+        """
+        return self._iter_data('province', size, as_tuple)
+
+    def iter_cities(self, size=1000, as_tuple=False):
+        """
+        按统计用区划代码顺序逐条读取所有地级信息
+
+        :param size: 每批读取的数量
+        :type size: int
+        :param as_tuple: 是否返回 tuple，字段顺序见 TABLE_COLUMNS。
+        :type as_tuple: bool
+        :return: 地级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
+        :rtype: generator
+        """
+        return self._iter_data('city', size, as_tuple)
+
+    def iter_counties(self, size=1000, as_tuple=False):
+        """
+        按统计用区划代码顺序逐条读取所有县级信息
+
+        :param size: 每批读取的数量
+        :type size: int
+        :param as_tuple: 是否返回 tuple，字段顺序见 TABLE_COLUMNS。
+        :type as_tuple: bool
+        :return: 县级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
+        :rtype: generator
+        """
+        return self._iter_data('county', size, as_tuple)
+
+    def iter_towns(self, size=1000, as_tuple=False):
+        """
+        按统计用区划代码顺序逐条读取所有乡级信息
+
+        :param size: 每批读取的数量
+        :type size: int
+        :param as_tuple: 是否返回 tuple，字段顺序见 TABLE_COLUMNS。
+        :type as_tuple: bool
+        :return: 乡级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
+        :rtype: generator
+        """
+        return self._iter_data('town', size, as_tuple)
+
+    def iter_villages(self, size=1000, as_tuple=False):
+        """
+        按统计用区划代码顺序逐条读取所有村级信息
+
+        :param size: 每批读取的数量
+        :type size: int
+        :param as_tuple: 是否返回 tuple，字段顺序见 TABLE_COLUMNS。
+        :type as_tuple: bool
+        :return: 村级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
+        :rtype: generator
+        """
+        return self._iter_data('village', size, as_tuple)
+
+    def _iter_data(self, name, size=1000, as_tuple=False):
+        """
+        按统计用区划代码顺序逐条读取指定名称表的所有信息。每批从上一批最后的统计用区划代码之后按主键索引查询（键集分页），
+        不像 LIMIT/OFFSET 分页那样每批重新扫描之前的记录；使用独立的游标，读取过程中可以执行其它查询。
+
+        :param name: 表名
+        :type name: str
+        :param size: 每批读取的数量
+        :type size: int
+        :param as_tuple: 是否返回 tuple，字段顺序见 TABLE_COLUMNS。
+        :type as_tuple: bool
+        :return: 指定名称表信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
+        :rtype: generator
+        """
+        curs = self._conn.cursor()
+        if as_tuple:
+            curs.row_factory = None
+        last_code = ''
+        while True:
+            rows = curs.execute(
+                f'SELECT * FROM `{name}` WHERE `statistical_code`>? ORDER BY `statistical_code` LIMIT ?;',
+                (last_code, size)
+            ).fetchall()
+            yield from rows
+            if len(rows) < size:
+                return
+            # 统计用区划代码为第一个字段
+            last_code = rows[-1][0]
+
     def select_count_province(self):
         """
         查询省级信息数据记录数量
@@ -429,47 +983,55 @@ class DBUtilStatsGovCn(object):
         self._curs.execute(f'SELECT COUNT(*) AS `count` FROM `{name}`;')
         return self._curs.fetchone()['count']
 
-    def select_cities_by_top(self, top_code):
+    def select_cities_by_top(self, top_code, as_tuple=False):
         """
         通过上级编号查询地级所有信息数据
 
         :param top_code: 上级编号
-        :return: 地级信息
+        :param as_tuple: 是否返回 tuple，字段顺序见 TOP_COLUMNS。
+        :type as_tuple: bool
+        :return: 地级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
         :rtype: list
         """
-        return self._select_data_more_by_top('city', 'province_statistical_code', top_code)
+        return self._select_data_more_by_top('city', 'province_statistical_code', top_code, as_tuple)
 
-    def select_counties_by_top(self, top_code):
+    def select_counties_by_top(self, top_code, as_tuple=False):
         """
         通过上级编号查询县级所有信息数据
 
         :param top_code: 上级编号
-        :return: 县级信息
+        :param as_tuple: 是否返回 tuple，字段顺序见 TOP_COLUMNS。
+        :type as_tuple: bool
+        :return: 县级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
         :rtype: list
         """
-        return self._select_data_more_by_top('county', 'city_statistical_code', top_code)
+        return self._select_data_more_by_top('county', 'city_statistical_code', top_code, as_tuple)
 
-    def select_towns_by_top(self, top_code):
+    def select_towns_by_top(self, top_code, as_tuple=False):
         """
         通过上级编号查询乡级所有信息数据
 
         :param top_code: 上级编号
-        :return: 乡级信息
+        :param as_tuple: 是否返回 tuple，字段顺序见 TOP_COLUMNS。
+        :type as_tuple: bool
+        :return: 乡级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
         :rtype: list
         """
-        return self._select_data_more_by_top('town', 'county_statistical_code', top_code)
+        return self._select_data_more_by_top('town', 'county_statistical_code', top_code, as_tuple)
 
-    def select_villages_by_top(self, top_code):
+    def select_villages_by_top(self, top_code, as_tuple=False):
         """
         通过上级编号查询村级所有信息数据
 
         :param top_code: 上级编号
-        :return: 村级信息
+        :param as_tuple: 是否返回 tuple，字段顺序见 TOP_COLUMNS。
+        :type as_tuple: bool
+        :return: 村级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
         :rtype: list
         """
-        return self._select_data_more_by_top('village', 'town_statistical_code', top_code)
+        return self._select_data_more_by_top('village', 'town_statistical_code', top_code, as_tuple)
 
-    def _select_data_more_by_top(self, name, top_name, top_code):
+    def _select_data_more_by_top(self, name, top_name, top_code, as_tuple=False):
         """
         查询指定名称表指定上级编号的所有记录
 
@@ -479,12 +1041,250 @@ class DBUtilStatsGovCn(object):
         :type top_name: str
         :param top_code: 上级编号
         :type top_code: str
-        :return: 数量
-        :rtype: int
+        :param as_tuple: 是否返回 tuple，字段顺序见 TOP_COLUMNS。
+        :type as_tuple: bool
+        :return: 指定上级的所有下级信息，元素为 sqlite3.Row，as_tuple 为 True 时为 tuple。
+        :rtype: list
+        """
+        curs = self._curs
+        if as_tuple:
+            curs = self._conn.cursor()
+            curs.row_factory = None
+        curs.execute(f'SELECT `{"`, `".join(TOP_COLUMNS)}` FROM `{name}` WHERE `{top_name}`=?;', (top_code,))
+        return curs.fetchall()
+
+    def __del__(self):
+        # 数据库模式错误时未打开连接
+        if hasattr(self, '_conn'):
+            self._conn.close()
+
+
+class DBUtilStatsGovCnPool(object):
+    """
+    数据库连接池，一个写入连接及多个只读连接，数据库使用 WAL 日志，抓取写入时多个线程可同时读取已提交的信息。
+    写入连接同一时间只能由一个线程使用，读取连接每个线程取出一个独占使用，用完放回。线程安全。
+    """
+
+    def __init__(self, database, readers=4, batch_pages=1, mode='default'):
+        self._writer = DBUtilStatsGovCn(database, batch_pages, mode, check_same_thread=False)
+        """
+        写入连接
+        """
+
+        self._writer.enable_wal()
+        if mode != 'bulk':
+            self._writer.upgrade()
+
+        self._writer_lock = threading.RLock()
+        """
+        写入连接锁，可重入，持有时可嵌套取出写入连接。
+        """
+
+        self._readers = queue.Queue()
+        """
+        空闲的读取连接，全部取出时等待其它线程放回。
+        """
+
+        for _ in range(max(readers, 1)):
+            self._readers.put(DBUtilStatsGovCn(database, mode='read', readonly=True, check_same_thread=False))
+
+    @contextlib.contextmanager
+    def writer(self):
+        """
+        取出写入连接，其它线程取出写入连接时等待。同一线程写入后需要读取未提交的信息时应使用写入连接。
+
+        :return: 写入连接的数据库工具
+        :rtype: DBUtilStatsGovCn
+        """
+        with self._writer_lock:
+            yield self._writer
+
+    @contextlib.contextmanager
+    def reader(self, timeout=None):
+        """
+        取出一个读取连接，只能读取已提交的信息，读取连接全部被取出时等待。iter_* 返回的生成器也需要在放回前读完。
+
+        :param timeout: 最长等待秒数，为 None 时一直等待，超时抛出 queue.Empty。
+        :type timeout: float
+        :return: 读取连接的数据库工具
+        :rtype: DBUtilStatsGovCn
+        """
+        db_util = self._readers.get(timeout=timeout)
+        try:
+            yield db_util
+        finally:
+            self._readers.put(db_util)
+
+
+class DBUtilStatsGovCnHistory(object):
+    """
+    多年份数据库工具，各年份的区划信息合并保存，每条信息带有效起止年份，名称或上级变化时才保存新的一条。
+    """
+
+    def __init__(self, database):
+        # 如果数据库目录不存在则创建
+        if os.path.exists(os.path.dirname(database)) is False:
+            os.makedirs(os.path.dirname(database))
+
+        self._conn = sqlite3.connect(database)
+        """
+        数据库连接类
+        """
+
+        self._conn.row_factory = sqlite3.Row
+
+        self._curs = self._conn.cursor()
+        """
+        数据库游标
+        """
+
+        sql = [
+            # 区划信息，code 为整数统计用区划代码，level 为级别序号（TABLES 中的序号），valid_from、valid_to 为有效的
+            # 起止年份（含），parent_code 为上级的整数统计用区划代码（省级为 NULL）。
+            'CREATE TABLE IF NOT EXISTS `division` '
+            '(`code` INTEGER, `level` INTEGER, `valid_from` INTEGER, `valid_to` INTEGER, `name` VARCHAR(100), '
+            '`parent_code` INTEGER, PRIMARY KEY (`code`, `level`, `valid_from`)) WITHOUT ROWID;',
+
+            # 导入时查找上一个导入年份仍有效的信息
+            'CREATE INDEX IF NOT EXISTS `division_valid` ON `division` (`valid_to`, `valid_from`);',
+
+            # 已导入的年份
+            'CREATE TABLE IF NOT EXISTS `year` (`year` INTEGER PRIMARY KEY, `imported_at` INTEGER);'
+        ]
+        for s in sql:
+            self._curs.execute(s)
+        self._conn.commit()
+
+    def select_years(self):
+        """
+        查询已导入的年份
+
+        :return: 年份，由小到大。
+        :rtype: list
+        """
+        self._curs.execute('SELECT `year` FROM `year` ORDER BY `year`;')
+        return [row['year'] for row in self._curs.fetchall()]
+
+    def import_year(self, year, database):
+        """
+        导入一个年份的数据库，只能按年份由小到大连续导入（有效年份为连续区间，中间缺少的年份无法补入）。
+        与上一年名称及上级都相同的信息只延长有效年份，其它信息作为新的一条保存，上一年有而本年份没有的信息不再延长。
+
+        :param year: 年份
+        :type year: int
+        :param database: 该年份的数据库文件路径
+        :type database: str
+        :return: 本年份的信息数、新保存的信息数
+        :rtype: tuple
+        """
+        years = self.select_years()
+        if years and year != years[-1] + 1:
+            raise Exception(f'只能按年份连续导入，已导入到 {years[-1]} 年，下一个导入年份应为 {years[-1] + 1} 年：{year}')
+        last_year = years[-1] if years else None
+
+        self._curs.execute('ATTACH DATABASE ? AS `source`;', (database,))
+        try:
+            self._curs.execute(
+                "SELECT COUNT(*) AS `count` FROM `source`.`sqlite_master` WHERE `type`='table' AND `name`='frontier';"
+            )
+            if self._curs.fetchone()['count'] > 0:
+                self._curs.execute('SELECT COUNT(*) AS `count` FROM `source`.`frontier` WHERE `status`=0;')
+                if self._curs.fetchone()['count'] > 0:
+                    raise Exception(f'数据库抓取未完成：{database}')
+
+            # 本年份的所有信息，统计用区划代码不是 12 位数字的信息（没有链接的省级信息）不导入。
+            self._curs.execute('DROP TABLE IF EXISTS `temp`.`current`;')
+            self._curs.execute(
+                'CREATE TEMP TABLE `current` (`code` INTEGER, `level` INTEGER, `name` VARCHAR(100), '
+                '`parent_code` INTEGER, PRIMARY KEY (`code`, `level`)) WITHOUT ROWID;'
+            )
+            for level, name in enumerate(TABLES):
+                parent_code = f'CAST(`{TABLES[level - 1]}_statistical_code` AS INTEGER)' if level > 0 else 'NULL'
+                self._curs.execute(
+                    f'INSERT INTO `temp`.`current` (`code`, `level`, `name`, `parent_code`) '
+                    f'SELECT CAST(`statistical_code` AS INTEGER), ?, `name`, {parent_code} '
+                    f'FROM `source`.`{name}` WHERE `statistical_code` GLOB ?;',
+                    (level, '[0-9]' * 12)
+                )
+            self._curs.execute('SELECT COUNT(*) AS `count` FROM `temp`.`current`;')
+            count = self._curs.fetchone()['count']
+
+            # 与上一个导入年份相同的信息延长有效年份
+            if last_year is not None:
+                self._curs.execute(
+                    'UPDATE `division` SET `valid_to`=? WHERE `valid_to`=? AND EXISTS ('
+                    'SELECT 1 FROM `temp`.`current` WHERE `current`.`code`=`division`.`code` '
+                    'AND `current`.`level`=`division`.`level` AND `current`.`name`=`division`.`name` '
+                    'AND `current`.`parent_code` IS `division`.`parent_code`);',
+                    (year, last_year)
+                )
+            # 新增或变化的信息，valid_to 前的 + 使查询按主键查找，而不是用 division_valid 索引逐条比较本年份的所有信息
+            self._curs.execute(
+                'INSERT INTO `division` (`code`, `level`, `valid_from`, `valid_to`, `name`, `parent_code`) '
+                'SELECT `code`, `level`, ?, ?, `name`, `parent_code` FROM `temp`.`current` WHERE NOT EXISTS ('
+                'SELECT 1 FROM `division` WHERE `division`.`code`=`current`.`code` '
+                'AND `division`.`level`=`current`.`level` AND +`division`.`valid_to`=?);',
+                (year, year, year)
+            )
+            inserted = self._curs.rowcount
+            self._curs.execute('INSERT INTO `year` (`year`, `imported_at`) VALUES(?, ?);', (year, int(time.time())))
+            self._conn.commit()
+            self._curs.execute('DROP TABLE `temp`.`current`;')
+        except Exception as e:
+            self._conn.rollback()
+            raise e
+        finally:
+            self._curs.execute('DETACH DATABASE `source`;')
+        return count, inserted
+
+    def select_tree(self, year, code='', max_level='village'):
+        """
+        查询指定年份的区划树，指定区划代码时只查询该区划及其所有下级。
+
+        :param year: 年份
+        :type year: int
+        :param code: 区划代码，长度决定级别，例如省级 '11'、县级 '110101'，见 CODE_LENGTHS，为空时查询所有区划。
+        :type code: str
+        :param max_level: 查询的最低级别名称
+        :type max_level: str
+        :return: 按统计用区划代码排序的信息，包括统计用区划代码、级别名称、名称、上级统计用区划代码（省级为 None），元素为 sqlite3.Row。
+        :rtype: list
+        """
+        self._curs.execute('SELECT COUNT(*) AS `count` FROM `year` WHERE `year`=?;', (year,))
+        if self._curs.fetchone()['count'] == 0:
+            raise Exception(f'未导入的年份：{year}')
+        sql = f"SELECT printf('%012d', `code`) AS `statistical_code`, {_level_name_sql()} AS `level`, `name`, " \
+              f"{_parent_code_sql()} AS `parent_statistical_code` FROM `division` "
+        if code != '':
+            low, high, min_level = _code_range(code)
+            # 按代码范围查询主键
+            self._curs.execute(
+                sql + 'WHERE `code` BETWEEN ? AND ? AND `level` BETWEEN ? AND ? AND `valid_from`<=? AND `valid_to`>=? '
+                      'ORDER BY `code`, `level`;',
+                (low, high, min_level, TABLES.index(max_level), year, year)
+            )
+        else:
+            # 整个区划树占表中信息的大部分，按主键顺序扫描比使用 division_valid 索引再排序更快
+            self._curs.execute(
+                sql + 'WHERE `valid_to`>=? AND `valid_from`<=? AND `level`<=? ORDER BY `code`, `level`;',
+                (year, year, TABLES.index(max_level))
+            )
+        return self._curs.fetchall()
+
+    def select_versions(self, code):
         """
+        查询一个区划在各年份的所有版本
+
+        :param code: 区划代码，长度决定级别，见 CODE_LENGTHS。
+        :type code: str
+        :return: 按有效起始年份排序的信息，包括有效起止年份、名称、上级统计用区划代码（省级为 None），元素为 sqlite3.Row。
+        :rtype: list
+        """
+        low, _, level = _code_range(code)
         self._curs.execute(
-            f'SELECT `statistical_code`, `code`, `name` FROM `{name}` WHERE `{top_name}`=?;',
-            (top_code,)
+            f"SELECT `valid_from`, `valid_to`, `name`, {_parent_code_sql()} AS `parent_statistical_code` "
+            f"FROM `division` WHERE `code`=? AND `level`=? ORDER BY `valid_from`;",
+            (low, level)
         )
         return self._curs.fetchall()
 
@@ -492,5 +1292,195 @@ class DBUtilStatsGovCn(object):
         self._conn.close()
 
 
+class DBUtilResponseCache(object):
+    """
+    爬虫响应缓存，以链接为键保存 ETag、Last-Modified 信息，页面内容按内容哈希压缩后只保存一份，
+    并保存页面的提取结果，不同链接（例如不同年份）的相同页面共用同一份内容及提取结果。线程安全。
+    """
+
+    def __init__(self, database, revalidate=True):
+        # 如果数据库目录不存在则创建
+        if os.path.exists(os.path.dirname(database)) is False:
+            os.makedirs(os.path.dirname(database))
+
+        self._conn = sqlite3.connect(database, check_same_thread=False)
+        """
+        数据库连接类
+        """
+
+        self._lock = threading.Lock()
+        """
+        数据库连接锁，多个抓取线程共享同一个连接。
+        """
+
+        self._revalidate = revalidate
+        """
+        是否向站点重新验证缓存，为 False 时命中缓存的页面不再发出请求。
+        """
+
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS `page` (`hash` CHAR(40) PRIMARY KEY, `body` BLOB, `extract` TEXT);'
+        )
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(`response`);')]
+        if 'body' in columns:
+            self._migrate()
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS `response` '
+            '(`url` VARCHAR(255) PRIMARY KEY, `hash` CHAR(40), `etag` VARCHAR(255), `last_modified` VARCHAR(255), '
+            '`fetched_at` INTEGER);'
+        )
+        self._conn.commit()
+
+    def _migrate(self):
+        """
+        将旧版按链接保存页面内容的缓存表转换为按内容哈希保存
+
+        :return:
+        """
+        self._conn.execute('ALTER TABLE `response` RENAME TO `response_old`;')
+        self._conn.execute(
+            'CREATE TABLE `response` '
+            '(`url` VARCHAR(255) PRIMARY KEY, `hash` CHAR(40), `etag` VARCHAR(255), `last_modified` VARCHAR(255), '
+            '`fetched_at` INTEGER);'
+        )
+        for url, body, etag, last_modified, fetched_at in self._conn.execute(
+                'SELECT `url`, `body`, `etag`, `last_modified`, `fetched_at` FROM `response_old`;').fetchall():
+            page_hash = self.hash(zlib.decompress(body))
+            self._conn.execute('INSERT OR IGNORE INTO `page` (`hash`, `body`) VALUES(?, ?);', (page_hash, body))
+            self._conn.execute(
+                'INSERT INTO `response` (`url`, `hash`, `etag`, `last_modified`, `fetched_at`) VALUES(?, ?, ?, ?, ?);',
+                (url, page_hash, etag, last_modified, fetched_at)
+            )
+        self._conn.execute('DROP TABLE `response_old`;')
+        self._conn.commit()
+
+    @property
+    def revalidate(self):
+        return self._revalidate
+
+    @staticmethod
+    def hash(body):
+        """
+        计算页面内容哈希
+
+        :param body: 页面内容（未解码的原始内容）
+        :type body: bytes
+        :return: SHA-1 十六进制摘要
+        :rtype: str
+        """
+        return hashlib.sha1(body).hexdigest()
+
+    def select(self, url):
+        """
+        查询缓存的页面
+
+        :param url: 页面链接
+        :type url: str
+        :return: 缓存信息，包括页面内容哈希、页面内容（已解压）、ETag、Last-Modified，不存在时为 None。
+        :rtype: dict
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT `response`.`hash`, `page`.`body`, `response`.`etag`, `response`.`last_modified` '
+                'FROM `response` JOIN `page` ON `page`.`hash`=`response`.`hash` WHERE `response`.`url`=?;', (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'hash': row[0], 'body': zlib.decompress(row[1]), 'etag': row[2], 'last_modified': row[3]}
+
+    def save(self, url, body, etag='', last_modified=''):
+        """
+        保存页面到缓存，内容相同的页面只保存一份。
+
+        :param url: 页面链接
+        :type url: str
+        :param body: 页面内容（未解码的原始内容）
+        :type body: bytes
+        :param etag: 响应头 ETag
+        :type etag: str
+        :param last_modified: 响应头 Last-Modified
+        :type last_modified: str
+        :return: 页面内容哈希
+        :rtype: str
+        """
+        page_hash = self.hash(body)
+        with self._lock:
+            if self._conn.execute('SELECT 1 FROM `page` WHERE `hash`=?;', (page_hash,)).fetchone() is None:
+                self._conn.execute(
+                    'INSERT INTO `page` (`hash`, `body`) VALUES(?, ?);', (page_hash, zlib.compress(body))
+                )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO `response` (`url`, `hash`, `etag`, `last_modified`, `fetched_at`) '
+                'VALUES(?, ?, ?, ?, ?);',
+                (url, page_hash, etag or '', last_modified or '', int(time.time()))
+            )
+            self._conn.commit()
+        return page_hash
+
+    def select_extract(self, page_hash):
+        """
+        查询页面的提取结果
+
+        :param page_hash: 页面内容哈希
+        :type page_hash: str
+        :return: 页面级别名称与信息行数组，未保存时为 None。
+        :rtype: tuple
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT `extract` FROM `page` WHERE `hash`=?;', (page_hash,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        name, rows = json.loads(row[0])
+        return name, [tuple(row) if row is not None else None for row in rows]
+
+    def save_extract(self, page_hash, result):
+        """
+        保存页面的提取结果
+
+        :param page_hash: 页面内容哈希
+        :type page_hash: str
+        :param result: 页面级别名称与信息行数组
+        :type result: tuple
+        :return:
+        """
+        with self._lock:
+            self._conn.execute(
+                'UPDATE `page` SET `extract`=? WHERE `hash`=?;', (json.dumps(result, ensure_ascii=False), page_hash)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """
+        统计缓存的链接数及去重后的页面数
+
+        :return: 链接数、页面数
+        :rtype: tuple
+        """
+        with self._lock:
+            responses = self._conn.execute('SELECT COUNT(*) FROM `response`;').fetchone()[0]
+            pages = self._conn.execute('SELECT COUNT(*) FROM `page`;').fetchone()[0]
+        return responses, pages
+
+    def conditional_headers(self, cached):
+        """
+        生成重新验证缓存用的条件请求头
+
+        :param cached: 缓存信息
+        :type cached: dict
+        :return: 请求头
+        :rtype: dict
+        """
+        headers = {}
+        if cached is not None:
+            if cached['etag'] != '':
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified'] != '':
+                headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def __del__(self):
+        self._conn.close()
+
+
 if __name__ == '__main__':
     pass
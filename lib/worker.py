@@ -1,18 +1,29 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import collections
+import concurrent.futures
 import csv
 import datetime
+import hashlib
 import json
-import math
+import os
+import threading
 import time
 
-import redis
-from sshtunnel import SSHTunnelForwarder
+from lib.crawler import LEVELS, LEVEL_CODE_LENGTHS, LEVEL_LABELS, AdaptiveController, AsyncStatsGovCn, RetryQueue, \
+    StatsGovCn, ThreadPoolStatsGovCn, TokenBucket, WrongPageLevel
+from lib.distributed import RedisCrawlQueue
+from lib.metrics import CrawlMetrics
+from lib.replay import open_replay
+from lib.util import TABLE_COLUMNS, TOP_COLUMNS, DBUtilResponseCache, DBUtilStatsGovCn, DBUtilStatsGovCnHistory
+from lib.writer import PageWriter
 
-from lib.crawler import StatsGovCn
-from lib.util import DBUtilStatsGovCn
 
-
-def fetch_stats_gov_cn(url, db_path, show_log=True, sleep_time=0):
+def fetch_stats_gov_cn(url, db_path, show_log=True, sleep_time=0, mode='serial', concurrency=None, rate_limit=0,
+                       rate_burst=1, cache_path='', cache_revalidate=True, resume=True, baseline_path='',
+                       baseline_level='town', pipeline=False, depth_first=False, replay_path='', adaptive=True,
+                       retry=3, retry_delay=10, redis_config=None, lease_time=60, metrics_path='', batch_pages=1,
+                       db_mode='default', write_queue=0, crawler=None):
     """
     采集统计局信息
 
@@ -24,203 +35,894 @@ def fetch_stats_gov_cn(url, db_path, show_log=True, sleep_time=0):
     :type show_log: bool
     :param sleep_time: 爬虫每次爬取后的休眠时间，单位为秒。
     :type sleep_time: int
+    :param mode: 抓取模式，'serial'=逐页串行抓取、'asyncio'=异步并发抓取、'thread'=多线程并发抓取、
+        'distributed'=分布式抓取（页面通过 Redis 队列分发给 crawl_node_stats_gov_cn 抓取节点，本进程只负责写入数据库）。
+    :type mode: str
+    :param concurrency: 并发抓取时各级别的最大并发数，例如 {'city': 4, 'county': 8, 'town': 16, 'village': 16}。
+    :type concurrency: dict
+    :param rate_limit: 每秒最大请求数，0 为不限速。
+    :type rate_limit: float
+    :param rate_burst: 允许的最大突发请求数
+    :type rate_burst: int
+    :param cache_path: 响应缓存数据库文件路径，为空时不使用缓存。
+    :type cache_path: str
+    :param cache_revalidate: 是否向站点重新验证缓存，为 False 时命中缓存的页面不再发出请求。
+    :type cache_revalidate: bool
+    :param resume: 数据库中有未完成的抓取时是否从中断处继续，为 False 时清空后重新抓取。
+    :type resume: bool
+    :param baseline_path: 增量抓取的基准数据库文件路径（通常为上一年的数据库），为空时完整抓取。
+    :type baseline_path: str
+    :param baseline_level: 增量抓取时开始与基准比较的页面级别，该级别及以下的页面信息与基准中同一上级的页面相同时，
+        视为其所有下级均未变化，直接从基准复制而不再抓取。下级页面的变化不一定体现在上级页面中，级别越高跳过的页面越多，
+        漏掉变化的可能也越大，默认 'town' 即县级下的乡级列表未变化时不再抓取村级页面。
+    :type baseline_level: str
+    :param pipeline: 是否流水线抓取，为 True 时不再逐级等待，页面保存后其下级页面立即加入抓取队列。
+    :type pipeline: bool
+    :param depth_first: 流水线抓取时是否深度优先
+    :type depth_first: bool
+    :param replay_path: 回放来源，本地镜像目录或 WARC 归档文件路径，不为空时从中读取页面而不访问站点。
+    :type replay_path: str
+    :param adaptive: 是否自适应调整并发数及每秒请求数，为 True 时出现 403 或超时后减半，请求成功后逐步恢复，
+        上限为 concurrency 及 rate_limit；为 False 时只按重试队列的等待时间重试。
+    :type adaptive: bool
+    :param retry: 每个页面出错后的最大重试次数，出错的页面延后重试，不影响其它页面抓取。
+    :type retry: int
+    :param retry_delay: 第一次重试前的等待秒数，之后每次加倍，最长 300 秒。
+    :type retry_delay: int
+    :param redis_config: 分布式抓取的 Redis 配置，包括 host、port、pass、db。
+    :type redis_config: dict
+    :param lease_time: 分布式抓取时节点领取页面的租约时长，单位为秒，超时未返回结果的页面重新放入队列。
+    :type lease_time: int
+    :param metrics_path: 抓取指标导出文件路径（不含扩展名），抓取过程中每 10 秒及结束时导出 Prometheus 文本文件（.prom）
+        及 JSON 汇总（.json），为空时不导出。
+    :type metrics_path: str
+    :param batch_pages: 每保存多少个页面提交一次数据库事务，为 1 时每个页面提交一次。
+    :type batch_pages: int
+    :param db_mode: 数据库连接模式，见 lib.util.DB_MODES，批量写入时通常为 'bulk'。
+    :type db_mode: str
+    :param write_queue: 后台写入队列的最大页面数，大于 0 时解析后的页面放入队列由写入线程保存，抓取不等待写入数据库，
+        队列满时抓取等待写入；为 0 时在抓取循环中直接保存。
+    :type write_queue: int
+    :param crawler: 共用的爬虫对象，由 _create_crawler 创建，为 None 时按参数新建。多个年份连续抓取时共用连接池、限速器、
+        响应缓存及自适应并发控制器。
+    :type crawler: StatsGovCn
     :return:
     """
     # 程序开始时间
     begin_time = time.time()
 
-    stats_gov_cn_crawler = StatsGovCn()
-    stats_gov_cn_crawler.sleep_time = sleep_time
-    if stats_gov_cn_crawler.check(url.replace('$ROUTE$', 'index.html'))[0] != 'province':
-        raise Exception('不是省级信息页面')
+    if mode not in ('serial', 'asyncio', 'thread', 'distributed'):
+        raise Exception(f'不支持的抓取模式：{mode}')
+    if concurrency is None:
+        concurrency = {}
+    stats_gov_cn_crawler = crawler
+    if stats_gov_cn_crawler is None:
+        stats_gov_cn_crawler = _create_crawler(
+            mode, concurrency, sleep_time, rate_limit, rate_burst, cache_path, cache_revalidate, replay_path, adaptive
+        )
+    # 抓取指标
+    metrics = CrawlMetrics()
+    stats_gov_cn_crawler.metrics = metrics
+    # 出错页面的重试队列，回放时页面内容不会变化，不需要重试。
+    retry_queue = RetryQueue(retry if replay_path == '' else 0, retry_delay, metrics=metrics)
+    provinces = _fetch_index(stats_gov_cn_crawler, url.replace('$ROUTE$', 'index.html'), retry_queue)
 
     # 数据库操作对象
-    db_util = DBUtilStatsGovCn(db_path + 'db_stats.gov.cn.sqlite')
-    # 上级 URL 地址
-    url_base = {}
-    url_base_temp = ''
-
-    # 抓取并保存省级信息
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 开始抓取并保存省级信息')
-    provinces = stats_gov_cn_crawler.province(url.replace('$ROUTE$', 'index.html'))
-    db_util.truncate_province()
-    for province in provinces:
-        db_util.insert_province(province['statistical_code'], province['code'], province['name'])
-        url_base[province['statistical_code']] = url.replace('$ROUTE$', '')
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 完成抓取并保存省级信息')
-    print(f'[REPORT] 省级信息 {len(provinces)} 个')
+    db_util = DBUtilStatsGovCn(
+        db_path + 'db_stats.gov.cn.sqlite', batch_pages, db_mode, check_same_thread=write_queue == 0
+    )
+    # 是否增量抓取
+    incremental = baseline_path != '' and db_util.attach_baseline(baseline_path)
+    if baseline_path != '' and not incremental:
+        print(f'[Error] 基准数据库 {baseline_path} 没有页面哈希值，进行完整抓取。')
 
-    # 抓取并保存地级信息
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 开始抓取并保存地级信息')
-    cities = []
-    db_util.truncate_city()
-    for province in provinces:
+    if resume and db_util.select_count_frontier_pending() > 0:
+        # 抓取队列中还有待抓取页面，从中断处继续抓取。
+        print(f'[REPORT] 从中断处继续抓取，待抓取页面 {db_util.select_count_frontier_pending()} 个')
+    else:
+        # 抓取并保存省级信息
         if show_log:
-            province_name_temp = province['name']
-            print(f'[Log][{datetime.datetime.now()}] [{provinces.index(province) + 1}/{len(provinces)}] '
-                  f'开始抓取并保存【{province_name_temp}】')
-        if province['href'] != '':
-            url_base_temp = url_base[province['statistical_code']] + province['href']
-            cities_temp = stats_gov_cn_crawler.city(url_base_temp)
-            for city in cities_temp:
-                cities.append(city)
-                db_util.insert_city(city['statistical_code'], city['code'], city['name'], province['statistical_code'])
-                url_base[city['statistical_code']] = url_base_temp[0:url_base_temp.rfind('/')+1]
+            print(f'[Log][{datetime.datetime.now()}] 开始抓取并保存省级信息')
+        db_util.truncate_frontier()
+        for name in LEVELS:
+            getattr(db_util, f'truncate_{name}')()
+        db_util.truncate_division()
+        # 写入时不维护上级代码索引，抓取完成后再创建。
+        db_util.drop_indexes()
+        begin = time.perf_counter()
+        db_util.insert_many(
+            'province', [(province['statistical_code'], province['code'], province['name']) for province in provinces],
+            commit=False
+        )
+        for province in provinces:
+            if province['href'] != '':
+                db_util.insert_frontier(
+                    'city',
+                    url.replace('$ROUTE$', '') + province['href'],
+                    province,
+                    [province['statistical_code']],
+                    [province['name']],
+                    commit=False
+                )
+        db_util.commit()
+        # 省级页面与其它级别页面一样计入已保存页面数、信息数及数据库耗时
+        metrics.observe_page('province', len(provinces), time.perf_counter() - begin)
         if show_log:
-            province_name_temp = province['name']
-            print(f'[Log][{datetime.datetime.now()}] [{provinces.index(province) + 1}/{len(provinces)}] '
-                  f'完成抓取并保存【{province_name_temp}】')
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 完成抓取并保存地级信息')
-    print(f'[REPORT] 地级信息 {len(cities)} 个')
+            print(f'[Log][{datetime.datetime.now()}] 完成抓取并保存省级信息')
+    print(f'[REPORT] 省级信息 {db_util.select_count_province()} 个')
 
-    # 抓取并保存县级信息
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 开始抓取并保存县级信息')
-    counties = []
-    db_util.truncate_county()
-    for city in cities:
-        city_db_temp = db_util.select_city(city['statistical_code'])
-        if show_log:
-            province_name_temp = db_util.select_province(city_db_temp['province_statistical_code'])['name']
-            city_name_temp = city['name']
-            print(f'[Log][{datetime.datetime.now()}] [{cities.index(city) + 1}/{len(cities)}] '
-                  f'开始抓取并保存【{province_name_temp}】【{city_name_temp}】')
-        if city['href'] != '':
-            try:
-                url_base_temp = url_base[city['statistical_code']] + city['href']
-                counties_temp = stats_gov_cn_crawler.county(url_base_temp)
-            except Exception as e:
-                if e.args[0] == '不是县级信息页面':
-                    counties_temp = [{
-                        'href': city['href'][city['href'].find('/')+1:],
-                        'statistical_code': city['statistical_code'],
-                        'code': city['statistical_code'][0:6],
-                        'name': city['name']
-                    }]
-                else:
-                    raise e
-            for county in counties_temp:
-                counties.append(county)
-                db_util.insert_county(
-                    county['statistical_code'],
-                    county['code'],
-                    county['name'],
-                    city_db_temp['province_statistical_code'],
-                    city['statistical_code']
+    def save_page(name, task, rows):
+        begin = time.perf_counter()
+        children = _save_page(db_util, name, task, rows, baseline_level if incremental else '')
+        metrics.observe_page(name, len(rows), time.perf_counter() - begin)
+        if metrics_path != '':
+            metrics.export_due(metrics_path)
+        return children
+
+    # 抓取并保存地级、县级、乡级、村级信息，每个页面的信息、下级页面及完成状态在同一个事务中提交，每 batch_pages 个页面提交一次。
+    page_writer = PageWriter(db_util, save_page, write_queue)
+    try:
+        if mode == 'distributed' or pipeline:
+            if mode == 'distributed':
+                crawl_queue = RedisCrawlQueue(_redis_util(redis_config), url, lease_time)
+                _crawl_distributed(db_util, crawl_queue, page_writer.put, retry_queue, show_log)
+            else:
+                _crawl_pipeline(
+                    db_util, stats_gov_cn_crawler, mode, page_writer.put, concurrency, retry_queue, depth_first,
+                    show_log
                 )
-                url_base[county['statistical_code']] = url_base_temp[0:url_base_temp.rfind('/')+1]
+            page_writer.flush()
+            for name in LEVELS[1:]:
+                print(f'[REPORT] {LEVEL_LABELS[name]}信息 {getattr(db_util, f"select_count_{name}")()} 个')
+        else:
+            for name in LEVELS[1:]:
+                label = LEVEL_LABELS[name]
+                tasks = db_util.select_frontier_pending(name)
+                total = len(tasks)
+                count = 0
+                if show_log:
+                    print(f'[Log][{datetime.datetime.now()}] 开始抓取并保存{label}信息')
+                while tasks:
+                    if mode == 'asyncio':
+                        results = _fetch_level_asyncio(stats_gov_cn_crawler, name, tasks, concurrency.get(name, 10))
+                    elif mode == 'thread':
+                        results = _fetch_level_thread(stats_gov_cn_crawler, name, tasks, concurrency.get(name, 10))
+                    else:
+                        results = _fetch_level_serial(stats_gov_cn_crawler, name, tasks, show_log)
+                    for task, rows, error in results:
+                        if error is not None:
+                            rows = _retry_or_fallback(retry_queue, name, task, error)
+                            if rows is None:
+                                continue
+                        # 下级页面在保存时写入抓取队列表，下一级别开始前才读取，不需要等待保存完成。
+                        page_writer.put(name, task, rows)
+                        count += 1
+                        if show_log:
+                            names_temp = '】【'.join(task['top_names'])
+                            print(f'[Log][{datetime.datetime.now()}] [{count}/{total}] 完成抓取并保存【{names_temp}】')
+                            _print_status(stats_gov_cn_crawler)
+                    # 本级别其它页面完成后，等待并重试出错的页面。
+                    tasks = [task for _, task in retry_queue.wait_ready()]
+                page_writer.flush()
+                if show_log:
+                    print(f'[Log][{datetime.datetime.now()}] 完成抓取并保存{label}信息')
+                print(f'[REPORT] {label}信息 {getattr(db_util, f"select_count_{name}")()} 个')
+    except BaseException:
+        # 抓取出错或中断时仍保存已放入队列的页面并提交事务，写入出错时不替换原来的异常。
+        page_writer.close(raise_error=False)
+        raise
+    # 抓取完成时保存已放入队列的页面并提交事务
+    page_writer.close()
+    # 写入完成后创建上级代码索引及区划索引，供导出、按子树查询及下一年增量抓取按上级查询。
+    db_util.build_division()
+    db_util.create_indexes()
+    _print_failed(retry_queue)
+    _print_metrics(metrics)
+    if metrics_path != '':
+        metrics.export(metrics_path)
+        print(f'[REPORT] 抓取指标已导出到 {metrics_path}.prom 及 {metrics_path}.json')
+
+    # 程序结束时间
+    end_time = time.time()
+    print(f'[REPORT] 程序运行开始于 {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(begin_time))} '
+          f'结束于 {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(end_time))} '
+          f'总计用时 {int(end_time - begin_time)} 秒')
+
+
+def fetch_stats_gov_cn_years(url, db_path, years, show_log=True, sleep_time=0, mode='serial', concurrency=None,
+                             rate_limit=0, rate_burst=1, cache_path='', cache_revalidate=True, resume=True,
+                             incremental=False, baseline_level='town', pipeline=False, depth_first=False,
+                             replay_path='', adaptive=True, retry=3, retry_delay=10, metrics_path='', batch_pages=1,
+                             db_mode='default', write_queue=0):
+    """
+    批量采集多个年份的统计局信息，按年份从小到大依次抓取，各年份共用连接池、限速器、响应缓存及自适应并发控制器。
+    启用响应缓存时页面内容按内容哈希只保存一份，不同年份内容相同的页面只解析一次；增量抓取时每个年份以上一年份的
+    数据库为基准，未变化的下级页面不再请求。其它参数同 fetch_stats_gov_cn，不支持分布式抓取。
+
+    :param url: 统计局信息根网址，其中 $YEAR$ 替换为年份。
+    :type url: str
+    :param db_path: SQLite数据库路径，其中 $YEAR$ 替换为年份。
+    :type db_path: str
+    :param years: 抓取的年份
+    :type years: list
+    :param incremental: 是否以上一年份的数据库为基准增量抓取，上一年份的数据库不存在时完整抓取。
+    :type incremental: bool
+    :param metrics_path: 抓取指标导出文件路径（不含扩展名），其中 $YEAR$ 替换为年份，为空时不导出。
+    :type metrics_path: str
+    :return:
+    """
+    if mode == 'distributed':
+        raise Exception('批量抓取不支持分布式抓取模式')
+    if concurrency is None:
+        concurrency = {}
+    crawler = _create_crawler(
+        mode, concurrency, sleep_time, rate_limit, rate_burst, cache_path, cache_revalidate, replay_path, adaptive
+    )
+    for year in sorted(years):
+        baseline_path = ''
+        if incremental:
+            baseline_path = db_path.replace('$YEAR$', str(year - 1)) + 'db_stats.gov.cn.sqlite'
+            if not os.path.isfile(baseline_path):
+                baseline_path = ''
         if show_log:
-            province_name_temp = db_util.select_province(city_db_temp['province_statistical_code'])['name']
-            city_name_temp = city['name']
-            print(f'[Log][{datetime.datetime.now()}] [{cities.index(city) + 1}/{len(cities)}] '
-                  f'完成抓取并保存【{province_name_temp}】【{city_name_temp}】')
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 完成抓取并保存县级信息')
-    print(f'[REPORT] 县级信息 {len(counties)} 个')
+            print(f'[REPORT] 开始 {year} 年统计局信息抓取' + (f'，以 {baseline_path} 为基准增量抓取' if baseline_path else ''))
+        fetch_stats_gov_cn(
+            url.replace('$YEAR$', str(year)), db_path.replace('$YEAR$', str(year)), show_log, sleep_time, mode,
+            concurrency, rate_limit, rate_burst, cache_path, cache_revalidate, resume, baseline_path, baseline_level,
+            pipeline, depth_first, replay_path, adaptive, retry, retry_delay,
+            metrics_path=metrics_path.replace('$YEAR$', str(year)), batch_pages=batch_pages, db_mode=db_mode,
+            write_queue=write_queue, crawler=crawler
+        )
+        if crawler.cache is not None:
+            responses, pages = crawler.cache.stats()
+            print(f'[REPORT] 响应缓存共 {responses} 个链接，按内容去重后保存 {pages} 份页面。')
 
-    # 抓取并保存乡级信息
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 开始抓取并保存乡级信息')
-    towns = []
-    db_util.truncate_town()
-    for county in counties:
-        county_db_temp = db_util.select_county(county['statistical_code'])
+
+def import_history_stats_gov_cn(db_path, history_path, years, show_log=True):
+    """
+    将多个年份的统计局信息按年份从小到大连续导入多年份数据库，已导入的年份跳过。还没有导入任何年份时跳过开头数据库不存在的年份，
+    之后遇到数据库不存在的年份时停止导入，之后的年份需补齐该年份后再导入。
+
+    :param db_path: SQLite数据库路径，其中 $YEAR$ 替换为年份。
+    :type db_path: str
+    :param history_path: 多年份数据库文件路径
+    :type history_path: str
+    :param years: 导入的年份
+    :type years: list
+    :param show_log: 是否显示日志
+    :type show_log: bool
+    :return: 导入的年份
+    :rtype: list
+    """
+    history_util = DBUtilStatsGovCnHistory(history_path)
+    imported_years = history_util.select_years()
+    # 最后导入的年份，之后只能导入下一年。
+    last_year = imported_years[-1] if imported_years else None
+    result = []
+    for year in sorted(years):
+        database = db_path.replace('$YEAR$', str(year)) + 'db_stats.gov.cn.sqlite'
+        if last_year is not None and year <= last_year:
+            if show_log:
+                print(f'[REPORT] {year} 年{"已导入" if year in imported_years else "早于已导入的年份"}，跳过。')
+            continue
+        if not os.path.isfile(database):
+            if last_year is None:
+                if show_log:
+                    print(f'[REPORT] {year} 年数据文件 {database} 不存在，跳过。')
+                continue
+            print(f'[Error] {year} 年数据文件 {database} 不存在，年份需连续导入，停止导入。')
+            break
+        begin = time.time()
+        count, inserted = history_util.import_year(year, database)
+        last_year = year
+        result.append(year)
         if show_log:
-            province_name_temp = db_util.select_province(county_db_temp['province_statistical_code'])['name']
-            city_name_temp = db_util.select_city(county_db_temp['city_statistical_code'])['name']
-            county_name_temp = county['name']
-            print(f'[Log][{datetime.datetime.now()}] [{counties.index(county) + 1}/{len(counties)}] '
-                  f'开始抓取并保存【{province_name_temp}】【{city_name_temp}】【{county_name_temp}】')
-        if county['href'] != '':
-            try:
-                url_base_temp = url_base[county['statistical_code']] + county['href']
-                towns_temp = stats_gov_cn_crawler.town(url_base_temp)
-            except Exception as e:
-                if e.args[0] == '不是乡级信息页面':
-                    towns_temp = [{
-                        'href': county['href'][county['href'].find('/')+1:],
-                        'statistical_code': county['statistical_code'],
-                        'code': county['statistical_code'][0:9],
-                        'name': county['name']
-                    }]
+            print(f'[REPORT] {year} 年导入完成，共 {count} 条信息，其中新增或变化 {inserted} 条，'
+                  f'耗时 {time.time() - begin:.2f} 秒。')
+    return result
+
+
+def _create_crawler(mode, concurrency, sleep_time, rate_limit, rate_burst, cache_path, cache_revalidate, replay_path,
+                    adaptive):
+    """
+    按抓取参数创建爬虫对象，参数说明同 fetch_stats_gov_cn。
+
+    :return: 爬虫对象
+    :rtype: StatsGovCn
+    """
+    # 所有请求共享的限速器
+    rate_limiter = TokenBucket(rate_limit, rate_burst)
+    # 所有请求共享的响应缓存
+    cache = DBUtilResponseCache(cache_path, cache_revalidate) if cache_path != '' else None
+
+    if mode == 'thread':
+        crawler = ThreadPoolStatsGovCn(max(concurrency.values(), default=10))
+    else:
+        crawler = StatsGovCn()
+    crawler.sleep_time = sleep_time
+    crawler.rate_limiter = rate_limiter
+    crawler.cache = cache
+    crawler.replay = open_replay(replay_path) if replay_path != '' else None
+    if adaptive and replay_path == '':
+        # 所有请求共享的自适应并发控制器，通过调整共享的限速器控制每秒请求数。
+        crawler.controller = AdaptiveController(
+            rate_limiter, 1 if mode == 'serial' else max(concurrency.values(), default=10)
+        )
+    return crawler
+
+
+def _save_page(db_util, name, task, rows, baseline_level=''):
+    """
+    在同一个事务中保存页面信息、下级页面及页面完成状态
+
+    :param db_util: 数据库操作对象
+    :type db_util: DBUtilStatsGovCn
+    :param name: 页面级别名称
+    :type name: str
+    :param task: 抓取的页面
+    :type task: dict
+    :param rows: 页面信息数组
+    :type rows: list
+    :param baseline_level: 增量抓取时开始与基准比较的页面级别，为空时不与基准比较。
+    :type baseline_level: str
+    :return: 新加入抓取队列的下级页面，元素为 (级别名称, 页面)。
+    :rtype: list
+    """
+    page_hash = _rows_hash(rows)
+    if baseline_level != '' and LEVELS.index(name) >= LEVELS.index(baseline_level) \
+            and db_util.select_baseline_hash(name, task['parent']['statistical_code']) == page_hash:
+        # 页面与基准相同，从基准复制本页面及所有下级信息，不再抓取下级页面。
+        db_util.copy_baseline_subtree(name, task['parent']['statistical_code'], commit=False)
+        rows = []
+    db_util.insert_many(
+        name, [(row['statistical_code'], row['code'], row['name'], *task['top_codes']) for row in rows], commit=False
+    )
+    children = []
+    for row in rows:
+        if name != 'village' and row['href'] != '':
+            child = {
+                'url': task['url'][0:task['url'].rfind('/')+1] + row['href'],
+                'parent': row,
+                'top_codes': task['top_codes'] + [row['statistical_code']],
+                'top_names': task['top_names'] + [row['name']],
+            }
+            child['id'] = db_util.insert_frontier(
+                LEVELS[LEVELS.index(name) + 1], child['url'], row, child['top_codes'], child['top_names'],
+                commit=False
+            )
+            if child['id'] is not None:
+                children.append((LEVELS[LEVELS.index(name) + 1], child))
+    db_util.update_frontier_done(task['id'], page_hash, commit=False)
+    db_util.commit_page()
+    return children
+
+
+def _crawl_pipeline(db_util, crawler, mode, save_page, concurrency, retry_queue, depth_first=False, show_log=True):
+    """
+    流水线抓取：所有级别的待抓取页面在同一个队列中，页面保存后其下级页面立即加入队列，不必等待整个级别完成。
+
+    :param db_util: 数据库操作对象
+    :type db_util: DBUtilStatsGovCn
+    :param crawler: 爬虫对象，'asyncio' 模式仅用于复制设置。
+    :type crawler: StatsGovCn
+    :param mode: 抓取模式，'serial'、'asyncio' 或 'thread'。
+    :type mode: str
+    :param save_page: 保存页面的方法，参数为级别名称、页面、页面信息数组，返回 Future，结果为下级页面，见 PageWriter.put。
+    :type save_page: function
+    :param concurrency: 各级别的最大并发数，总并发数为其中的最大值。
+    :type concurrency: dict
+    :param retry_queue: 出错页面的重试队列，到期的页面重新加入对应级别的待抓取页面。
+    :type retry_queue: RetryQueue
+    :param depth_first: 是否深度优先，为 True 时优先抓取低级别及最新加入的页面，子树能尽早完整可用。
+    :type depth_first: bool
+    :param show_log: 是否显示日志
+    :type show_log: bool
+    :return:
+    """
+    names = LEVELS[1:]
+    total_limit = 1 if mode == 'serial' else max(concurrency.values(), default=10)
+    # 各级别的待抓取页面
+    queues = {name: collections.deque(db_util.select_frontier_pending(name)) for name in names}
+    # 抓取中的页面
+    running = {}
+    running_count = {name: 0 for name in names}
+    # 保存中的页面数，保存完成的页面由写入线程加入 saved 并设置 saved_event，之后其下级页面加入待抓取页面。
+    # 不把保存中的页面一起传给 concurrent.futures.wait，否则每次等待都要为队列中的所有页面注册等待。
+    saving = 0
+    saved = collections.deque()
+    saved_event = threading.Event()
+
+    def on_saved(future):
+        saved.append(future)
+        saved_event.set()
+
+    loop = None
+    if mode == 'asyncio':
+        # 事件循环在后台线程中运行，协程的结果通过 concurrent.futures.Future 取回。
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        async_crawler = AsyncStatsGovCn(total_limit)
+        async_crawler.copy_settings(crawler)
+        crawler = async_crawler
+        asyncio.run_coroutine_threadsafe(crawler.open(), loop).result()
+
+        def submit(name, url):
+            return asyncio.run_coroutine_threadsafe(getattr(crawler, name)(url), loop)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=total_limit)
+
+        def submit(name, url):
+            return executor.submit(getattr(crawler, name), url)
+
+    count = 0
+    try:
+        while running or saving or any(queues.values()) or len(retry_queue) > 0:
+            saved_event.clear()
+            while saved:
+                saving -= 1
+                for child_name, child in saved.popleft().result():
+                    queues[child_name].append(child)
+            for name, task in retry_queue.pop_ready():
+                queues[name].append(task)
+            # 按优先级提交页面，直到达到总并发数或各级别并发数。
+            for name in reversed(names) if depth_first else names:
+                queue = queues[name]
+                while queue and len(running) < total_limit and running_count[name] < concurrency.get(name, 10):
+                    task = queue.pop() if depth_first else queue.popleft()
+                    running[submit(name, task['url'])] = (name, task)
+                    running_count[name] += 1
+            if not running:
+                if saving:
+                    # 等待保存完成后加入其下级页面
+                    saved_event.wait(retry_queue.wait())
                 else:
-                    raise e
-            for town in towns_temp:
-                towns.append(town)
-                db_util.insert_town(
-                    town['statistical_code'],
-                    town['code'],
-                    town['name'],
-                    county_db_temp['province_statistical_code'],
-                    county_db_temp['city_statistical_code'],
-                    county['statistical_code']
-                )
-                url_base[town['statistical_code']] = url_base_temp[0:url_base_temp.rfind('/')+1]
-        if show_log:
-            province_name_temp = db_util.select_province(county_db_temp['province_statistical_code'])['name']
-            city_name_temp = db_util.select_city(county_db_temp['city_statistical_code'])['name']
-            county_name_temp = county['name']
-            print(f'[Log][{datetime.datetime.now()}] [{counties.index(county) + 1}/{len(counties)}] '
-                  f'完成抓取并保存【{province_name_temp}】【{city_name_temp}】【{county_name_temp}】')
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 完成抓取并保存乡级信息')
-    print(f'[REPORT] 乡级信息 {len(towns)} 个')
+                    # 只剩等待重试的页面
+                    time.sleep(retry_queue.wait() or 0)
+                continue
+            done, _ = concurrent.futures.wait(
+                running, timeout=retry_queue.wait(), return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                name, task = running.pop(future)
+                running_count[name] -= 1
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    rows = _retry_or_fallback(retry_queue, name, task, e)
+                    if rows is None:
+                        continue
+                save_page(name, task, rows).add_done_callback(on_saved)
+                saving += 1
+                count += 1
+                if show_log:
+                    names_temp = '】【'.join(task['top_names'])
+                    pending_temp = sum(len(queue) for queue in queues.values())
+                    print(f'[Log][{datetime.datetime.now()}] [{count}/{count + pending_temp + len(running)}] '
+                          f'完成抓取并保存【{names_temp}】{LEVEL_LABELS[name]}信息')
+                    _print_status(crawler)
+    finally:
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(crawler.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+        else:
+            executor.shutdown()
 
-    # 抓取并保存村级信息
+
+def _crawl_distributed(db_util, crawl_queue, save_page, retry_queue, show_log=True):
+    """
+    分布式抓取的写入进程：待抓取页面放入 Redis 队列，由各抓取节点领取抓取，本进程取回结果后写入数据库，下级页面再放入队列。
+
+    同一页面可能因租约到期被重复抓取，只保存第一次取回的结果。
+
+    :param db_util: 数据库操作对象
+    :type db_util: DBUtilStatsGovCn
+    :param crawl_queue: 分布式抓取队列
+    :type crawl_queue: RedisCrawlQueue
+    :param save_page: 保存页面的方法，参数为级别名称、页面、页面信息数组，返回 Future，结果为下级页面，见 PageWriter.put。
+    :type save_page: function
+    :param retry_queue: 出错页面的重试队列，到期的页面重新放入 Redis 队列。
+    :type retry_queue: RetryQueue
+    :param show_log: 是否显示日志
+    :type show_log: bool
+    :return:
+    """
+    crawl_queue.reset()
+    # 已放入队列但还未取回结果的页面
+    outstanding = {}
+
+    def put(name, task):
+        outstanding[task['id']] = task
+        crawl_queue.put(name, task)
+
+    for name in LEVELS[1:]:
+        for task in db_util.select_frontier_pending(name):
+            put(name, task)
     if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 开始抓取并保存村级信息')
-    villages = []
-    db_util.truncate_village()
-    for town in towns:
-        town_db_temp = db_util.select_town(town['statistical_code'])
+        print(f'[Log][{datetime.datetime.now()}] 待抓取页面 {len(outstanding)} 个已放入队列，等待抓取节点')
+
+    count = 0
+    last_requeue = time.monotonic()
+    # 保存中的页面数，保存完成的页面由写入线程加入 saved 并设置 saved_event，之后其下级页面放入队列。
+    saving = 0
+    saved = collections.deque()
+    saved_event = threading.Event()
+
+    def on_saved(future):
+        saved.append(future)
+        saved_event.set()
+
+    while outstanding or saving or len(retry_queue) > 0:
+        saved_event.clear()
+        while saved:
+            saving -= 1
+            for child_name, child in saved.popleft().result():
+                put(child_name, child)
+        if not outstanding and saving:
+            # 只剩保存中的页面，等待保存完成后放入其下级页面。
+            saved_event.wait()
+            continue
+        for name, task in retry_queue.pop_ready():
+            put(name, task)
+        if time.monotonic() - last_requeue >= 1:
+            last_requeue = time.monotonic()
+            requeued = crawl_queue.requeue_expired()
+            if requeued > 0:
+                print(f'[Error] {requeued} 个页面的租约已到期，重新放入队列。')
+        result = crawl_queue.result()
+        if result is None:
+            continue
+        name, task = result['level'], result['task']
+        if outstanding.pop(task['id'], None) is None:
+            # 租约到期后重复抓取的页面
+            continue
+        rows = result['rows']
+        if result['error'] is not None:
+            rows = _retry_or_fallback(
+                retry_queue, name, task, WrongPageLevel(result['error'], result['page_level'])
+                if result.get('page_level') else Exception(result['error'])
+            )
+            if rows is None:
+                continue
+        save_page(name, task, rows).add_done_callback(on_saved)
+        saving += 1
+        count += 1
         if show_log:
-            province_name_temp = db_util.select_province(town_db_temp['province_statistical_code'])['name']
-            city_name_temp = db_util.select_city(town_db_temp['city_statistical_code'])['name']
-            county_name_temp = db_util.select_county(town_db_temp['county_statistical_code'])['name']
-            town_name_temp = town['name']
-            print(f'[Log][{datetime.datetime.now()}] [{towns.index(town) + 1}/{len(towns)}] '
-                  f'开始抓取并保存【{province_name_temp}】【{city_name_temp}】【{county_name_temp}】【{town_name_temp}】')
-        if town['href'] != '':
-            try:
-                villages_temp = stats_gov_cn_crawler.village(url_base[town['statistical_code']] + town['href'])
-            except Exception as e:
-                if e.args[0] == '不是村级信息页面':
-                    villages_temp = []
-                else:
-                    raise e
-            for village in villages_temp:
-                villages.append(village)
-                db_util.insert_village(
-                    village['statistical_code'],
-                    village['code'],
-                    village['name'],
-                    town_db_temp['province_statistical_code'],
-                    town_db_temp['city_statistical_code'],
-                    town_db_temp['county_statistical_code'],
-                    town['statistical_code']
-                )
+            names_temp = '】【'.join(task['top_names'])
+            print(f'[Log][{datetime.datetime.now()}] [{count}/{count + len(outstanding) + len(retry_queue)}] '
+                  f'完成保存【{names_temp}】{LEVEL_LABELS[name]}信息')
+    crawl_queue.finish()
+
+
+def crawl_node_stats_gov_cn(url, redis_config, show_log=True, sleep_time=0, rate_limit=0, rate_burst=1, cache_path='',
+                            cache_revalidate=True, adaptive=True, lease_time=60):
+    """
+    分布式抓取节点：从 Redis 队列领取页面抓取并返回解析后的信息，不写入数据库。可在多个进程或多台机器上同时运行，
+    写入进程（mode='distributed' 的 fetch_stats_gov_cn）标记抓取完成后退出。
+
+    :param url: 统计局信息根网址，与写入进程相同，用于区分队列。
+    :type url: str
+    :param redis_config: Redis 配置，包括 host、port、pass、db。
+    :type redis_config: dict
+    :param show_log: 是否显示日志
+    :type show_log: bool
+    :param sleep_time: 爬虫每次爬取后的休眠时间，单位为秒。
+    :type sleep_time: int
+    :param rate_limit: 本节点每秒最大请求数，0 为不限速。
+    :type rate_limit: float
+    :param rate_burst: 允许的最大突发请求数
+    :type rate_burst: int
+    :param cache_path: 响应缓存数据库文件路径，为空时不使用缓存。
+    :type cache_path: str
+    :param cache_revalidate: 是否向站点重新验证缓存
+    :type cache_revalidate: bool
+    :param adaptive: 是否自适应调整每秒请求数
+    :type adaptive: bool
+    :param lease_time: 领取页面的租约时长，单位为秒，与写入进程相同。
+    :type lease_time: int
+    :return:
+    """
+    # 程序开始时间
+    begin_time = time.time()
+
+    rate_limiter = TokenBucket(rate_limit, rate_burst)
+    stats_gov_cn_crawler = StatsGovCn()
+    stats_gov_cn_crawler.sleep_time = sleep_time
+    stats_gov_cn_crawler.rate_limiter = rate_limiter
+    stats_gov_cn_crawler.cache = DBUtilResponseCache(cache_path, cache_revalidate) if cache_path != '' else None
+    if adaptive:
+        stats_gov_cn_crawler.controller = AdaptiveController(rate_limiter)
+    crawl_queue = RedisCrawlQueue(_redis_util(redis_config), url, lease_time)
+
+    # 启动时可能还留有上一次抓取的完成标记，看到未完成的队列后再以完成标记为退出条件。
+    started = False
+    count = 0
+    # 返回结果时租约已到期的页面数，这些页面可能已由其它节点重新抓取。
+    expired = 0
+    while True:
+        claimed = crawl_queue.claim()
+        if claimed is None:
+            finished = crawl_queue.finished()
+            if finished and started:
+                break
+            started = started or not finished
+            time.sleep(0.5)
+            continue
+        started = True
+        lease, (name, task) = claimed
+        try:
+            held = crawl_queue.complete(lease, rows=getattr(stats_gov_cn_crawler, name)(task['url']))
+        except Exception as e:
+            held = crawl_queue.complete(lease, error=str(e) or repr(e), page_level=getattr(e, 'level', ''))
+        count += 1
+        expired += 0 if held else 1
         if show_log:
-            province_name_temp = db_util.select_province(town_db_temp['province_statistical_code'])['name']
-            city_name_temp = db_util.select_city(town_db_temp['city_statistical_code'])['name']
-            county_name_temp = db_util.select_county(town_db_temp['county_statistical_code'])['name']
-            town_name_temp = town['name']
-            print(f'[Log][{datetime.datetime.now()}] [{towns.index(town) + 1}/{len(towns)}] '
-                  f'完成抓取并保存【{province_name_temp}】【{city_name_temp}】【{county_name_temp}】【{town_name_temp}】')
-    if show_log:
-        print(f'[Log][{datetime.datetime.now()}] 完成抓取并保存村级信息')
-    print(f'[REPORT] 村级信息 {len(villages)} 个')
+            names_temp = '】【'.join(task['top_names'])
+            print(f'[Log][{datetime.datetime.now()}] 完成抓取【{names_temp}】{LEVEL_LABELS[name]}信息')
+            _print_status(stats_gov_cn_crawler)
+
     # 程序结束时间
     end_time = time.time()
-    print(f'[REPORT] 程序运行开始于 {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(begin_time))} '
+    print(f'[REPORT] 本节点抓取页面 {count} 个（其中租约已到期 {expired} 个），'
+          f'程序运行开始于 {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(begin_time))} '
           f'结束于 {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(end_time))} '
           f'总计用时 {int(end_time - begin_time)} 秒')
 
 
-def export_csv_stats_gov_cn(db_path, show_log=True, encoding='UTF-8'):
+def _redis_util(redis_config):
+    """
+    创建 Redis 连接对象
+
+    :param redis_config: Redis 配置，包括 host、port、pass、db。
+    :type redis_config: dict
+    :return: Redis 连接对象
+    :rtype: redis.StrictRedis
+    """
+    # 只在分布式抓取时导入 redis
+    import redis
+
+    if redis_config is None:
+        raise Exception('分布式抓取需要 Redis 配置')
+    return redis.StrictRedis(
+        connection_pool=redis.ConnectionPool(
+            host=redis_config['host'],
+            port=redis_config['port'],
+            password=redis_config['pass'],
+            db=redis_config['db'],
+            decode_responses=True
+        )
+    )
+
+
+def _print_status(crawler):
+    """
+    定期输出自适应并发控制器的当前并发数、每秒请求数及最近请求的错误比例
+
+    :param crawler: 爬虫对象
+    :type crawler: StatsGovCn
+    :return:
+    """
+    status = crawler.controller.report() if crawler.controller is not None else None
+    if status is not None:
+        print(f'[STATUS][{datetime.datetime.now()}] {status}')
+
+
+def _fetch_index(crawler, url, retry_queue):
+    """
+    抓取省级页面，出错（包括 404、没有省级信息及不是省级页面）时等待后重试，超过重试次数时抛出异常。
+    在清空数据库之前调用，抓取失败时不修改已有数据。
+
+    :param crawler: 爬虫对象
+    :type crawler: StatsGovCn
+    :param url: 省级页面链接
+    :type url: str
+    :param retry_queue: 重试队列
+    :type retry_queue: RetryQueue
+    :return: 省级信息数组
+    :rtype: list
+    """
+    while True:
+        try:
+            provinces = crawler.province(url)
+            if len(provinces) == 0:
+                raise Exception(f'省级页面没有信息：{url}')
+            return provinces
+        except Exception as e:
+            if not retry_queue.push('province', {'url': url}, e):
+                raise e
+            retry_queue.wait_ready()
+
+
+def _retry_or_fallback(retry_queue, name, task, error):
+    """
+    抓取出错的页面加入重试队列；超过重试次数时，不是对应级别页面的以上级信息代替，其它错误记为失败页面。
+    页面是其它级别的页面时（例如东莞市不设县级，地级页面下直接是乡级页面）重试结果也相同，不再重试。
+
+    :param retry_queue: 重试队列
+    :type retry_queue: RetryQueue
+    :param name: 级别名称
+    :type name: str
+    :param task: 抓取的页面
+    :type task: dict
+    :param error: 抓取时的异常
+    :type error: Exception
+    :return: 代替的信息数组，已加入重试队列或记为失败时为 None。
+    :rtype: list
+    """
+    recurring = isinstance(error, WrongPageLevel) and error.level != ''
+    if not recurring and retry_queue.push(name, task, error):
+        return None
+    try:
+        return _fallback_rows(name, task, error)
+    except Exception:
+        retry_queue.fail(name, task, error)
+        return None
+
+
+def _print_failed(retry_queue):
+    """
+    输出重试后仍失败的页面，这些页面仍在抓取队列中，再次抓取时从中断处继续。
+
+    :param retry_queue: 重试队列
+    :type retry_queue: RetryQueue
+    :return:
+    """
+    if not retry_queue.failed:
+        return
+    print(f'[REPORT] 重试后仍失败的页面 {len(retry_queue.failed)} 个，再次抓取时将从中断处继续：')
+    for name, task, error in retry_queue.failed:
+        names_temp = '】【'.join(task['top_names'])
+        print(f'[REPORT] {LEVEL_LABELS[name]}【{names_temp}】{task["url"]} {error}')
+
+
+def _print_metrics(metrics):
+    """
+    输出各级别吞吐量及请求、解析、数据库各阶段的累计耗时
+
+    :param metrics: 抓取指标
+    :type metrics: CrawlMetrics
+    :return:
+    """
+    summary = metrics.summary()
+    for name in LEVELS:
+        level = summary['levels'].get(name)
+        if level is None:
+            continue
+        stages = level['stage_seconds']
+        saved = level['bytes_saved'] / level['bytes'] if level['bytes'] > 0 else 0
+        print(f'[REPORT] {LEVEL_LABELS[name]}页面 {level["pages"]} 个，请求 {level["requests"]} 次 '
+              f'{level["bytes"]} 字节（传输 {level["wire_bytes"]} 字节，压缩节省 {saved:.0%}），请求耗时中位数 ≤{level["latency_seconds"]["p50"]} 秒，'
+              f'累计请求 {stages["request"]:.1f} 秒、解析 {stages["parse"]:.1f} 秒、数据库 {stages["db"]:.1f} 秒，'
+              f'出错 {sum(level["retries"].values())} 次')
+    print(f'[REPORT] 每秒保存页面 {summary["pages_per_second"]:.1f} 个、信息 {summary["rows_per_second"]:.1f} 个')
+
+
+def _rows_hash(rows):
+    """
+    计算页面信息的哈希值
+
+    :param rows: 页面信息数组
+    :type rows: list
+    :return: 哈希值
+    :rtype: str
+    """
+    return hashlib.sha1(json.dumps(rows, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _fetch_level_serial(crawler, name, tasks, show_log=True):
+    """
+    逐页串行抓取指定级别页面
+
+    :param crawler: 爬虫对象
+    :type crawler: StatsGovCn
+    :param name: 级别名称
+    :type name: str
+    :param tasks: 待抓取的页面
+    :type tasks: list
+    :param show_log: 是否显示日志
+    :type show_log: bool
+    :return: 按 tasks 顺序生成 (页面, 页面信息数组, 异常)，出错时信息数组为 None。
+    """
+    for index, task in enumerate(tasks):
+        if show_log:
+            names_temp = '】【'.join(task['top_names'])
+            print(f'[Log][{datetime.datetime.now()}] [{index + 1}/{len(tasks)}] 开始抓取并保存【{names_temp}】')
+        try:
+            yield task, getattr(crawler, name)(task['url']), None
+        except Exception as e:
+            yield task, None, e
+
+
+def _fetch_level_thread(crawler, name, tasks, workers=10):
+    """
+    多线程并发抓取指定级别页面
+
+    :param crawler: 多线程爬虫对象
+    :type crawler: ThreadPoolStatsGovCn
+    :param name: 级别名称
+    :type name: str
+    :param tasks: 待抓取的页面
+    :type tasks: list
+    :param workers: 线程数
+    :type workers: int
+    :return: 按 tasks 顺序生成 (页面, 页面信息数组, 异常)，出错时信息数组为 None。
+    """
+    futures = crawler.imap(name, [task['url'] for task in tasks], workers)
+    for task, future in zip(tasks, futures):
+        try:
+            yield task, future.result(), None
+        except Exception as e:
+            yield task, None, e
+
+
+def _fetch_level_asyncio(crawler, name, tasks, concurrency=10):
+    """
+    异步并发抓取指定级别页面
+
+    :param crawler: 爬虫对象，用于复制设置。
+    :type crawler: StatsGovCn
+    :param name: 级别名称
+    :type name: str
+    :param tasks: 待抓取的页面
+    :type tasks: list
+    :param concurrency: 最大并发数
+    :type concurrency: int
+    :return: 按 tasks 顺序排列的 (页面, 页面信息数组, 异常)，出错时信息数组为 None。
+    :rtype: list
+    """
+    async def fetch_all():
+        async_crawler = AsyncStatsGovCn(concurrency)
+        async_crawler.copy_settings(crawler)
+        await async_crawler.open()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(task):
+            async with semaphore:
+                try:
+                    return task, await getattr(async_crawler, name)(task['url']), None
+                except Exception as e:
+                    return task, None, e
+
+        try:
+            return await asyncio.gather(*[fetch(task) for task in tasks])
+        finally:
+            await async_crawler.close()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(fetch_all())
+    finally:
+        loop.close()
+
+
+def _fallback_rows(name, task, e):
+    """
+    下级页面不是对应级别页面时的处理：县级、乡级以上级信息代替（例如东莞市不设县级），村级为空，其它级别抛出异常。
+
+    :param name: 级别名称
+    :type name: str
+    :param task: 抓取的页面
+    :type task: dict
+    :param e: 抓取时的异常
+    :type e: Exception
+    :return: 代替的信息数组
+    :rtype: list
+    """
+    if not e.args or e.args[0] != f'不是{LEVEL_LABELS[name]}信息页面':
+        raise e
+    if name == 'village':
+        return []
+    if name not in ('county', 'town'):
+        raise e
+    parent = task['parent']
+    return [{
+        'href': parent['href'][parent['href'].find('/')+1:],
+        'statistical_code': parent['statistical_code'],
+        'code': parent['statistical_code'][0:LEVEL_CODE_LENGTHS[name]],
+        'name': parent['name']
+    }]
+
+
+def export_csv_stats_gov_cn(db_path, show_log=True, encoding='UTF-8', db_mode='default'):
     """
     导出统计局信息到 csv 文件
 
@@ -230,15 +932,15 @@ def export_csv_stats_gov_cn(db_path, show_log=True, encoding='UTF-8'):
     :type show_log: bool
     :param show_log: 输入文件的字符编码
     :type encoding: str
+    :param db_mode: 数据库连接模式，见 lib.util.DB_MODES，只读导出时通常为 'read'。
+    :type db_mode: str
     :return:
     """
     # 程序开始时间
     begin_time = time.time()
 
     # 数据库操作对象
-    db_util = DBUtilStatsGovCn(db_path + 'db_stats.gov.cn.sqlite')
-
-    limit = 100
+    db_util = DBUtilStatsGovCn(db_path + 'db_stats.gov.cn.sqlite', mode=db_mode)
 
     header_province = ['statistical_code', 'code', 'name']
     header_city = ['statistical_code', 'code', 'name', 'province_statistical_code']
@@ -250,60 +952,50 @@ def export_csv_stats_gov_cn(db_path, show_log=True, encoding='UTF-8'):
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出省级信息数据')
-    count_province = db_util.select_count_province()
     with open(f'{db_path}province_stats.gov.cn.csv', 'w', encoding=encoding) as csv_file:
-        csv_province = csv.DictWriter(csv_file, header_province)
-        csv_province.writeheader()
-        for i in range(0, math.ceil(count_province / limit)):
-            csv_province.writerows(db_util.select_provinces(limit, i * limit))
+        csv_province = csv.writer(csv_file)
+        csv_province.writerow(header_province)
+        csv_province.writerows(db_util.iter_provinces(as_tuple=True))
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出省级信息数据')
     print(f'[REPORT] 省级信息导出完成 {db_path}province_stats.gov.cn.csv')
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出地级信息数据')
-    count_city = db_util.select_count_city()
     with open(f'{db_path}city_stats.gov.cn.csv', 'w', encoding=encoding) as csv_file:
-        csv_city = csv.DictWriter(csv_file, header_city)
-        csv_city.writeheader()
-        for i in range(0, math.ceil(count_city / limit)):
-            csv_city.writerows(db_util.select_cities(limit, i * limit))
+        csv_city = csv.writer(csv_file)
+        csv_city.writerow(header_city)
+        csv_city.writerows(db_util.iter_cities(as_tuple=True))
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出地级信息数据')
     print(f'[REPORT] 地级信息导出完成 {db_path}city_stats.gov.cn.csv')
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出县级信息数据')
-    count_county = db_util.select_count_county()
     with open(f'{db_path}county_stats.gov.cn.csv', 'w', encoding=encoding) as csv_file:
-        csv_county = csv.DictWriter(csv_file, header_county)
-        csv_county.writeheader()
-        for i in range(0, math.ceil(count_county / limit)):
-            csv_county.writerows(db_util.select_counties(limit, i * limit))
+        csv_county = csv.writer(csv_file)
+        csv_county.writerow(header_county)
+        csv_county.writerows(db_util.iter_counties(as_tuple=True))
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出县级信息数据')
     print(f'[REPORT] 县级信息导出完成 {db_path}county_stats.gov.cn.csv')
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出乡级信息数据')
-    count_town = db_util.select_count_town()
     with open(f'{db_path}town_stats.gov.cn.csv', 'w', encoding=encoding) as csv_file:
-        csv_town = csv.DictWriter(csv_file, header_town)
-        csv_town.writeheader()
-        for i in range(0, math.ceil(count_town / limit)):
-            csv_town.writerows(db_util.select_towns(limit, i * limit))
+        csv_town = csv.writer(csv_file)
+        csv_town.writerow(header_town)
+        csv_town.writerows(db_util.iter_towns(as_tuple=True))
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出乡级信息数据')
     print(f'[REPORT] 乡级信息导出完成 {db_path}town_stats.gov.cn.csv')
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出村级信息数据')
-    count_village = db_util.select_count_village()
     with open(f'{db_path}village_stats.gov.cn.csv', 'w', encoding=encoding) as csv_file:
-        csv_village = csv.DictWriter(csv_file, header_village)
-        csv_village.writeheader()
-        for i in range(0, math.ceil(count_village / limit)):
-            csv_village.writerows(db_util.select_villages(limit, i * limit))
+        csv_village = csv.writer(csv_file)
+        csv_village.writerow(header_village)
+        csv_village.writerows(db_util.iter_villages(as_tuple=True))
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出村级信息数据')
     print(f'[REPORT] 村级信息导出完成 {db_path}village_stats.gov.cn.csv')
@@ -315,7 +1007,7 @@ def export_csv_stats_gov_cn(db_path, show_log=True, encoding='UTF-8'):
           f'总计用时 {int(end_time - begin_time)} 秒')
 
 
-def export_json_stats_gov_cn(db_path, show_log=True):
+def export_json_stats_gov_cn(db_path, show_log=True, db_mode='default'):
     """
     导出统计局信息到 json 文件
 
@@ -323,72 +1015,52 @@ def export_json_stats_gov_cn(db_path, show_log=True):
     :type db_path: str
     :param show_log: 是否显示日志
     :type show_log: bool
+    :param db_mode: 数据库连接模式，见 lib.util.DB_MODES，只读导出时通常为 'read'。
+    :type db_mode: str
     :return:
     """
     # 程序开始时间
     begin_time = time.time()
 
     # 数据库操作对象
-    db_util = DBUtilStatsGovCn(db_path + 'db_stats.gov.cn.sqlite')
-
-    limit = 100
+    db_util = DBUtilStatsGovCn(db_path + 'db_stats.gov.cn.sqlite', mode=db_mode)
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出省级信息数据')
-    count_province = db_util.select_count_province()
     with open(f'{db_path}province_stats.gov.cn.json', 'w') as json_file:
-        province_db = []
-        for i in range(0, math.ceil(count_province / limit)):
-            province_db += db_util.select_provinces(limit, i * limit)
-        json.dump(province_db, json_file)
+        _dump_json_array(db_util.iter_provinces(as_tuple=True), TABLE_COLUMNS['province'], json_file)
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出省级信息数据')
     print(f'[REPORT] 省级信息导出完成 {db_path}province_stats.gov.cn.json')
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出地级信息数据')
-    count_city = db_util.select_count_city()
     with open(f'{db_path}city_stats.gov.cn.json', 'w') as json_file:
-        city_db = []
-        for i in range(0, math.ceil(count_city / limit)):
-            city_db += db_util.select_cities(limit, i * limit)
-        json.dump(city_db, json_file)
+        _dump_json_array(db_util.iter_cities(as_tuple=True), TABLE_COLUMNS['city'], json_file)
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出地级信息数据')
     print(f'[REPORT] 地级信息导出完成 {db_path}city_stats.gov.cn.json')
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出县级信息数据')
-    count_county = db_util.select_count_county()
     with open(f'{db_path}county_stats.gov.cn.json', 'w') as json_file:
-        county_db = []
-        for i in range(0, math.ceil(count_county / limit)):
-            county_db += db_util.select_counties(limit, i * limit)
-        json.dump(county_db, json_file)
+        _dump_json_array(db_util.iter_counties(as_tuple=True), TABLE_COLUMNS['county'], json_file)
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出县级信息数据')
     print(f'[REPORT] 县级信息导出完成 {db_path}county_stats.gov.cn.json')
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出乡级信息数据')
-    count_town = db_util.select_count_town()
     with open(f'{db_path}town_stats.gov.cn.json', 'w') as json_file:
-        town_db = []
-        for i in range(0, math.ceil(count_town / limit)):
-            town_db += db_util.select_towns(limit, i * limit)
-        json.dump(town_db, json_file)
+        _dump_json_array(db_util.iter_towns(as_tuple=True), TABLE_COLUMNS['town'], json_file)
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出乡级信息数据')
     print(f'[REPORT] 乡级信息导出完成 {db_path}town_stats.gov.cn.json')
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出村级信息数据')
-    count_village = db_util.select_count_village()
     with open(f'{db_path}village_stats.gov.cn.json', 'w') as json_file:
-        village_db = []
-        for i in range(0, math.ceil(count_village / limit)):
-            village_db += db_util.select_villages(limit, i * limit)
-        json.dump(village_db, json_file)
+        _dump_json_array(db_util.iter_villages(as_tuple=True), TABLE_COLUMNS['village'], json_file)
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出村级信息数据')
     print(f'[REPORT] 村级信息导出完成 {db_path}village_stats.gov.cn.json')
@@ -400,7 +1072,27 @@ def export_json_stats_gov_cn(db_path, show_log=True):
           f'总计用时 {int(end_time - begin_time)} 秒')
 
 
-def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis_db, ssh_config=None, show_log=True):
+def _dump_json_array(rows, columns, json_file):
+    """
+    逐条写入 JSON 对象数组，输出与 json.dump 整个数组相同，但不需要先在内存中保存所有信息。
+
+    :param rows: 信息，元素为 tuple。
+    :type rows: iterable
+    :param columns: 各字段名
+    :type columns: list
+    :param json_file: 输出文件
+    :return:
+    """
+    json_file.write('[')
+    for index, row in enumerate(rows):
+        if index > 0:
+            json_file.write(', ')
+        json_file.write(json.dumps(dict(zip(columns, row))))
+    json_file.write(']')
+
+
+def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis_db, ssh_config=None, show_log=True,
+                              db_mode='default'):
     """
     导出统计局信息到 Redis
 
@@ -418,8 +1110,14 @@ def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis
     :type ssh_config: dict
     :param show_log: 是否显示日志
     :type show_log: bool
+    :param db_mode: 数据库连接模式，见 lib.util.DB_MODES，只读导出时通常为 'read'。
+    :type db_mode: str
     :return:
     """
+    # 只在导出到 Redis 时导入 redis 及 sshtunnel，其它操作不加载。
+    import redis
+    from sshtunnel import SSHTunnelForwarder
+
     # 程序开始时间
     begin_time = time.time()
 
@@ -438,7 +1136,12 @@ def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis
         redis_port = ssh_server.local_bind_port
 
     # 数据库操作对象
-    db_util = DBUtilStatsGovCn(db_path + 'db_stats.gov.cn.sqlite')
+    db_util = DBUtilStatsGovCn(db_path + 'db_stats.gov.cn.sqlite', mode=db_mode)
+    if not db_util.has_indexes():
+        # 按上级查询下级需要上级代码索引，旧版本抓取的数据库先以写入连接创建。
+        if show_log:
+            print(f'[Log][{datetime.datetime.now()}] 创建上级代码索引')
+        DBUtilStatsGovCn(db_path + 'db_stats.gov.cn.sqlite').create_indexes()
     # redis 链接对象
     redis_util = redis.StrictRedis(
         connection_pool=redis.ConnectionPool(
@@ -452,8 +1155,7 @@ def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出省级信息数据')
-    count_province = db_util.select_count_province()
-    province_db = db_util.select_provinces(count_province, 0)
+    province_db = [dict(zip(TABLE_COLUMNS['province'], row)) for row in db_util.iter_provinces(as_tuple=True)]
     redis_util.set('stats.gov.cn_province', json.dumps(province_db))
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出省级信息数据')
@@ -462,10 +1164,12 @@ def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出地级信息数据')
     city_db = []
-    for province in province_db:
+    for number, province in enumerate(province_db, 1):
         if show_log:
-            print(f'[Log][{datetime.datetime.now()}] [{province_db.index(province) + 1}/{len(province_db)}] 地级信息')
-        cities_temp = db_util.select_cities_by_top(province['statistical_code'])
+            print(f'[Log][{datetime.datetime.now()}] [{number}/{len(province_db)}] 地级信息')
+        cities_temp = [
+            dict(zip(TOP_COLUMNS, row)) for row in db_util.select_cities_by_top(province['statistical_code'], as_tuple=True)
+        ]
         city_db += cities_temp
         redis_util.hset('stats.gov.cn_city', province['statistical_code'], json.dumps(cities_temp))
     if show_log:
@@ -475,10 +1179,12 @@ def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出县级信息数据')
     county_db = []
-    for city in city_db:
+    for number, city in enumerate(city_db, 1):
         if show_log:
-            print(f'[Log][{datetime.datetime.now()}] [{city_db.index(city) + 1}/{len(city_db)}] 县级信息')
-        counties_temp = db_util.select_counties_by_top(city['statistical_code'])
+            print(f'[Log][{datetime.datetime.now()}] [{number}/{len(city_db)}] 县级信息')
+        counties_temp = [
+            dict(zip(TOP_COLUMNS, row)) for row in db_util.select_counties_by_top(city['statistical_code'], as_tuple=True)
+        ]
         county_db += counties_temp
         redis_util.hset('stats.gov.cn_county', city['statistical_code'], json.dumps(counties_temp))
     if show_log:
@@ -488,10 +1194,12 @@ def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出乡级信息数据')
     town_db = []
-    for county in county_db:
+    for number, county in enumerate(county_db, 1):
         if show_log:
-            print(f'[Log][{datetime.datetime.now()}] [{county_db.index(county) + 1}/{len(county_db)}] 乡级信息')
-        towns_temp = db_util.select_towns_by_top(county['statistical_code'])
+            print(f'[Log][{datetime.datetime.now()}] [{number}/{len(county_db)}] 乡级信息')
+        towns_temp = [
+            dict(zip(TOP_COLUMNS, row)) for row in db_util.select_towns_by_top(county['statistical_code'], as_tuple=True)
+        ]
         town_db += towns_temp
         redis_util.hset('stats.gov.cn_town', county['statistical_code'], json.dumps(towns_temp))
     if show_log:
@@ -500,10 +1208,12 @@ def export_redis_stats_gov_cn(db_path, redis_host, redis_port, redis_pass, redis
 
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 开始导出村级信息数据')
-    for town in town_db:
+    for number, town in enumerate(town_db, 1):
         if show_log:
-            print(f'[Log][{datetime.datetime.now()}] [{town_db.index(town) + 1}/{len(town_db)}] 村级信息')
-        villages_temp = db_util.select_villages_by_top(town['statistical_code'])
+            print(f'[Log][{datetime.datetime.now()}] [{number}/{len(town_db)}] 村级信息')
+        villages_temp = [
+            dict(zip(TOP_COLUMNS, row)) for row in db_util.select_villages_by_top(town['statistical_code'], as_tuple=True)
+        ]
         redis_util.hset('stats.gov.cn_village', town['statistical_code'], json.dumps(villages_temp))
     if show_log:
         print(f'[Log][{datetime.datetime.now()}] 完成导出村级信息数据')
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import concurrent.futures
+import queue
+import threading
+
+
+class PageWriter(object):
+    """
+    页面写入器：抓取循环把解析后的页面放入有界队列，由后台写入线程逐个保存，抓取不再等待写入数据库。
+    页面按 DBUtilStatsGovCn.commit_page 每 batch_pages 个提交一次事务；队列满时放入页面的线程等待写入线程（背压），
+    内存中最多保留 maxsize 个未保存的页面。maxsize 为 0 时不启动写入线程，在放入页面的线程中直接保存。
+
+    只能由一个线程放入页面。flush 返回后写入线程空闲，放入页面的线程可以直接使用数据库操作对象，
+    直到再次放入页面。
+    """
+
+    def __init__(self, db_util, save_page, maxsize=1000):
+        self._db_util = db_util
+        """
+        数据库操作对象，maxsize 大于 0 时需以 check_same_thread=False 创建。
+        """
+
+        self._save_page = save_page
+        """
+        保存页面的方法，参数为级别名称、页面、页面信息数组，返回下级页面。
+        """
+
+        self._queue = queue.Queue(maxsize) if maxsize > 0 else None
+        """
+        待保存的页面，元素为 (Future, 级别名称, 页面, 页面信息数组)，None 表示结束。
+        """
+
+        self._error = None
+        """
+        写入线程保存页面时的异常，出现后不再保存之后的页面。
+        """
+
+        self._thread = None
+        """
+        写入线程
+        """
+
+        if self._queue is not None:
+            self._thread = threading.Thread(target=self._run, name='PageWriter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """
+        写入线程：逐个取出页面保存，结果或异常设置到页面的 Future 中。
+
+        :return:
+        """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                future, name, task, rows = item
+                if self._error is not None:
+                    future.set_exception(self._error)
+                    continue
+                try:
+                    future.set_result(self._save_page(name, task, rows))
+                except Exception as e:
+                    self._error = e
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def put(self, name, task, rows):
+        """
+        放入一个页面，队列已满时等待。
+
+        :param name: 页面级别名称
+        :type name: str
+        :param task: 抓取的页面
+        :type task: dict
+        :param rows: 页面信息数组
+        :type rows: list
+        :return: 保存完成后结果为新加入抓取队列的下级页面，元素为 (级别名称, 页面)。
+        :rtype: concurrent.futures.Future
+        """
+        if self._error is not None:
+            raise self._error
+        future = concurrent.futures.Future()
+        if self._queue is None:
+            future.set_result(self._save_page(name, task, rows))
+        else:
+            self._queue.put((future, name, task, rows))
+        return future
+
+    def flush(self):
+        """
+        等待已放入的页面全部保存，不提交事务，写入出错时抛出异常。
+
+        :return:
+        """
+        if self._queue is not None:
+            self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self, raise_error=True):
+        """
+        保存已放入的页面，结束写入线程并提交事务。写入出错时不提交，未提交的页面仍为待抓取状态，并抛出异常。
+
+        :param raise_error: 写入出错时是否抛出异常，为 False 时只输出错误信息（抓取已出错或中断时，不替换原来的异常）。
+        :type raise_error: bool
+        :return:
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            if raise_error:
+                raise self._error
+            print(f'[Error] 保存页面出错，未提交的页面仍为待抓取状态：{self._error!r}')
+            return
+        self._db_util.commit()
+
+
+if __name__ == '__main__':
+    pass
@@ -27,6 +27,20 @@ def _year_input():
             input(f'输入错误，只支持 [2009-{datetime.datetime.now().year-1}] 年份，按任意键后重新输入。')
 
 
+def _years_input():
+    """
+    接受用户起止年份输入
+
+    :return: 起止年份之间（含）的所有年份
+    :rtype: list
+    """
+    print('请输入起始年份')
+    begin_year = _year_input()
+    print('请输入结束年份')
+    end_year = _year_input()
+    return list(range(min(begin_year, end_year), max(begin_year, end_year) + 1))
+
+
 def _check_db_file_exist(year, site_name='stats.gov.cn'):
     """
     检查是否存在数据文件
@@ -50,21 +64,144 @@ def _fetch_stats_gov_cn():
     year = _year_input()
     if _check_db_file_exist(year) is True:
         confirm = input(f'{config.ROOT_PATH}data{os.sep}{year}{os.sep}db_stats.gov.cn.sqlite '
-                        f'文件已存在，继续抓取会覆盖原文件，是否继续？(y or n) ')
+                        f'文件已存在，如有未完成的抓取会从中断处继续，否则会覆盖原文件，是否继续？(y or n) ')
         print(confirm)
         if confirm != 'y' and confirm != 'Y':
             print('Bye.')
             exit()
+    # 增量抓取的基准数据库
+    baseline_path = ''
+    if config.CRAWLER_INCREMENTAL and _check_db_file_exist(year - 1):
+        baseline_path = f'{config.ROOT_PATH}data{os.sep}{year - 1}{os.sep}db_stats.gov.cn.sqlite'
+        print(f'以 {baseline_path} 为基准增量抓取')
     print(f'开始 {year} 年统计局信息抓取')
     worker.fetch_stats_gov_cn(
         config.STATS_GOV_CN_SITE.replace('$YEAR$', str(year)),
         f'{config.ROOT_PATH}data{os.sep}{year}{os.sep}',
         config.SHOW_LOG,
-        config.CRAWLER_SLEEP_TIME
+        config.CRAWLER_SLEEP_TIME,
+        config.CRAWLER_MODE,
+        config.CRAWLER_CONCURRENCY,
+        config.CRAWLER_RATE_LIMIT,
+        config.CRAWLER_RATE_BURST,
+        config.CRAWLER_CACHE_PATH,
+        config.CRAWLER_CACHE_REVALIDATE,
+        True,
+        baseline_path,
+        config.CRAWLER_INCREMENTAL_LEVEL,
+        config.CRAWLER_PIPELINE,
+        config.CRAWLER_DEPTH_FIRST,
+        config.CRAWLER_REPLAY_PATH,
+        config.CRAWLER_ADAPTIVE,
+        config.CRAWLER_RETRY,
+        config.CRAWLER_RETRY_DELAY,
+        _redis_config(),
+        config.CRAWLER_LEASE_TIME,
+        f'{config.ROOT_PATH}data{os.sep}{year}{os.sep}metrics_stats.gov.cn' if config.CRAWLER_METRICS else '',
+        config.CRAWLER_BATCH_PAGES,
+        config.DB_CRAWL_MODE,
+        config.CRAWLER_WRITE_QUEUE
     )
     print(f'完成 {year} 年统计局信息抓取，数据保存在 {config.ROOT_PATH}data{os.sep}{year}{os.sep}db_stats.gov.cn.sqlite 文件中。')
 
 
+def _crawl_node_stats_gov_cn():
+    """
+    作为分布式抓取节点运行
+
+    :return:
+    """
+    # 接收输入并验证
+    year = _year_input()
+    print(f'开始作为 {year} 年统计局信息分布式抓取节点运行，等待写入进程放入待抓取页面。')
+    worker.crawl_node_stats_gov_cn(
+        config.STATS_GOV_CN_SITE.replace('$YEAR$', str(year)),
+        _redis_config(),
+        config.SHOW_LOG,
+        config.CRAWLER_SLEEP_TIME,
+        config.CRAWLER_RATE_LIMIT,
+        config.CRAWLER_RATE_BURST,
+        config.CRAWLER_CACHE_PATH,
+        config.CRAWLER_CACHE_REVALIDATE,
+        config.CRAWLER_ADAPTIVE,
+        config.CRAWLER_LEASE_TIME
+    )
+    print(f'完成 {year} 年统计局信息分布式抓取。')
+
+
+def _fetch_stats_gov_cn_years():
+    """
+    批量抓取多个年份的统计局信息
+
+    :return:
+    """
+    # 接收输入并验证
+    years = _years_input()
+    exist_years = [str(year) for year in years if _check_db_file_exist(year)]
+    if exist_years:
+        confirm = input(f'{", ".join(exist_years)} 年的数据文件已存在，如有未完成的抓取会从中断处继续，否则会覆盖原文件，是否继续？(y or n) ')
+        print(confirm)
+        if confirm != 'y' and confirm != 'Y':
+            print('Bye.')
+            exit()
+    print(f'开始 {years[0]}-{years[-1]} 年统计局信息批量抓取')
+    worker.fetch_stats_gov_cn_years(
+        config.STATS_GOV_CN_SITE,
+        f'{config.ROOT_PATH}data{os.sep}$YEAR${os.sep}',
+        years,
+        config.SHOW_LOG,
+        config.CRAWLER_SLEEP_TIME,
+        config.CRAWLER_MODE,
+        config.CRAWLER_CONCURRENCY,
+        config.CRAWLER_RATE_LIMIT,
+        config.CRAWLER_RATE_BURST,
+        config.CRAWLER_CACHE_PATH,
+        config.CRAWLER_CACHE_REVALIDATE,
+        True,
+        config.CRAWLER_INCREMENTAL,
+        config.CRAWLER_INCREMENTAL_LEVEL,
+        config.CRAWLER_PIPELINE,
+        config.CRAWLER_DEPTH_FIRST,
+        config.CRAWLER_REPLAY_PATH,
+        config.CRAWLER_ADAPTIVE,
+        config.CRAWLER_RETRY,
+        config.CRAWLER_RETRY_DELAY,
+        f'{config.ROOT_PATH}data{os.sep}$YEAR${os.sep}metrics_stats.gov.cn' if config.CRAWLER_METRICS else '',
+        config.CRAWLER_BATCH_PAGES,
+        config.DB_CRAWL_MODE,
+        config.CRAWLER_WRITE_QUEUE
+    )
+    print(f'完成 {years[0]}-{years[-1]} 年统计局信息批量抓取，数据保存在 {config.ROOT_PATH}data{os.sep}[年份]{os.sep}db_stats.gov.cn.sqlite 文件中。')
+
+
+def _import_history_stats_gov_cn():
+    """
+    将多个年份的统计局信息导入多年份数据库
+
+    :return:
+    """
+    # 接收输入并验证
+    years = _years_input()
+    print(f'开始将 {years[0]}-{years[-1]} 年统计局信息导入多年份数据库')
+    years = worker.import_history_stats_gov_cn(
+        f'{config.ROOT_PATH}data{os.sep}$YEAR${os.sep}',
+        config.HISTORY_DB_PATH,
+        years,
+        config.SHOW_LOG
+    )
+    print(f'完成 {", ".join(str(year) for year in years) or "0 个"} 年统计局信息导入，数据保存在 {config.HISTORY_DB_PATH} 文件中。')
+
+
+def _redis_config():
+    """
+    分布式抓取的 Redis 配置
+
+    :return: Redis 配置
+    :rtype: dict
+    """
+    return {'host': config.REDIS_HOST, 'port': config.REDIS_PORT, 'pass': config.REDIS_PASS, 'db': config.REDIS_DB}
+
+
 def _export_csv_stats_gov_cn():
     """
     导出统计局信息到 csv 文件
@@ -80,7 +217,8 @@ def _export_csv_stats_gov_cn():
     worker.export_csv_stats_gov_cn(
         f'{config.ROOT_PATH}data{os.sep}{year}{os.sep}',
         config.SHOW_LOG,
-        config.CSV_OUTPUT_FILE_ENCODING
+        config.CSV_OUTPUT_FILE_ENCODING,
+        config.DB_EXPORT_MODE
     )
     print(f'完成 {year} 年统计局信息导出 csv 文件，文件在 {config.ROOT_PATH}data{os.sep}{year}{os.sep} 目录下。')
 
@@ -100,6 +238,7 @@ def _export_json_stats_gov_cn():
     worker.export_json_stats_gov_cn(
         f'{config.ROOT_PATH}data{os.sep}{year}{os.sep}',
         config.SHOW_LOG,
+        config.DB_EXPORT_MODE,
     )
     print(f'完成 {year} 年统计局信息导出 json 文件，文件在 {config.ROOT_PATH}data{os.sep}{year}{os.sep} 目录下。')
 
@@ -137,6 +276,7 @@ def _export_redis_stats_gov_cn():
         redis_db=f'{config.REDIS_DB}',
         ssh_config=ssh_config,
         show_log=config.SHOW_LOG,
+        db_mode=config.DB_EXPORT_MODE,
     )
     print(f'完成 {year} 年统计局信息导出到 Redis。{os.linesep}'
           f'Redis 信息如下：{os.linesep}'
@@ -158,6 +298,9 @@ def main():
         print('2\t导出统计局信息中所有省、地、县、乡、村数据的 csv 版本。')
         print('3\t导出统计局信息中所有省、地、县、乡、村数据的 json 版本。')
         print('4\t导出统计局信息中所有省、地、县、乡、村数据到 Redis。')
+        print('5\t作为分布式抓取节点运行（写入进程需将 CRAWLER_MODE 设置为 distributed 并选择 1）。')
+        print('6\t批量抓取多个年份的统计局信息并保存入库。')
+        print('7\t将多个年份的统计局信息导入多年份数据库。')
         operate = input('请选择：')
         if operate in exit_str:
             exit()
@@ -173,6 +316,15 @@ def main():
         elif operate == '4':
             _export_redis_stats_gov_cn()
             exit()
+        elif operate == '5':
+            _crawl_node_stats_gov_cn()
+            exit()
+        elif operate == '6':
+            _fetch_stats_gov_cn_years()
+            exit()
+        elif operate == '7':
+            _import_history_stats_gov_cn()
+            exit()
         else:
             print('输入错误，请重新输入。')
 